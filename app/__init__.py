@@ -0,0 +1,4 @@
+import time as _time
+
+# first line that runs on `import app.main`; app/startup.py measures cold start from here
+BOOT_STARTED = _time.perf_counter()
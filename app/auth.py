@@ -2,9 +2,11 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
 import uuid
-from typing import Any, Dict, Optional, List
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 # --- Robust PyJWT import (support both old/new layouts) ---
 try:
@@ -25,33 +27,22 @@ except Exception:  # pragma: no cover
 
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from passlib.context import CryptContext
 from pydantic import BaseModel, EmailStr
 
-# Dynamo helpers
-try:
-    from boto3.dynamodb.conditions import Attr  # type: ignore
-except Exception:  # pragma: no cover
-    Attr = None  # type: ignore
-
 try:
     from botocore.exceptions import ClientError  # type: ignore
 except Exception:  # pragma: no cover
     ClientError = Exception  # type: ignore
 
-# AWS wiring (guarded so memory mode works without AWS)
-try:
-    from .aws_config import dyna
-except Exception:  # pragma: no cover
-    dyna = None  # type: ignore
-
 # ✨ Use the same helpers/templates as your auth_email router
 try:
     from .tokens import new_token, expiry_ts  # minutes→unix ts
 except Exception as e:  # pragma: no cover
     raise RuntimeError(f"Missing app.tokens helpers: {e}")
 
-from .emailer import send_email, verification_email_html
+from .emailer import enqueue_email, verification_email_html
+from . import pwhash, revocation
+from .storage import store
 
 AUTH_BACKEND = os.getenv("AUTH_BACKEND", "dynamo").lower().strip()
 AUTO_VERIFY = os.getenv("AUTO_VERIFY_USERS", "0") == "1"
@@ -59,27 +50,19 @@ AUTO_VERIFY = os.getenv("AUTO_VERIFY_USERS", "0") == "1"
 SECRET_KEY = os.getenv("JWT_SECRET", "dev-secret")
 ALGORITHM = "HS256"
 TOKEN_TTL = 60 * 60  # 1 hour
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
 PUBLIC_UI_URL = os.getenv("PUBLIC_UI_URL", "")
 
-pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_ctx = pwhash.pwd_ctx
 
 # Bearer optional, so we can fall back to cookie
 security = HTTPBearer(auto_error=False)
 
-table_users = dyna.Table("Users") if dyna else None  # type: ignore
-table_tokens = dyna.Table("Tokens") if dyna else None  # type: ignore  # (unused for email verify now)
-
-# In-memory stores for dev (AUTH_BACKEND=memory)
-try:
-    _mem_users  # type: ignore[name-defined]
-except NameError:
-    _mem_users: Dict[str, Dict[str, Any]] = {}
-
-try:
-    _mem_tokens  # type: ignore[name-defined]
-except NameError:
-    _mem_tokens: Dict[str, Dict[str, Any]] = {}
+# Users / Tokens live in app.storage (memory, dynamo or sqlite). The memory
+# backend's dicts stay reachable under their old names for dev tooling.
+_mem_users: Dict[str, Dict[str, Any]] = getattr(store.users, "items", {})
+_mem_tokens: Dict[str, Dict[str, Any]] = getattr(store.tokens, "items", {})
 
 
 class RegisterIn(BaseModel):
@@ -106,23 +89,74 @@ class ChangePwdIn(BaseModel):
 
 
 
+# bcrypt runs on the dedicated pool in app/pwhash.py, never on the request threads
 def hash_pw(p: str) -> str:
-    return pwd_ctx.hash(p)
+    return pwhash.hash_pw(p)
 
 def verify_pw(p: str, h: str) -> bool:
-    return pwd_ctx.verify(p, h)
+    return pwhash.verify_and_update(p, h)[0]
 
 def create_token(user_id: str) -> str:
-    # Use int for exp to avoid float issues
-    payload = {"sub": user_id, "exp": int(time.time()) + TOKEN_TTL, "scope": "access"}
+    # int exp; iat keeps milliseconds so a password reset's cut-off
+    # (revocation.revoke_user) doesn't also kill a login in the same second
+    now = time.time()
+    payload = {
+        "sub": user_id,
+        "iat": round(now, 3),
+        "exp": int(now) + TOKEN_TTL,
+        "jti": uuid.uuid4().hex,
+        "scope": "access",
+    }
     return jwt_encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def decode_token(token: str) -> str:
+# ---- verified-token cache: token -> (sub, exp, jti, iat) ----
+# Repeat requests with the same bearer/cookie skip HMAC verification and JSON
+# parsing; revocation is still checked on every hit (two dict lookups).
+_token_cache: "OrderedDict[str, Tuple[str, int, Optional[str], float]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def _verify_token(token: str) -> Tuple[str, int, Optional[str], float]:
+    now = time.time()
+    with _token_cache_lock:
+        hit = _token_cache.get(token)
+        if hit is not None:
+            if hit[1] > now:
+                _token_cache.move_to_end(token)
+                return hit
+            _token_cache.pop(token, None)
     try:
         data = jwt_decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return str(data["sub"])
     except PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    entry = (str(data["sub"]), int(data.get("exp", 0)), data.get("jti"), float(data.get("iat", 0)))
+    if TOKEN_CACHE_SIZE > 0:
+        with _token_cache_lock:
+            _token_cache[token] = entry
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return entry
+
+def decode_token(token: str) -> str:
+    sub, _, jti, iat = _verify_token(token)
+    if revocation.is_revoked(jti, sub, iat):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return sub
+
+def revoke_token(token: str) -> None:
+    """Revoke a single access token (used by /logout). Invalid tokens are ignored."""
+    try:
+        sub, exp, jti, _ = _verify_token(token)
+    except HTTPException:
+        return
+    if jti:
+        revocation.revoke_jti(jti, exp)
+    else:
+        # legacy token without a jti: only a per-user cut-off can kill it
+        revocation.revoke_user(sub, TOKEN_TTL)
+
+def revoke_user_tokens(user_id: str) -> None:
+    """Revoke every access token issued to `user_id` so far (password reset)."""
+    revocation.revoke_user(user_id, TOKEN_TTL)
 
 def _extract_token(request: Request, creds: Optional[HTTPAuthorizationCredentials]) -> Optional[str]:
     # 1) Prefer Authorization: Bearer <jwt>
@@ -146,104 +180,52 @@ def current_user(
     return decode_token(token)
 
 
-# ---- Dynamo scan utility with pagination ----
-def _dynamo_scan_all(table, **kwargs) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
-    last_key = None
-    while True:
-        params = {k: v for k, v in kwargs.items() if v is not None}
-        if last_key:
-            params["ExclusiveStartKey"] = last_key
-        resp = table.scan(**params)
-        items.extend(resp.get("Items", []))
-        last_key = resp.get("LastEvaluatedKey")
-        if not last_key:
-            break
-    return items
+def _store_error(op: str, e: Exception) -> HTTPException:
+    msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
+    return HTTPException(status_code=400, detail=f"{store.backend} {op} failed: {msg}")
 
 def _put_user(item: Dict[str, Any]) -> None:
-    if AUTH_BACKEND == "memory" or not table_users:
-        _mem_users[item["user_id"]] = item
-        return
     try:
-        table_users.put_item(Item=item)  # type: ignore[union-attr]
+        store.users.put(item)
     except ClientError as e:  # pragma: no cover
-        msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
-        raise HTTPException(status_code=400, detail=f"dynamo Users.put_item failed: {msg}")
+        raise _store_error("Users.put_item", e)
 
-def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
-    if AUTH_BACKEND == "memory" or not table_users:
-        return _mem_users.get(user_id)
+def get_user_by_id(user_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
     try:
-        resp = table_users.get_item(Key={"user_id": user_id})  # type: ignore[union-attr]
-        return resp.get("Item")
+        return store.users.get(user_id, fields)
     except ClientError as e:  # pragma: no cover
-        msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
-        raise HTTPException(status_code=400, detail=f"dynamo Users.get_item failed: {msg}")
+        raise _store_error("Users.get_item", e)
 
-def _scan_users_by_email(email: str) -> List[Dict[str, Any]]:
-    if AUTH_BACKEND == "memory" or not table_users:
-        return [u for u in _mem_users.values() if u.get("email") == email]
+def _get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
+    # email index (GSI / sqlite index / dict), not a table scan
     try:
-        if Attr is not None:
-            resp = table_users.scan(FilterExpression=Attr("email").eq(email))  # type: ignore[union-attr]
-            items = resp.get("Items", [])
-            lek = resp.get("LastEvaluatedKey")
-            while lek:
-                resp = table_users.scan(
-                    FilterExpression=Attr("email").eq(email),
-                    ExclusiveStartKey=lek,  # type: ignore[arg-type]
-                )  # type: ignore[union-attr]
-                items.extend(resp.get("Items", []))
-                lek = resp.get("LastEvaluatedKey")
-            return items
-        items = _dynamo_scan_all(table_users)  # type: ignore[arg-type]
-        return [it for it in items if it.get("email") == email]
+        return store.users.find_by_email(email)
     except ClientError as e:  # pragma: no cover
-        msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
-        raise HTTPException(status_code=400, detail=f"dynamo Users.scan failed: {msg}")
+        raise _store_error("Users.query", e)
 
 def _email_exists(email: str) -> bool:
-    return bool(_scan_users_by_email(email))
-
-def _get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
-    items = _scan_users_by_email(email)
-    return items[0] if items else None
+    return _get_user_by_email(email) is not None
 
 def _new_one_time_token(user_id: str, kind: str, ttl_seconds: int = 3600) -> str:
     # kept for other features (e.g., password reset); not used for email verify anymore
     tok = str(uuid.uuid4())
     expires = int(time.time()) + ttl_seconds
-    if AUTH_BACKEND == "memory" or not table_tokens:
-        _mem_tokens[tok] = {"type": kind, "user_id": user_id, "expires_at": expires}
-        return tok
     try:
-        table_tokens.put_item(  # type: ignore[union-attr]
-            Item={"token": tok, "type": kind, "user_id": user_id, "expires_at": expires}
-        )
+        store.tokens.put({"token": tok, "type": kind, "user_id": user_id, "expires_at": expires})
         return tok
     except ClientError as e:  # pragma: no cover
-        msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
-        raise HTTPException(status_code=400, detail=f"dynamo Tokens.put_item failed: {msg}")
+        raise _store_error("Tokens.put_item", e)
 
 def _consume_token(token: str, kind: str) -> str:
     # kept for other features (e.g., password reset)
-    if AUTH_BACKEND == "memory" or not table_tokens:
-        item = _mem_tokens.get(token)
-        if not item or item.get("type") != kind or item.get("expires_at", 0) < time.time():
-            raise HTTPException(status_code=400, detail="Invalid or expired token")
-        _mem_tokens.pop(token, None)
-        return str(item["user_id"])
     try:
-        resp = table_tokens.get_item(Key={"token": token})  # type: ignore[union-attr]
-        item = resp.get("Item")
+        item = store.tokens.get(token)
         if not item or item.get("type") != kind or item.get("expires_at", 0) < time.time():
             raise HTTPException(status_code=400, detail="Invalid or expired token")
-        table_tokens.delete_item(Key={"token": token})  # type: ignore[union-attr]
+        store.tokens.delete(token)
         return str(item["user_id"])
     except ClientError as e:  # pragma: no cover
-        msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
-        raise HTTPException(status_code=400, detail=f"dynamo Tokens.get/delete failed: {msg}")
+        raise _store_error("Tokens.get/delete", e)
 
 
 # -------------------- Handlers --------------------
@@ -268,22 +250,14 @@ def register_user(body: RegisterIn):
             raw, tok_hash = new_token()
             exp = expiry_ts(60 * 24)  # minutes (24h)
 
-            if AUTH_BACKEND == "memory" or not table_users:
-                # update in-memory user
-                u = _mem_users[user_id]
-                u["email_verify_token_hash"] = tok_hash
-                u["email_verify_expires_at"] = exp
-            else:
-                # update DynamoDB user
-                table_users.update_item(  # type: ignore[union-attr]
-                    Key={"user_id": user_id},
-                    UpdateExpression="SET email_verify_token_hash = :h, email_verify_expires_at = :e",
-                    ExpressionAttributeValues={":h": tok_hash, ":e": exp},
-                )
+            store.users.update(
+                user_id, {"email_verify_token_hash": tok_hash, "email_verify_expires_at": exp}
+            )
 
             verify_link = f"{PUBLIC_UI_URL}/verify?token={raw}&email={body.email}"
             try:
-                send_email(
+                # queued for the outbox dispatcher; provider latency stays off this request
+                enqueue_email(
                     to=body.email,
                     subject="Verify your email",
                     html=verification_email_html(verify_link),
@@ -308,8 +282,18 @@ def register_user(body: RegisterIn):
 def login_user(body: LoginIn):
     try:
         user = _get_user_by_email(body.email)
-        if not user or not verify_pw(body.password, user.get("password_hash", "")):
+        if not user:
+            raise HTTPException(status_code=401, detail="bad credentials")
+        ok, new_hash = pwhash.verify_and_update(body.password, user.get("password_hash", ""))
+        if not ok:
             raise HTTPException(status_code=401, detail="bad credentials")
+        if new_hash:
+            # stored hash uses an outdated bcrypt cost: upgrade it transparently;
+            # a partial update, so concurrent writes to the rest of the item survive
+            try:
+                store.users.update(user["user_id"], {"password_hash": new_hash})
+            except Exception as e:  # pragma: no cover
+                print("REHASH ERROR:", e)
 
         if not AUTO_VERIFY and not user.get("email_verified", False):
             raise HTTPException(status_code=403, detail="email not verified")
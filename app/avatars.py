@@ -0,0 +1,138 @@
+# app/avatars.py
+"""
+Avatar pipeline: fixed-size variants under immutable, content-versioned keys.
+
+An upload is decoded once, EXIF-rotated, center-cropped to a square and
+written as one small image per AVATAR_SIZES entry (default 64, 128, 256 px).
+WebP is used when Pillow was built with it, PNG otherwise. The variants live at
+
+    avatars/{user_id}/{version}/{size}.{ext}
+
+where `version` hashes the uploaded bytes together with the pipeline settings.
+A key therefore never changes content: a new avatar gets new keys, and the
+old ones are deleted. The keys written are recorded on the user item
+(`avatar_keys`) and deletes go by that list, so changing AVATAR_SIZES or the
+output format later doesn't strand the old blobs. That lets `GET /avatars/...` (routers/users.py) serve
+them with a year-long `immutable` Cache-Control and a stable URL. Presigned
+URLs can't do that, because they change on every call. After the first load,
+a profile view costs a browser or CDN cache hit.
+
+The URL is not authenticated: it names the user and a 64-bit content hash,
+so it is as private as the places it gets shared to.
+
+Uploads go through the same admission control as photo uploads
+(app/ingest.py), so a burst of them can't decode images without bound.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from .storage.base import PUBLIC_API_URL
+
+AVATAR_SIZES = tuple(sorted({int(s) for s in os.getenv("AVATAR_SIZES", "64,128,256").split(",") if s.strip()}))
+AVATAR_DEFAULT_SIZE = int(os.getenv("AVATAR_DEFAULT_SIZE", str(AVATAR_SIZES[-1])))
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", "85"))
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(10 * 1024 * 1024)))
+AVATAR_FORM_BYTES = AVATAR_MAX_BYTES + 64 * 1024  # the file plus its multipart framing
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# the Users attributes `keys` needs
+USER_FIELDS = ["user_id", "avatar_key", "avatar_version", "avatar_keys"]
+
+VERSION_RE = re.compile(r"^[0-9a-f]{16}$")
+NAME_RE = re.compile(r"^(\d+)\.(webp|png)$")
+
+_format: Optional[Tuple[str, str, str]] = None  # (Pillow format, extension, content type)
+
+
+def output_format() -> Tuple[str, str, str]:
+    global _format
+    if _format is None:
+        from PIL import features  # type: ignore
+
+        _format = ("WEBP", "webp", "image/webp") if features.check("webp") else ("PNG", "png", "image/png")
+    return _format
+
+
+def version_of(data: bytes) -> str:
+    pipeline = f"{AVATAR_SIZES}|{AVATAR_QUALITY}|{output_format()[0]}".encode()
+    return hashlib.sha256(pipeline + b"\0" + data).hexdigest()[:16]
+
+
+def key(user_id: str, version: str, size: int) -> str:
+    return f"avatars/{user_id}/{version}/{size}.{output_format()[1]}"
+
+
+def keys(user: Dict) -> list:
+    """Every blob key holding `user`'s current avatar (variants, or the legacy original)."""
+    if user.get("avatar_keys"):
+        return list(user["avatar_keys"])
+    version = user.get("avatar_version")
+    if version:  # written before the keys were recorded: the best guess is today's settings
+        return [key(user["user_id"], version, s) for s in AVATAR_SIZES]
+    return [user["avatar_key"]] if user.get("avatar_key") else []
+
+
+def urls(user_id: str, version: str) -> Dict[str, str]:
+    ext = output_format()[1]
+    return {str(s): f"{PUBLIC_API_URL}/avatars/{user_id}/{version}/{s}.{ext}" for s in AVATAR_SIZES}
+
+
+def default_url(user_id: str, version: str) -> str:
+    size = AVATAR_DEFAULT_SIZE if AVATAR_DEFAULT_SIZE in AVATAR_SIZES else AVATAR_SIZES[-1]
+    return urls(user_id, version)[str(size)]
+
+
+def render(data: bytes) -> Dict[int, bytes]:
+    """size -> encoded square image; 400 when `data` isn't a decodable image."""
+    try:
+        from PIL import Image, ImageOps  # type: ignore
+    except ImportError:  # pragma: no cover
+        raise HTTPException(status_code=503, detail="avatar processing unavailable")
+
+    largest = AVATAR_SIZES[-1]
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", (largest, largest))  # JPEG: decode at 1/2, 1/4, 1/8 scale when that's still big enough
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError):
+        raise HTTPException(status_code=400, detail="file must be an image")
+
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    side = min(img.size)
+    left, top = (img.width - side) // 2, (img.height - side) // 2
+    square = img.crop((left, top, left + side, top + side))
+
+    fmt = output_format()[0]
+    out: Dict[int, bytes] = {}
+    for size in reversed(AVATAR_SIZES):  # each variant from the previous, larger one
+        square = square.resize((size, size), Image.LANCZOS, reducing_gap=3.0)
+        buf = io.BytesIO()
+        if fmt == "WEBP":
+            square.save(buf, fmt, quality=AVATAR_QUALITY, method=4)
+        else:
+            square.save(buf, fmt, optimize=True)
+        out[size] = buf.getvalue()
+    return out
+
+
+def blob_key(user_id: str, version: str, name: str) -> Optional[str]:
+    """Blob key for a `GET /avatars/{user_id}/{version}/{name}` request, None when malformed."""
+    m = NAME_RE.match(name)
+    if not VERSION_RE.match(version) or not m or int(m.group(1)) not in AVATAR_SIZES:
+        return None
+    if "/" in user_id or user_id in ("", ".", ".."):
+        return None
+    return f"avatars/{user_id}/{version}/{name}"
+
+
+def content_type() -> str:
+    return output_format()[2]
@@ -5,14 +5,18 @@ and shared AWS clients (boto3).
 * Reads from real env-vars / .env in production
 * Provides safe defaults when they are absent
   (e.g. during pytest or CI runs).
+* `s3` / `dyna` are built on first use, not at import: boto3 itself, the
+  session and the endpoint/model loading stay off the cold-start path.
+  `warm_up()` builds them ahead of the first request.
 """
 
 from __future__ import annotations
 
 import os
+import threading
 from functools import lru_cache
+from typing import Any, Callable, List
 
-import boto3
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -59,7 +63,71 @@ S3_BUCKET:  str = CFG.S3_BUCKET   # type: ignore
 REGION:     str = CFG.REGION      # type: ignore
 
 # ── shared AWS clients/resources (all modules reuse these) ────────────
-session = boto3.Session(region_name=REGION)
-
-s3   = session.client("s3")
-dyna = session.resource("dynamodb")
+class _Lazy:
+    """Stands in for a boto3 object and builds it on first attribute access."""
+
+    # one lock for all of them: boto3 sessions aren't safe to build clients from concurrently
+    _lock = threading.RLock()
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._obj: Any = None
+        self._hooks: List[Callable[[Any], None]] = []
+
+    def _get(self) -> Any:
+        obj = self._obj
+        if obj is None:
+            with self._lock:
+                if self._obj is None:
+                    built = self._factory()
+                    for fn in self._hooks:
+                        fn(built)
+                    self._obj = built
+                obj = self._obj
+        return obj
+
+    def on_build(self, fn: Callable[[Any], None]) -> None:
+        """Run fn(obj) once the object exists (now, if it already does)."""
+        with self._lock:
+            if self._obj is None:
+                self._hooks.append(fn)
+                return
+        fn(self._obj)
+
+    @property
+    def built(self) -> bool:
+        return self._obj is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get(), name)
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._name}: {self._obj!r}>" if self.built else f"<lazy {self._name} (not built)>"
+
+
+def _session():
+    import boto3
+
+    return boto3.Session(region_name=REGION)
+
+
+session = _Lazy("session", _session)
+
+s3   = _Lazy("s3", lambda: session.client("s3"))
+dyna = _Lazy("dynamodb", lambda: session.resource("dynamodb"))
+
+
+def warm_up() -> None:
+    """Build the shared clients and open one connection to each endpoint.
+
+    A denied call still leaves a connection in the pool, so errors are ignored.
+    """
+    for call in (
+        lambda: dyna.meta.client.list_tables(Limit=1),
+        lambda: s3.list_objects_v2(Bucket=S3_BUCKET, MaxKeys=1),
+    ):
+        try:
+            call()
+        except Exception:
+            pass
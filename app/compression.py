@@ -0,0 +1,113 @@
+# app/compression.py
+"""
+Pure-ASGI response compression for large JSON/text bodies.
+
+Negotiates on Accept-Encoding: br (when the optional `brotli` package is
+installed) over gzip. Only single-message bodies of a compressible type and
+at least COMPRESS_MIN_SIZE bytes are touched; streamed bodies, file
+downloads and anything that already has a Content-Encoding pass through
+unchanged. Levels are picked for speed (gzip 5, brotli 4) – these bodies
+are generated per request, not cached.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None  # type: ignore
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+# bodies above this are compressed on a worker thread, not on the event loop
+COMPRESS_THREAD_SIZE = int(os.getenv("COMPRESS_THREAD_SIZE", str(256 * 1024)))
+
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best encoding we support that the client accepts (q=0 means refused)."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for enc in (("br",) if brotli is not None else ()) + ("gzip",):
+        if accepted.get(enc, accepted.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)  # type: ignore[union-attr]
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                ctype = headers.get("content-type", "")
+                if "content-encoding" in headers or not ctype.startswith(_COMPRESSIBLE):
+                    passthrough = True
+                    await send(message)
+                else:
+                    message.setdefault("headers", [])
+                    start = message  # held until we see the body
+                return
+            if message["type"] == "http.response.body" and start is not None:
+                body = message.get("body", b"")
+                held, start = start, None
+                if message.get("more_body", False) or len(body) < self.minimum_size:
+                    passthrough = True
+                    MutableHeaders(scope=held).add_vary_header("Accept-Encoding")
+                    await send(held)
+                    await send(message)
+                    return
+                if len(body) >= COMPRESS_THREAD_SIZE:
+                    out = await anyio.to_thread.run_sync(compress, body, encoding)
+                else:
+                    out = compress(body, encoding)
+                headers = MutableHeaders(scope=held)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(out))
+                headers.add_vary_header("Accept-Encoding")
+                await send(held)
+                await send({"type": "http.response.body", "body": out})
+                return
+            await send(message)
+
+        await self.app(scope, receive, _send)
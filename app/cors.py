@@ -0,0 +1,122 @@
+# app/cors.py
+"""
+Pure-ASGI CORS (replaces Starlette's CORSMiddleware + the old
+`_ensure_cors_on_all` BaseHTTPMiddleware wrapper).
+
+* origin rules (exact set + one regex) are compiled once; the allow/deny
+  decision is memoized per Origin value, so the regex runs once per origin
+  rather than once per request
+* preflights are answered here, with Access-Control-Max-Age so browsers
+  stop re-sending them for every call
+* allowed origins get their headers on *every* response, including the 500
+  we send when the app raises (ServerErrorMiddleware sits outside us and
+  would answer without them, which the browser reports as a CORS error)
+"""
+from __future__ import annotations
+
+import functools
+import logging
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+log = logging.getLogger("uvicorn.error")
+
+CORS_MAX_AGE = int(os.getenv("CORS_MAX_AGE", "600"))  # Chrome caps at 7200, Firefox at 86400
+ALLOW_METHODS = "DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+
+class CORSMiddleware:
+    def __init__(
+        self,
+        app,
+        allow_origins: Iterable[str] = (),
+        allow_origin_regex: Optional[str] = None,
+        allow_credentials: bool = True,
+        expose_headers: Iterable[str] = (),
+        max_age: int = CORS_MAX_AGE,
+        cache_size: int = 4096,
+    ):
+        self.app = app
+        self.origins = frozenset(allow_origins)
+        self.origin_regex = re.compile(allow_origin_regex) if allow_origin_regex else None
+        self.allowed = functools.lru_cache(maxsize=cache_size)(self._check)
+
+        common: List[Tuple[str, str]] = []
+        if allow_credentials:
+            common.append(("access-control-allow-credentials", "true"))
+        self._simple = common + (
+            [("access-control-expose-headers", ", ".join(expose_headers))] if expose_headers else []
+        )
+        self._preflight = common + [
+            ("access-control-allow-methods", ALLOW_METHODS),
+            ("access-control-max-age", str(max_age)),
+        ]
+
+    def _check(self, origin: str) -> bool:
+        if origin in self.origins:
+            return True
+        return bool(self.origin_regex and self.origin_regex.fullmatch(origin))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        origin = headers.get("origin")
+        if not origin:
+            await self.app(scope, receive, send)
+            return
+        allowed = self.allowed(origin)
+        if scope["method"] == "OPTIONS" and "access-control-request-method" in headers:
+            await self._send_preflight(send, origin, allowed, headers.get("access-control-request-headers"))
+            return
+
+        started = False
+
+        async def _send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                message.setdefault("headers", [])
+                out = MutableHeaders(scope=message)
+                out.add_vary_header("Origin")
+                if allowed:
+                    out["access-control-allow-origin"] = origin
+                    for k, v in self._simple:
+                        out[k] = v
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        except Exception:
+            if started:
+                raise
+            log.exception("Unhandled exception in %s %s", scope["method"], scope.get("path"))
+            await _send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", b"21")],
+            })
+            await send({"type": "http.response.body", "body": b"Internal Server Error"})
+
+    async def _send_preflight(self, send, origin: str, allowed: bool, request_headers: Optional[str]) -> None:
+        if not allowed:
+            body = b"Disallowed CORS origin"
+            headers = [(b"content-type", b"text/plain; charset=utf-8"), (b"vary", b"Origin")]
+            await send({"type": "http.response.start", "status": 400,
+                        "headers": headers + [(b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        pairs = [("access-control-allow-origin", origin), ("vary", "Origin"), *self._preflight]
+        if request_headers:
+            pairs.append(("access-control-allow-headers", request_headers))
+        pairs += [("content-type", "text/plain; charset=utf-8"), ("content-length", "2")]
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in pairs],
+        })
+        await send({"type": "http.response.body", "body": b"OK"})
@@ -1,15 +1,43 @@
 ﻿# app/emailer.py
+import hashlib
+import heapq
+import importlib.util
+import itertools
+import logging
 import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import List, Optional, Tuple
 
-try:
-    import resend  
-except ImportError:  
-    resend = None  
+# resend (and the requests stack under it) is imported on the first real send
+HAS_RESEND = importlib.util.find_spec("resend") is not None
 
 RESEND_API_KEY = os.getenv("RESEND_API_KEY", "")
 EMAIL_FROM = os.getenv("EMAIL_FROM", "No-Reply <noreply@localhost>")
 
-__all__ = ["send_email", "verification_email_html", "reset_email_html"]
+# Outbox tuning (see enqueue_email)
+EMAIL_OUTBOX = os.getenv("EMAIL_OUTBOX", "1") == "1"
+EMAIL_OUTBOX_MAX = int(os.getenv("EMAIL_OUTBOX_MAX", "10000"))
+EMAIL_BATCH_SIZE = min(100, int(os.getenv("EMAIL_BATCH_SIZE", "100")))  # Resend caps batches at 100
+EMAIL_BATCH_WINDOW = float(os.getenv("EMAIL_BATCH_WINDOW", "0.2"))      # seconds to gather a batch
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_BACKOFF_BASE = float(os.getenv("EMAIL_BACKOFF_BASE", "1.0"))
+EMAIL_BACKOFF_MAX = float(os.getenv("EMAIL_BACKOFF_MAX", "60"))
+
+log = logging.getLogger("uvicorn.error")
+
+__all__ = [
+    "send_email",
+    "enqueue_email",
+    "outbox_stats",
+    "flush_outbox",
+    "verification_email_html",
+    "reset_email_html",
+]
 
 
 def send_email(to: str, subject: str, html: str) -> dict:
@@ -30,10 +58,12 @@ def send_email(to: str, subject: str, html: str) -> dict:
         return {"mode": "console", "to": to, "subject": subject}
 
     # No key or library: behave as a no-op so tests don't fail.
-    if not RESEND_API_KEY or resend is None:
+    if not RESEND_API_KEY or not HAS_RESEND:
         return {"skipped": True, "to": to, "subject": subject}
 
     # Real send via Resend
+    import resend
+
     resend.api_key = RESEND_API_KEY
     return resend.Emails.send({
         "from": EMAIL_FROM,
@@ -43,6 +73,186 @@ def send_email(to: str, subject: str, html: str) -> dict:
     })
 
 
+# ---- outbox: requests enqueue, a background thread talks to Resend ----
+_outbox: "queue.Queue[dict]" = queue.Queue(maxsize=EMAIL_OUTBOX_MAX)
+_dead_letters: deque = deque(maxlen=1000)
+_stats = {"queued": 0, "sent": 0, "retries": 0, "dead": 0}
+_stats_lock = threading.Lock()
+_dispatcher = None
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _dead_letter(msgs: list, reason: str) -> None:
+    for m in msgs:
+        _dead_letters.append({**m, "reason": reason, "dead_at": time.time()})
+    _bump("dead", len(msgs))
+    log.error("email dead-lettered (%d msg): %s", len(msgs), reason)
+
+
+def enqueue_email(to: str, subject: str, html: str) -> dict:
+    """
+    Queue an email and return immediately; the dispatcher thread delivers it.
+    - EMAIL_MODE=console or EMAIL_OUTBOX=0: deliver inline via send_email (tests/dev).
+    - No key or library: same no-op as send_email.
+    """
+    email_mode = os.getenv("EMAIL_MODE", "").strip().lower()
+    if email_mode == "console" or not EMAIL_OUTBOX:
+        return send_email(to, subject, html)
+    if not RESEND_API_KEY or not HAS_RESEND:
+        return {"skipped": True, "to": to, "subject": subject}
+
+    msg = {"id": uuid.uuid4().hex, "to": to, "subject": subject, "html": html, "attempts": 0}
+    try:
+        _outbox.put_nowait(msg)
+    except queue.Full:
+        _dead_letter([msg], "outbox full")
+        return {"queued": False, "to": to, "subject": subject}
+    _bump("queued")
+    _ensure_dispatcher()
+    return {"queued": True, "id": msg["id"], "to": to, "subject": subject}
+
+
+def _send_batch(msgs: list) -> None:
+    import resend
+
+    resend.api_key = RESEND_API_KEY
+    params = [{"from": EMAIL_FROM, "to": [m["to"]], "subject": m["subject"], "html": m["html"]} for m in msgs]
+    # Same messages -> same key, so a retry after a timeout can't double-send
+    key = hashlib.sha256("|".join(m["id"] for m in msgs).encode()).hexdigest()
+    if len(params) == 1:
+        resend.Emails.send(params[0], {"idempotency_key": key})
+    else:
+        resend.Batch.send(params, {"idempotency_key": key})
+
+
+def _done(msgs: list) -> None:
+    for _ in msgs:
+        _outbox.task_done()
+
+
+def _status(e: Exception) -> Optional[int]:
+    """HTTP status of a provider error (resend sets `code`), None for transport errors."""
+    code = getattr(e, "code", None)
+    if code is None:
+        code = getattr(getattr(e, "response", None), "status_code", None)
+    try:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retryable(e: Exception) -> bool:
+    status = _status(e)
+    return status is None or status == 429 or status >= 500
+
+
+def _deliver(batch: list) -> List[Tuple[float, list]]:
+    """
+    One attempt at `batch`; returns what is left to retry as (not_before,
+    messages) pairs, empty once everything is sent or dead-lettered. A
+    retried batch keeps its messages together, so it reuses its idempotency
+    key.
+
+    A 4xx other than 429 won't go away on retry and, for a batch, names no
+    message: a single message is dead-lettered at once, a batch is split
+    into single messages so only the offending one ends up there.
+    """
+    try:
+        _send_batch(batch)
+    except Exception as e:
+        if not _retryable(e):
+            if len(batch) > 1:
+                now = time.monotonic()
+                return [(now, [m]) for m in batch]
+            _dead_letter(batch, f"{type(e).__name__}: {e}")
+            _done(batch)
+            return []
+        for m in batch:
+            m["attempts"] += 1
+        dead = [m for m in batch if m["attempts"] >= EMAIL_MAX_ATTEMPTS]
+        if dead:
+            _dead_letter(dead, f"{type(e).__name__}: {e}")
+            _done(dead)
+        batch = [m for m in batch if m["attempts"] < EMAIL_MAX_ATTEMPTS]
+        if not batch:
+            return []
+        _bump("retries")
+        attempt = batch[0]["attempts"]
+        delay = min(EMAIL_BACKOFF_MAX, EMAIL_BACKOFF_BASE * 2 ** (attempt - 1))
+        return [(time.monotonic() + delay * (0.5 + random.random() / 2), batch)]  # jittered exponential backoff
+    _bump("sent", len(batch))
+    _done(batch)
+    return []
+
+
+def _dispatch_loop() -> None:
+    # failed batches wait here for their not-before time instead of the
+    # thread sleeping on them, so fresh mail (password resets) keeps flowing
+    retries: list = []  # heap of (not_before, seq, batch)
+    seq = itertools.count()
+    while True:
+        now = time.monotonic()
+        if retries and retries[0][0] <= now:
+            batch = heapq.heappop(retries)[2]
+        else:
+            try:
+                batch = [_outbox.get(timeout=retries[0][0] - now if retries else None)]
+            except queue.Empty:
+                continue  # a retry is due
+            deadline = time.monotonic() + EMAIL_BATCH_WINDOW
+            while len(batch) < EMAIL_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(_outbox.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        try:
+            later = _deliver(batch)
+        except Exception as e:  # pragma: no cover
+            _dead_letter(batch, f"dispatcher error: {e}")
+            _done(batch)
+            continue
+        for not_before, msgs in later:
+            heapq.heappush(retries, (not_before, next(seq), msgs))
+
+
+def _ensure_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        return
+    with _stats_lock:
+        if _dispatcher is None:
+            _dispatcher = threading.Thread(target=_dispatch_loop, name="email-outbox", daemon=True)
+            _dispatcher.start()
+
+
+def flush_outbox(timeout: float = 10.0) -> bool:
+    """Block until everything queued so far was sent or dead-lettered."""
+    end = time.monotonic() + timeout
+    while _outbox.unfinished_tasks:
+        if time.monotonic() >= end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def outbox_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out["pending"] = _outbox.qsize()
+    out["dead_letters"] = [
+        {k: m.get(k) for k in ("id", "to", "subject", "attempts", "reason", "dead_at")}
+        for m in list(_dead_letters)[-20:]
+    ]
+    return out
+
+
 def verification_email_html(verify_url: str) -> str:
     btn_style = (
         "display:inline-block;padding:10px 16px;border-radius:6px;"
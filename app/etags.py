@@ -0,0 +1,90 @@
+# app/etags.py
+"""
+Weak ETags for the album / photo listings.
+
+Every write path bumps a counter stored on the item the listing hangs off:
+
+* Albums.version          – photos of that album changed (upload, delete)
+* Users.albums_version    – the user's album list changed (create, rename,
+                            delete, or a cover changed because of an upload
+                            or photo delete)
+
+The listing ETag is built from that counter, the query parameters and a time
+window, so a conditional GET costs one GetItem and never touches the
+PhotoMeta index. The window matters: the body carries presigned URLs that
+expire after an hour, and a 304 must not keep a client on URLs that are
+about to die. ETAG_WINDOW_SECONDS (default 1800, half the URL lifetime)
+bounds how old a revalidated body can be.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import time
+from typing import Optional
+
+from fastapi import Request, Response
+
+from . import pagecache, singleflight
+from .storage import store
+
+log = logging.getLogger("uvicorn.error")
+
+ETAG_WINDOW_SECONDS = int(os.getenv("ETAG_WINDOW_SECONDS", "1800"))
+ALBUM_VERSION = "version"
+USER_ALBUMS_VERSION = "albums_version"
+CACHE_CONTROL = "private, no-cache"  # always revalidate, never share
+
+
+def listing_etag(*parts) -> str:
+    window = int(time.time() // ETAG_WINDOW_SECONDS)
+    raw = "\x1f".join(str(p) for p in (*parts, window))
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def matches(request: Request, etag: str) -> bool:
+    """If-None-Match check with weak comparison (RFC 9110 §13.1.2)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in header.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_headers(response: Response, etag: Optional[str]) -> Response:
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def _bump(fn, *args) -> None:
+    # the write already happened; a failed bump only delays revalidation
+    try:
+        fn(*args)
+    except Exception as e:
+        log.warning("listing version bump failed: %s", e)
+
+
+def bump_user(user_id: str) -> None:
+    _bump(store.users.incr, user_id, USER_ALBUMS_VERSION)
+
+
+def bump_album(album_id: str, owner: str) -> None:
+    """Photos of `album_id` changed: its listing and the owner's covers are stale."""
+    _bump(store.albums.incr, album_id, ALBUM_VERSION)
+    # an album read in flight may predate the bump; later requests must not join it
+    singleflight.forget(("album", album_id))
+    pagecache.photo_pages.drop_album(album_id)  # unreachable under the new version anyway; free them now
+    bump_user(owner)
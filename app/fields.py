@@ -0,0 +1,50 @@
+# app/fields.py
+"""
+`?fields=` sparse fieldsets for the read endpoints.
+
+A router declares the response fields it can return and, for computed ones,
+the stored attributes they are built from (`url` <- `s3_key`). The request's
+field list then becomes the storage projection (a DynamoDB
+ProjectionExpression), computed fields that were not asked for are skipped
+entirely (no presigning), and the response is trimmed to what was asked.
+
+No `fields` parameter means the full, unchanged response.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException
+
+from .storage.base import project as trim  # noqa: F401  (response trimming = store trimming)
+
+Sources = Dict[str, Sequence[str]]
+
+
+def parse(value: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Split "a, b" into ["a", "b"]; None when the parameter is absent. 400 on unknown names."""
+    if value is None:
+        return None
+    names = list(dict.fromkeys(p.strip() for p in value.split(",") if p.strip()))
+    allowed = set(allowed)
+    unknown = [n for n in names if n not in allowed]
+    if unknown:
+        raise HTTPException(400, f"unknown fields: {', '.join(unknown)}")
+    if not names:
+        raise HTTPException(400, "fields must name at least one field")
+    return names
+
+
+def attributes(requested: Optional[Iterable[str]], sources: Sources, *keys: str) -> Optional[List[str]]:
+    """Stored attributes to read for `requested` (None = all), always including `keys`."""
+    if requested is None:
+        return None
+    out = list(keys)
+    for name in requested:
+        out.extend(sources.get(name, (name,)))
+    return list(dict.fromkeys(out))
+
+
+def wants(requested: Optional[Iterable[str]], name: str) -> bool:
+    return requested is None or name in requested
+
@@ -0,0 +1,221 @@
+# app/ingest.py
+"""
+Admission control for uploads: POST /photos/upload, PUT /users/me/avatar and
+the presigned PUT /blobs/... of the memory / local backends.
+
+Every upload is spooled to disk before it reaches the blob store; a photo
+upload twice over (the multipart parser's temp file, then the UPLOAD_DIR copy
+Pillow reads). Unbounded, a burst of large uploads fills the disk and ties up
+worker threads, and unrelated endpoints go down with it. Before the body is
+read, each upload reserves:
+
+* one of UPLOAD_MAX_CONCURRENT slots (and UPLOAD_MAX_PER_USER for its user)
+* its size times the copies it spools against UPLOAD_SPOOL_BYTES (and
+  UPLOAD_SPOOL_BYTES_PER_USER)
+
+The size is the request's Content-Length, or UPLOAD_MAX_BYTES when it has
+none. A body that turns out longer than its reservation is cut off with a
+413. Uploads that don't fit wait in FIFO order for up to UPLOAD_QUEUE_TIMEOUT
+seconds. After that they get a 429 with Retry-After. A single upload
+that could never fit gets a 413 at once.
+
+Waiting happens on the event loop (an asyncio.Event per waiter, set from
+whichever thread releases), so a queued upload holds no worker thread.
+The budget is per process; with several workers per host, size it as
+(disk you can spare) / workers.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from fastapi import HTTPException
+
+MiB = 1024 * 1024
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * MiB)))
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "16"))
+UPLOAD_MAX_PER_USER = int(os.getenv("UPLOAD_MAX_PER_USER", "4"))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * MiB)))
+UPLOAD_SPOOL_BYTES_PER_USER = int(os.getenv("UPLOAD_SPOOL_BYTES_PER_USER", str(256 * MiB)))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "10"))
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "5"))
+UPLOAD_DIR = Path("uploads")  # spool files; created on first upload
+
+
+class _Waiter:
+    __slots__ = ("user_id", "size", "loop", "event", "granted")
+
+    def __init__(self, user_id: str, size: int):
+        self.user_id, self.size = user_id, size
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.granted = False
+
+
+class Budget:
+    """Concurrency + byte budget, global and per user."""
+
+    def __init__(
+        self,
+        max_uploads: int = UPLOAD_MAX_CONCURRENT,
+        max_bytes: int = UPLOAD_SPOOL_BYTES,
+        user_uploads: int = UPLOAD_MAX_PER_USER,
+        user_bytes: int = UPLOAD_SPOOL_BYTES_PER_USER,
+    ):
+        self.max_uploads, self.max_bytes = max_uploads, max_bytes
+        self.user_uploads, self.user_bytes = user_uploads, user_bytes
+        self._lock = threading.Lock()
+        self._uploads = 0
+        self._bytes = 0
+        self._users: Dict[str, List[int]] = {}  # user_id -> [uploads, bytes]
+        self._waiters: Deque[_Waiter] = deque()
+        self._metrics: Dict[str, Any] = {
+            "admitted": 0, "queued": 0, "rejected": 0, "too_large": 0, "queue_seconds_total": 0.0,
+        }
+
+    def can_ever_fit(self, size: int) -> bool:
+        return size <= min(self.max_bytes, self.user_bytes)
+
+    def _fits(self, user_id: str, size: int) -> bool:
+        n, b = self._users.get(user_id, (0, 0))
+        return (
+            self._uploads < self.max_uploads and self._bytes + size <= self.max_bytes
+            and n < self.user_uploads and b + size <= self.user_bytes
+        )
+
+    def _take(self, user_id: str, size: int) -> None:
+        self._uploads += 1
+        self._bytes += size
+        u = self._users.setdefault(user_id, [0, 0])
+        u[0] += 1
+        u[1] += size
+
+    def _grant_waiters(self) -> None:
+        # FIFO, but one user at their cap doesn't hold up everyone behind them
+        for w in list(self._waiters):
+            if self._fits(w.user_id, w.size):
+                self._waiters.remove(w)
+                self._take(w.user_id, w.size)
+                w.granted = True
+                w.loop.call_soon_threadsafe(w.event.set)
+
+    async def acquire(self, user_id: str, size: int, timeout: float = UPLOAD_QUEUE_TIMEOUT) -> None:
+        with self._lock:
+            if not self._waiters and self._fits(user_id, size):
+                self._take(user_id, size)
+                self._metrics["admitted"] += 1
+                return
+            waiter = _Waiter(user_id, size)
+            self._waiters.append(waiter)
+            self._grant_waiters()
+            if waiter.granted:  # only waiting behind users at their cap
+                self._metrics["admitted"] += 1
+                return
+            self._metrics["queued"] += 1
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter.event.wait(), timeout)
+        except BaseException as e:  # timed out, or the client went away while queued
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+                    self._metrics["rejected"] += 1
+                    self._metrics["queue_seconds_total"] += time.monotonic() - t0
+            if not granted:
+                raise
+            if not isinstance(e, asyncio.TimeoutError):
+                self.release(user_id, size)
+                raise
+            # granted just as the deadline hit: take the slot
+        with self._lock:
+            self._metrics["queue_seconds_total"] += time.monotonic() - t0
+            self._metrics["admitted"] += 1
+
+    def release(self, user_id: str, size: int) -> None:
+        with self._lock:
+            self._uploads -= 1
+            self._bytes -= size
+            u = self._users[user_id]
+            u[0] -= 1
+            u[1] -= size
+            if u[0] <= 0:
+                del self._users[user_id]
+            self._grant_waiters()
+
+    def count(self, event: str) -> None:
+        with self._lock:
+            self._metrics[event] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._metrics)
+            out.update(
+                active=self._uploads, spool_bytes=self._bytes, waiting=len(self._waiters),
+                max_uploads=self.max_uploads, max_bytes=self.max_bytes,
+            )
+        return out
+
+
+budget = Budget()
+
+
+def reservation(content_length: Optional[str], copies: int = 1) -> int:
+    """Bytes to reserve for a request body: its Content-Length, else the per-upload max.
+
+    413 if too big, `copies` being how many times the upload spools it to disk.
+    """
+    try:
+        size = int(content_length) if content_length is not None else UPLOAD_MAX_BYTES
+    except ValueError:
+        raise HTTPException(400, "invalid Content-Length")
+    if size > UPLOAD_MAX_BYTES or not budget.can_ever_fit(size * copies):
+        budget.count("too_large")
+        limit = min(UPLOAD_MAX_BYTES, min(budget.max_bytes, budget.user_bytes) // copies)
+        raise HTTPException(413, f"upload larger than {limit} bytes")
+    return max(0, size)
+
+
+@asynccontextmanager
+async def admit(user_id: str, size: int, timeout: Optional[float] = None, copies: int = 1):
+    """An upload slot plus `size` x `copies` spool bytes for the duration of the block."""
+    size *= copies
+    try:
+        await budget.acquire(user_id, size, UPLOAD_QUEUE_TIMEOUT if timeout is None else timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=429,
+            detail="too many uploads in progress, retry shortly",
+            headers={"Retry-After": str(max(1, UPLOAD_RETRY_AFTER))},
+        )
+    try:
+        yield
+    finally:
+        budget.release(user_id, size)
+
+
+def limit_body(receive, limit: int):
+    """Wrap an ASGI `receive` so a body longer than `limit` bytes ends in a 413."""
+    seen = 0
+
+    async def _receive():
+        nonlocal seen
+        message = await receive()
+        if message["type"] == "http.request":
+            seen += len(message.get("body", b""))
+            if seen > limit:
+                raise HTTPException(413, f"upload larger than its {limit}-byte reservation")
+        return message
+
+    return _receive
+
+
+def stats() -> Dict[str, Any]:
+    return budget.stats()
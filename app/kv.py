@@ -0,0 +1,298 @@
+# app/kv.py
+"""
+Shared cache / KV backend for state that must be the same in every worker.
+
+Several uvicorn workers per host, several hosts: anything cached in-process
+is duplicated per worker and can't be invalidated from another one. This
+module gives those caches one shared tier and a broadcast channel:
+
+* RedisKV – any Redis-protocol server (Redis, Valkey, KeyDB, ElastiCache),
+            SHARED_CACHE_URL=redis://host:6379/0. Multi-key reads go out as
+            one pipeline, conditional fills are one Lua call, pub/sub runs
+            on a daemon thread.
+* LocalKV – same semantics in-process (SHARED_CACHE_URL=local): tests and
+            single-worker dev.
+
+Unset SHARED_CACHE_URL means no shared tier; callers keep their per-process
+behaviour. Every RedisKV call degrades to "miss" / no-op when the server is
+unreachable: the shared tier is a cache, never the source of truth.
+
+Values are bytes. Hashes carry a version field (VERSION_FIELD) so a reader
+that loaded from the database can refuse to fill an entry that was
+invalidated while it was reading (`hset_if_version`).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("uvicorn.error")
+
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "").strip()
+KV_PREFIX = os.getenv("SHARED_CACHE_PREFIX", "cps:")
+KV_TIMEOUT = float(os.getenv("SHARED_CACHE_TIMEOUT", "0.1"))
+MGET_CHUNK = 100
+VERSION_FIELD = "__v"
+
+Listener = Callable[[str], None]
+# (key, field, value, expected version or None for "no version yet")
+Fill = Tuple[str, str, bytes, Optional[str]]
+
+
+class LocalKV:
+    """In-process stand-in for RedisKV (strings, hashes, TTLs, pub/sub)."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[object, Optional[float]]] = {}  # key -> (bytes | dict, expires_at)
+        self._listeners: Dict[str, List[Listener]] = {}
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, exp = entry
+        if exp is not None and exp <= self._clock():
+            del self._data[key]
+            return None
+        return value
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return self._clock() + ttl if ttl else None
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._live(key)
+        return value if isinstance(value, bytes) else None
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        with self._lock:
+            values = [self._live(k) for k in keys]
+        return [v if isinstance(v, bytes) else None for v in values]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._data[key] = (bytes(value), self._expiry(ttl))
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for k in keys:
+                self._data.pop(k, None)
+
+    def hmget_many(self, requests: Sequence[Tuple[str, Sequence[str]]]) -> List[List[Optional[bytes]]]:
+        out = []
+        with self._lock:
+            for key, fields in requests:
+                h = self._live(key)
+                h = h if isinstance(h, dict) else {}
+                out.append([h.get(f) for f in fields])
+        return out
+
+    def hash_reset(self, key: str, version: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = ({VERSION_FIELD: version.encode()}, self._expiry(ttl))
+
+    def hset_if_version(self, fills: Sequence[Fill], ttl: float) -> int:
+        stored = 0
+        with self._lock:
+            for key, field, value, expected in fills:
+                h = self._live(key)
+                current = h.get(VERSION_FIELD) if isinstance(h, dict) else None
+                if current != (expected.encode() if expected is not None else None):
+                    continue
+                if not isinstance(h, dict):
+                    h = {}
+                    self._data[key] = (h, self._expiry(ttl))
+                h[field] = bytes(value)
+                stored += 1
+        return stored
+
+    def publish(self, channel: str, message: str) -> None:
+        with self._lock:
+            listeners = list(self._listeners.get(channel, ()))
+        for fn in listeners:
+            try:
+                fn(message)
+            except Exception as e:  # pragma: no cover
+                log.warning("kv listener on %s failed: %s", channel, e)
+
+    def subscribe(self, channel: str, fn: Listener) -> None:
+        with self._lock:
+            self._listeners.setdefault(channel, []).append(fn)
+
+
+# KEYS[1]=hash, ARGV = expected version ('' = none), field, value, ttl ms; 1 when stored
+_LUA_HSET_IF_VERSION = """
+local v = redis.call('HGET', KEYS[1], ARGV[5])
+if (v == false and ARGV[1] == '') or v == ARGV[1] then
+  redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+  if redis.call('PTTL', KEYS[1]) < 0 then redis.call('PEXPIRE', KEYS[1], ARGV[4]) end
+  return 1
+end
+return 0
+"""
+
+
+class RedisKV:
+    """Redis-protocol client; errors are logged (at most every 30 s) and read as misses."""
+
+    def __init__(self, url: str, prefix: str = KV_PREFIX, timeout: float = KV_TIMEOUT):
+        import redis  # type: ignore  # only paid for when SHARED_CACHE_URL is set
+
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._pubsub_client = redis.Redis.from_url(url, socket_connect_timeout=timeout)  # blocking reads
+        self._fill = self._client.register_script(_LUA_HSET_IF_VERSION)
+        self._prefix = prefix
+        self._listeners: Dict[str, List[Listener]] = {}
+        self._pubsub_lock = threading.Lock()
+        self._pubsub_thread = None
+        self._last_warning = 0.0
+
+    def _warn(self, op: str, e: Exception) -> None:
+        now = time.monotonic()
+        if now - self._last_warning > 30:
+            self._last_warning = now
+            log.warning("shared cache %s failed, treating as a miss: %s", op, e)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self._client.get(self._prefix + key)
+        except Exception as e:
+            self._warn("GET", e)
+            return None
+
+    def mget(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for i in range(0, len(keys), MGET_CHUNK):
+                pipe.mget([self._prefix + k for k in keys[i : i + MGET_CHUNK]])
+            return [v for chunk in pipe.execute() for v in chunk]
+        except Exception as e:
+            self._warn("MGET", e)
+            return [None] * len(keys)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        try:
+            self._client.set(self._prefix + key, value, px=int(ttl * 1000) if ttl else None)
+        except Exception as e:
+            self._warn("SET", e)
+
+    def delete(self, *keys: str) -> None:
+        try:
+            self._client.delete(*[self._prefix + k for k in keys])
+        except Exception as e:
+            self._warn("DEL", e)
+
+    def hmget_many(self, requests: Sequence[Tuple[str, Sequence[str]]]) -> List[List[Optional[bytes]]]:
+        if not requests:
+            return []
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key, fields in requests:
+                pipe.hmget(self._prefix + key, list(fields))
+            return pipe.execute()
+        except Exception as e:
+            self._warn("HMGET", e)
+            return [[None] * len(fields) for _, fields in requests]
+
+    def hash_reset(self, key: str, version: str, ttl: float) -> None:
+        try:
+            pipe = self._client.pipeline(transaction=True)
+            pipe.delete(self._prefix + key)
+            pipe.hset(self._prefix + key, VERSION_FIELD, version)
+            pipe.pexpire(self._prefix + key, int(ttl * 1000))
+            pipe.execute()
+        except Exception as e:
+            self._warn("hash reset", e)
+
+    def hset_if_version(self, fills: Sequence[Fill], ttl: float) -> int:
+        if not fills:
+            return 0
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for key, field, value, expected in fills:
+                self._fill(
+                    keys=[self._prefix + key],
+                    args=[expected or "", field, value, int(ttl * 1000), VERSION_FIELD],
+                    client=pipe,
+                )
+            return sum(int(r) for r in pipe.execute())
+        except Exception as e:
+            self._warn("fill", e)
+            return 0
+
+    def publish(self, channel: str, message: str) -> None:
+        try:
+            self._client.publish(self._prefix + channel, message)
+        except Exception as e:
+            self._warn("PUBLISH", e)
+
+    def subscribe(self, channel: str, fn: Listener) -> None:
+        with self._pubsub_lock:
+            self._listeners.setdefault(self._prefix + channel, []).append(fn)
+            if self._pubsub_thread is None:
+                self._pubsub_thread = threading.Thread(target=self._listen, name="kv-pubsub", daemon=True)
+                self._pubsub_thread.start()
+
+    def _listen(self) -> None:
+        # one pattern subscription for all our channels, so channels added
+        # later never touch the connection the listener is reading from
+        while True:
+            try:
+                pubsub = self._pubsub_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(**{self._prefix + "*": self._dispatch})
+                break
+            except Exception as e:  # server down at boot: keep trying, TTLs cover the gap
+                self._warn("SUBSCRIBE", e)
+                time.sleep(5.0)
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._on_pubsub_error)
+
+    def _dispatch(self, msg) -> None:
+        channel, data = msg.get("channel"), msg.get("data")
+        channel = channel.decode() if isinstance(channel, bytes) else str(channel)
+        data = data.decode() if isinstance(data, bytes) else str(data)
+        with self._pubsub_lock:
+            listeners = list(self._listeners.get(channel, ()))
+        for fn in listeners:
+            try:
+                fn(data)
+            except Exception as e:  # pragma: no cover
+                log.warning("kv listener on %s failed: %s", channel, e)
+
+    def _on_pubsub_error(self, e, pubsub, thread) -> None:
+        # the connection is re-established (and re-subscribed) on the next read;
+        # messages published meanwhile are lost, TTLs cover that gap
+        self._warn("pub/sub", e)
+        time.sleep(1.0)
+
+
+_kv = None
+_kv_lock = threading.Lock()
+_kv_made = False
+
+
+def _make(url: str):
+    if not url:
+        return None
+    if url in ("local", "memory", "local://", "memory://"):
+        return LocalKV()
+    try:
+        return RedisKV(url)
+    except ImportError:
+        print("[BOOT] SHARED_CACHE_URL set but redis package missing; no shared cache tier")
+        return None
+
+
+def get_kv():
+    """The process-wide backend (LocalKV / RedisKV), or None when not configured."""
+    global _kv, _kv_made
+    with _kv_lock:
+        if not _kv_made:
+            _kv, _kv_made = _make(SHARED_CACHE_URL), True
+        return _kv
@@ -2,19 +2,18 @@
 from __future__ import annotations
 
 import os
-import re
 import time
 import logging
+from contextlib import asynccontextmanager
 from importlib import import_module
 from pathlib import Path
 
 from fastapi import FastAPI, Request, HTTPException, Response
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 try:
-    from app.auth import LoginIn, RegisterIn, login_user, register_user, TOKEN_TTL  # type: ignore
+    from app.auth import LoginIn, RegisterIn, login_user, register_user, revoke_token, TOKEN_TTL  # type: ignore
 except Exception:
     from pydantic import BaseModel
     TOKEN_TTL = 3600
@@ -34,6 +33,15 @@ except Exception:
     def login_user(_: "LoginIn"):
         return {"ok": False, "msg": "auth not wired"}
 
+    def revoke_token(_: str):
+        return None
+
+from app import metrics, startup, tracing
+from app.compression import CompressionMiddleware
+from app.cors import CORSMiddleware
+from app.responses import FastJSONResponse
+from app.ratelimit import check_login
+
 VERSION = "0.7.7"
 AUTH_BACKEND = os.getenv("AUTH_BACKEND", "dynamo").lower().strip()
 
@@ -41,7 +49,57 @@ AUTH_BACKEND = os.getenv("AUTH_BACKEND", "dynamo").lower().strip()
 _public_ui = (os.getenv("PUBLIC_UI_URL") or "").strip().rstrip("/")
 PUBLIC_UI_URL = _public_ui or None
 
-app = FastAPI(title="Cloud Photo-Share API", version=VERSION)
+# Behind Render/Vercel the peer is the proxy; only then trust X-Forwarded-For
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") == "1"
+
+# WARMUP=1: build AWS clients, open their connection pools and start the
+# bcrypt workers during startup instead of on the first requests
+WARMUP = os.getenv("WARMUP", "0") == "1"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "5"))
+
+def _warm_up() -> None:
+    from app import pwhash
+    from app.storage import BLOB_BACKEND, store
+
+    if store.backend == "dynamo" or BLOB_BACKEND == "s3":
+        from app import aws_config
+        aws_config.warm_up()
+    pwhash.warm_up()
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    from app.storage import store
+
+    # local content-addressed blobs: unreferenced objects are swept in the background
+    start_gc = getattr(store.blobs, "start_gc", None)
+    if start_gc is not None:
+        start_gc()
+    if WARMUP:
+        import anyio
+        import anyio.to_thread
+
+        t0 = time.perf_counter()
+        try:
+            # bounded: an unreachable endpoint must not hold up serving
+            with anyio.move_on_after(WARMUP_TIMEOUT) as scope:
+                await anyio.to_thread.run_sync(_warm_up, abandon_on_cancel=True)
+            if scope.cancelled_caught:
+                print(f"[BOOT] warm-up still running after {WARMUP_TIMEOUT}s; serving anyway")
+        except Exception as e:
+            print(f"[BOOT] warm-up failed: {e}")
+        startup.took("warm_up", time.perf_counter() - t0)
+    startup.mark("lifespan")
+    yield
+
+app = FastAPI(
+    title="Cloud Photo-Share API",
+    version=VERSION,
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,  # orjson + Decimal, see app/responses.py
+)
+
+# gzip/br for large JSON bodies; innermost, so the layers above see the final headers
+app.add_middleware(CompressionMiddleware)
 
 # --- CORS ---
 ALLOWED_ORIGINS: set[str] = {
@@ -55,40 +113,17 @@ if PUBLIC_UI_URL:
 # Allow any *.vercel.app (useful for preview deployments)
 VERCEL_REGEX = r"^https://.*\.vercel\.app$"
 
+# One pure-ASGI layer: memoized origin checks, cached preflights, and CORS
+# headers on every response for allowed origins – 500s included
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=list(ALLOWED_ORIGINS),
+    allow_origins=ALLOWED_ORIGINS,
     allow_origin_regex=VERCEL_REGEX,   # regex + explicit list
     allow_credentials=True,            # needed for cookies
-    allow_methods=["*"],               # let middleware handle OPTIONS & others
-    allow_headers=["*"],               # reflect requested headers automatically
     expose_headers=["Content-Disposition"],  # for downloads
 )
 
-def _is_allowed_origin(origin: str | None) -> bool:
-    if not origin:
-        return False
-    return (origin in ALLOWED_ORIGINS) or bool(re.match(VERCEL_REGEX, origin))
-
-# Safety net: always attach CORS headers even on unhandled errors
-@app.middleware("http")
-async def _ensure_cors_on_all(request: Request, call_next):
-    try:
-        response = await call_next(request)
-    except Exception as e:
-        import traceback
-        print("[ERROR] Unhandled exception in request:", repr(e))
-        traceback.print_exc()
-        response = PlainTextResponse("Internal Server Error", status_code=500)
-
-    origin = request.headers.get("origin")
-    if origin and _is_allowed_origin(origin):
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        response.headers["Vary"] = "Origin"
-    return response
-
-# ---- Make Dynamo/SDK errors visible (JSON) instead of opaque 500s, with CORS headers ----
+# ---- Make Dynamo/SDK errors visible (JSON) instead of opaque 500s (CORS headers come from app/cors.py) ----
 try:
     from botocore.exceptions import ClientError  # type: ignore
 
@@ -96,17 +131,28 @@ try:
     async def handle_client_error(request: Request, exc: "ClientError"):
         msg = getattr(exc, "response", {}).get("Error", {}).get("Message", str(exc))
         status = getattr(exc, "response", {}).get("ResponseMetadata", {}).get("HTTPStatusCode", 400)
-        headers: dict[str, str] = {}
-        origin = request.headers.get("origin")
-        if origin and _is_allowed_origin(origin):
-            headers["Access-Control-Allow-Origin"] = origin
-            headers["Access-Control-Allow-Credentials"] = "true"
-            headers["Vary"] = "Origin"
-        return JSONResponse({"detail": f"dynamo error: {msg}"}, status_code=status or 400, headers=headers)
+        return JSONResponse({"detail": f"dynamo error: {msg}"}, status_code=status or 400)
 except Exception:
     # If botocore isn't present (e.g., memory backend), do nothing.
     pass
 
+# ---- Per-request AWS tracing (Server-Timing + slow-request log) and Prometheus metrics ----
+# Metrics is outermost, so it times CORS and the error safety net too
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+try:
+    from app import aws_config
+
+    def _instrument(client) -> None:
+        metrics.instrument_botocore(client)
+        tracing.instrument_botocore(client)
+
+    # hooked in when each client is first built, so boot doesn't build them
+    aws_config.s3.on_build(_instrument)
+    aws_config.dyna.on_build(lambda resource: _instrument(resource.meta.client))
+except Exception as e:
+    print(f"[BOOT] AWS metrics/tracing hooks not installed: {e}")
+
 # --- static mounting when running in memory mode ---
 if AUTH_BACKEND == "memory":
     LOCAL_UPLOAD_ROOT = Path(os.getenv("LOCAL_UPLOAD_ROOT", "local_uploads"))
@@ -143,6 +189,7 @@ stats = _import_optional("app.routers.stats")
 auth_email = _import_optional("app.routers.auth_email")
 covers = _import_optional("app.routers.covers")
 util = _import_optional("app.routers.util")
+blobs = _import_optional("app.routers.blobs")
 
 _try_include(auth_email, "auth-email")
 _try_include(util, "util")
@@ -152,6 +199,7 @@ _try_include(users, "users")
 _try_include(account, "auth-extra")  # guarded include
 _try_include(stats, "stats")
 _try_include(covers, "covers")
+_try_include(blobs, "blobs")
 
 # ---- Auth endpoints: return auth outputs, and set cookie on /login ----
 log = logging.getLogger("uvicorn.error")
@@ -167,9 +215,18 @@ def register(body: RegisterIn):
         log.exception("register failed")
         raise HTTPException(status_code=400, detail=f"register failed: {type(e).__name__}: {e}")
 
+def _client_ip(request: Request) -> str | None:
+    if TRUST_PROXY_HEADERS:
+        fwd = request.headers.get("x-forwarded-for")
+        if fwd:
+            return fwd.split(",")[0].strip()
+    return request.client.host if request.client else None
+
 @app.post("/login")
 @app.post("/login/")
-def login(body: LoginIn, response: Response):
+def login(body: LoginIn, request: Request, response: Response):
+    # Throttle before any Users lookup / bcrypt so rejected attempts stay cheap
+    check_login(_client_ip(request), body.email)
     try:
         out = login_user(body)  # {"access_token": "..."}
     except HTTPException as he:
@@ -194,6 +251,25 @@ def login(body: LoginIn, response: Response):
     )
     return out
 
+@app.post("/logout")
+@app.post("/logout/")
+def logout(request: Request, response: Response):
+    # Revoke whichever token the client is holding (Bearer wins over cookie)
+    token = request.cookies.get("access_token")
+    authz = request.headers.get("authorization") or ""
+    if authz.lower().startswith("bearer "):
+        token = authz[7:].strip()
+    if token:
+        revoke_token(token)
+    response.delete_cookie(
+        key="access_token",
+        path="/",
+        httponly=True,
+        secure=True,
+        samesite="none",
+    )
+    return {"ok": True}
+
 @app.get("/")
 def root():
     return {"name": "Cloud Photo-Share API", "version": VERSION, "backend": AUTH_BACKEND}
@@ -203,8 +279,22 @@ def health():
     return {"status": "ok", "timestamp": time.time()}
 
 @app.get("/healthz")
-def healthz():
-    return {"status": "ok", "timestamp": time.time()}
+def healthz(timing: bool = False):
+    startup.first_healthz(log)
+    out = {"status": "ok", "timestamp": time.time()}
+    if timing:
+        out["startup_ms"] = startup.timings()
+    return out
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    # async on purpose: the thread-pool gauges have to be read on the event loop
+    if metrics.METRICS_TOKEN:
+        authz = request.headers.get("authorization") or ""
+        if authz != f"Bearer {metrics.METRICS_TOKEN}":
+            raise HTTPException(status_code=401, detail="metrics token required")
+    metrics.collect_threadpool()
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/feed")
 def get_feed(limit: int = 20):
@@ -215,3 +305,4 @@ print("[BOOT] AUTH_BACKEND:", AUTH_BACKEND)
 print("[BOOT] PUBLIC_UI_URL:", PUBLIC_UI_URL)
 print("[BOOT] ALLOWED_ORIGINS:", ALLOWED_ORIGINS)
 print("[BOOT] allow_origin_regex:", VERCEL_REGEX)
+startup.mark("import")
@@ -0,0 +1,453 @@
+# app/metrics.py
+"""
+Prometheus metrics, exported as text on GET /metrics.
+
+A small in-process registry (Counter / Gauge / Histogram with labels, same
+call style as prometheus_client) so we don't need another dependency for a
+handful of series:
+
+* http_request_duration_seconds{method,route,status}  – route *template*
+  (/albums/{album_id}), never the raw path, to keep cardinality bounded
+* http_requests_in_flight
+* threadpool_* – anyio worker threads busy / limit / tasks waiting (sync
+  endpoints queue here when all workers are taken)
+* aws_request_duration_seconds{service,operation}, aws_errors_total{...,code},
+  aws_throttles_total{service,operation} – from botocore event hooks on the
+  shared clients, counted per attempt so throttles that were retried away
+  still show up
+* pwhash_* / email_outbox_* – queue depth of the bcrypt pool and the outbox
+* item_cache_*{table} – read-through item cache hits / misses / size
+
+Scrape-time values are filled in by collectors registered with
+`register_collector`.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _labelstr(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self._samples())
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    # a counter mirroring a running total kept elsewhere (a module's stats()),
+    # copied in by a collector at scrape time; the total must only ever grow
+    set_total = set
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def set_total(self, value: float) -> None:
+        self._default().set_total(value)
+
+    def _samples(self):
+        for key, c in sorted(self._children.items()):
+            yield f"{self.name}{_labelstr(self.labelnames, key)} {_fmt(c.value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def _samples(self):
+        for key, h in sorted(self._children.items()):
+            with h._lock:
+                counts, total, n = list(h.counts), h.sum, h.count
+            acc = 0
+            for le, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                le_label = 'le="' + _fmt(le) + '"'
+                yield f"{self.name}_bucket{_labelstr(self.labelnames, key, le_label)} {acc}"
+            yield f"{self.name}_sum{_labelstr(self.labelnames, key)} {_fmt(total)}"
+            yield f"{self.name}_count{_labelstr(self.labelnames, key)} {n}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def register_collector(self, fn: Callable[[], None]) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self._collectors:
+            try:
+                fn()
+            except Exception:
+                pass
+        return "".join(m.render() for m in self._metrics)
+
+
+REGISTRY = Registry()
+register_collector = REGISTRY.register_collector
+
+# ---- HTTP ----
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+# ---- worker threads (sync endpoints, run_in_threadpool) ----
+THREADPOOL_BUSY = Gauge("threadpool_busy_threads", "anyio worker threads currently running a sync endpoint")
+THREADPOOL_LIMIT = Gauge("threadpool_max_threads", "anyio worker thread limit")
+THREADPOOL_WAITING = Gauge("threadpool_queue_depth", "tasks waiting for a free anyio worker thread")
+
+# ---- AWS (botocore) ----
+AWS_LATENCY = Histogram(
+    "aws_request_duration_seconds", "botocore API call latency, including retries",
+    ("service", "operation"),
+)
+AWS_ERRORS = Counter("aws_errors_total", "botocore API calls that failed", ("service", "operation", "code"))
+AWS_THROTTLES = Counter(
+    "aws_throttles_total", "throttled botocore attempts (retried or not)", ("service", "operation")
+)
+
+# ---- in-process queues ----
+PWHASH_INFLIGHT = Gauge("pwhash_inflight", "bcrypt jobs queued or running in the password-hash pool")
+PWHASH_REJECTED = Counter("pwhash_rejected_total", "bcrypt jobs rejected because the pool queue was full")
+PWHASH_QUEUE_SECONDS = Counter("pwhash_queue_seconds_total", "time bcrypt jobs spent waiting for a worker")
+OUTBOX_PENDING = Gauge("email_outbox_pending", "emails waiting in the outbox")
+OUTBOX_EVENTS = Counter("email_outbox_events_total", "outbox events by kind", ("kind",))
+ITEM_CACHE_EVENTS = Counter(
+    "item_cache_requests_total", "item cache lookups and removals by result", ("table", "result")
+)
+ITEM_CACHE_SIZE = Gauge("item_cache_entries", "entries held by the item cache", ("table",))
+SINGLEFLIGHT_CALLS = Counter(
+    "singleflight_calls_total", "coalesced reads: leader ran the backend call, shared got its result", ("op", "result")
+)
+PAGE_CACHE_EVENTS = Counter(
+    "page_cache_requests_total", "photo page cache lookups and removals by result", ("result",)
+)
+PAGE_CACHE_BYTES = Gauge("page_cache_bytes", "rendered photo page bytes held by the page cache")
+PAGE_CACHE_ENTRIES = Gauge("page_cache_entries", "photo pages held by the page cache")
+UPLOAD_ACTIVE = Gauge("upload_active", "multipart uploads admitted and in progress")
+UPLOAD_WAITING = Gauge("upload_queue_depth", "multipart uploads waiting for admission")
+UPLOAD_SPOOL_BYTES = Gauge("upload_spool_bytes", "bytes reserved by admitted uploads for spooling")
+UPLOAD_SPOOL_LIMIT = Gauge("upload_spool_bytes_limit", "spool byte budget (UPLOAD_SPOOL_BYTES)")
+UPLOAD_ADMISSION = Counter(
+    "upload_admission_total", "upload admission decisions: admitted, queued, rejected (429), too_large (413)",
+    ("result",),
+)
+UPLOAD_QUEUE_SECONDS = Counter("upload_queue_seconds_total", "time uploads spent waiting for admission")
+SINGLEFLIGHT_IN_FLIGHT = Gauge("singleflight_in_flight", "coalesced reads currently running", ("op",))
+RENDER_EVENTS = Counter(
+    "render_requests_total", "on-demand renders: cache hits, misses, renders, failed (422), rejected (503)", ("result",)
+)
+RENDER_INFLIGHT = Gauge("render_inflight", "renders running or queued for the render pool")
+RENDER_SECONDS = Counter("render_seconds_total", "time spent rendering, queue wait included")
+RENDER_CACHE_BYTES = Gauge("render_cache_bytes", "bytes held by the on-disk render cache")
+RENDER_CACHE_FILES = Gauge("render_cache_files", "files held by the on-disk render cache")
+RENDER_CACHE_EVICTIONS = Counter("render_cache_evictions_total", "files evicted from the on-disk render cache")
+
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "ProvisionedThroughputExceededException", "RequestLimitExceeded",
+    "TransactionInProgressException", "SlowDown", "RequestThrottled", "BandwidthLimitExceeded",
+    "LimitExceededException", "PriorRequestNotComplete",
+}
+
+
+class MetricsMiddleware:
+    """Pure ASGI: times every HTTP request and labels it with the matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")  # set by the router on this same scope dict
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(scope["method"], template, str(status[0])).observe(time.perf_counter() - t0)
+
+
+def collect_threadpool() -> None:
+    """Must run on the event loop (the /metrics handler is async for this reason)."""
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    stats = limiter.statistics()
+    THREADPOOL_BUSY.set(stats.borrowed_tokens)
+    THREADPOOL_LIMIT.set(stats.total_tokens)
+    THREADPOOL_WAITING.set(stats.tasks_waiting)
+
+
+def collect_queues() -> None:
+    from app import emailer, pwhash
+
+    ps = pwhash.stats()
+    PWHASH_INFLIGHT.set(ps["inflight"])
+    PWHASH_REJECTED.set_total(ps["rejected"])
+    PWHASH_QUEUE_SECONDS.set_total(ps["queue_seconds_total"])
+    es = emailer.outbox_stats()
+    OUTBOX_PENDING.set(es["pending"])
+    for kind in ("queued", "sent", "retries", "dead"):
+        OUTBOX_EVENTS.labels(kind).set_total(es.get(kind, 0))
+
+
+register_collector(collect_queues)
+
+
+def collect_item_cache() -> None:
+    from app.storage import cache
+
+    for table, st in cache.stats().items():
+        for result in ("hits", "stale", "shared_hits", "misses", "evictions", "invalidations"):
+            ITEM_CACHE_EVENTS.labels(table, result).set_total(st[result])
+        ITEM_CACHE_SIZE.labels(table).set(st["size"])
+
+
+register_collector(collect_item_cache)
+
+
+def collect_page_cache() -> None:
+    from app import pagecache
+
+    st = pagecache.stats()
+    for result in ("hits", "misses", "evictions", "invalidations", "skipped"):
+        PAGE_CACHE_EVENTS.labels(result).set_total(st[result])
+    PAGE_CACHE_BYTES.set(st["bytes"])
+    PAGE_CACHE_ENTRIES.set(st["entries"])
+
+
+register_collector(collect_page_cache)
+
+
+def collect_singleflight() -> None:
+    from app import singleflight
+
+    for op, st in singleflight.stats().items():
+        for result in ("leader", "shared"):
+            SINGLEFLIGHT_CALLS.labels(op, result).set_total(st[result])
+        SINGLEFLIGHT_IN_FLIGHT.labels(op).set(st["in_flight"])
+
+
+register_collector(collect_singleflight)
+
+
+def collect_ingest() -> None:
+    from app import ingest
+
+    st = ingest.stats()
+    UPLOAD_ACTIVE.set(st["active"])
+    UPLOAD_WAITING.set(st["waiting"])
+    UPLOAD_SPOOL_BYTES.set(st["spool_bytes"])
+    UPLOAD_SPOOL_LIMIT.set(st["max_bytes"])
+    for result in ("admitted", "queued", "rejected", "too_large"):
+        UPLOAD_ADMISSION.labels(result).set_total(st[result])
+    UPLOAD_QUEUE_SECONDS.set_total(st["queue_seconds_total"])
+
+
+register_collector(collect_ingest)
+
+
+def collect_render() -> None:
+    from app import render
+
+    st = render.stats()
+    for result, stat in (("hit", "cache_hits"), ("miss", "cache_misses"), ("rendered", "renders"),
+                         ("failed", "failed"), ("rejected", "rejected")):
+        RENDER_EVENTS.labels(result).set_total(st[stat])
+    RENDER_INFLIGHT.set(st["inflight"])
+    RENDER_SECONDS.set_total(st["render_seconds_total"])
+    RENDER_CACHE_BYTES.set(st["cache_bytes"])
+    RENDER_CACHE_FILES.set(st["cache_files"])
+    RENDER_CACHE_EVICTIONS.set_total(st["cache_evictions"])
+
+
+register_collector(collect_render)
+
+
+# ---- botocore event hooks ----
+def _op(event_name: str) -> Tuple[str, str]:
+    parts = event_name.split(".")
+    return (parts[1], parts[2]) if len(parts) >= 3 else ("unknown", "unknown")
+
+
+def _before_call(event_name: str, context: Optional[dict] = None, **_):
+    if context is not None:
+        context["metrics_t0"] = time.perf_counter()
+
+
+def _after_call(event_name: str, http_response=None, parsed=None, context: Optional[dict] = None, **_):
+    service, op = _op(event_name)
+    t0 = (context or {}).get("metrics_t0")
+    if t0 is not None:
+        AWS_LATENCY.labels(service, op).observe(time.perf_counter() - t0)
+    code = ((parsed or {}).get("Error") or {}).get("Code")
+    if code or (http_response is not None and getattr(http_response, "status_code", 200) >= 400):
+        AWS_ERRORS.labels(service, op, code or str(http_response.status_code)).inc()
+
+
+def _after_call_error(event_name: str, exception=None, context: Optional[dict] = None, **_):
+    service, op = _op(event_name)
+    t0 = (context or {}).get("metrics_t0")
+    if t0 is not None:
+        AWS_LATENCY.labels(service, op).observe(time.perf_counter() - t0)
+    AWS_ERRORS.labels(service, op, type(exception).__name__ if exception else "unknown").inc()
+
+
+def _needs_retry(event_name: str, response=None, **_):
+    # fires once per attempt; return None so botocore's own retry handler decides
+    if response is None:
+        return None
+    code = ((response[1] or {}).get("Error") or {}).get("Code")
+    if code in THROTTLE_CODES:
+        service, op = _op(event_name)
+        AWS_THROTTLES.labels(service, op).inc()
+    return None
+
+
+def instrument_botocore(*clients) -> None:
+    """Attach the AWS metrics hooks to boto3 clients (idempotent: hooks have unique ids)."""
+    for client in clients:
+        events = client.meta.events
+        events.register("before-call", _before_call, unique_id="metrics-before-call")
+        events.register("after-call", _after_call, unique_id="metrics-after-call")
+        events.register("after-call-error", _after_call_error, unique_id="metrics-after-call-error")
+        events.register("needs-retry", _needs_retry, unique_id="metrics-needs-retry")
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
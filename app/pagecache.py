@@ -0,0 +1,118 @@
+# app/pagecache.py
+"""
+Versioned result cache for album photo pages.
+
+Between uploads a page of `GET /photos/` is the same bytes every time, yet
+each call re-ran the PhotoMeta query and re-signed every URL. Rendered
+pages are kept here, keyed by (album_id, album version, cursor, page size,
+fields).
+
+* The album version comes from the ownership GetItem the endpoint already
+  makes. Every write path bumps it (etags.bump_album), so a page cached
+  before an upload or delete is simply never asked for again. In this
+  process the bump also drops the album's pages right away; other workers
+  see the new version on their next album read (Albums are only item-cached
+  with the shared tier, which invalidates every worker on write).
+* PAGE_CACHE_TTL seconds (default 600) caps an entry's age. Pages carry
+  presigned URLs that expire after an hour, and a cached page must leave
+  clients most of that hour. Keep it well under 3600.
+* PAGE_CACHE_BYTES (default 64 MiB) bounds the rendered bytes held. The
+  least recently used pages are evicted first, and a single page larger
+  than 1/8 of the budget is not cached. PAGE_CACHE_BYTES=0 turns it off.
+
+Hit / miss / eviction counts and the bytes held come from `stats()` and are
+exported on /metrics.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+PAGE_CACHE_BYTES = int(os.getenv("PAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "600"))
+ENTRY_OVERHEAD = 256  # key tuple, OrderedDict node, bookkeeping
+
+Key = Tuple[Hashable, ...]  # (album_id, version, cursor, limit, fields)
+
+
+class PageCache:
+    """Byte-bounded LRU of rendered pages; entries are grouped by album (key[0])."""
+
+    def __init__(self, maxbytes: int = PAGE_CACHE_BYTES, ttl: float = PAGE_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxbytes, self.ttl, self._clock = maxbytes, ttl, clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Key, Tuple[bytes, float]]" = OrderedDict()  # key -> (body, expires_at)
+        self._albums: Dict[Hashable, Set[Key]] = {}
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "skipped": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxbytes > 0
+
+    def _remove(self, key: Key) -> None:
+        body, _ = self._data.pop(key)
+        self._bytes -= len(body) + ENTRY_OVERHEAD
+        keys = self._albums.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._albums[key[0]]
+
+    def get(self, key: Key) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > self._clock():
+                self._data.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: Key, body: bytes) -> None:
+        if not self.enabled:
+            return
+        cost = len(body) + ENTRY_OVERHEAD
+        with self._lock:
+            if cost > self.maxbytes // 8:
+                self._stats["skipped"] += 1
+                return
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (body, self._clock() + self.ttl)
+            self._albums.setdefault(key[0], set()).add(key)
+            self._bytes += cost
+            while self._bytes > self.maxbytes:
+                self._remove(next(iter(self._data)))
+                self._stats["evictions"] += 1
+
+    def drop_album(self, album_id: Hashable) -> None:
+        with self._lock:
+            for key in list(self._albums.get(album_id, ())):
+                self._remove(key)
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._albums.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, entries=len(self._data), bytes=self._bytes, max_bytes=self.maxbytes)
+
+
+photo_pages = PageCache()
+
+
+def stats() -> Dict[str, Any]:
+    return photo_pages.stats()
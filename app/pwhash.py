@@ -0,0 +1,181 @@
+# app/pwhash.py
+"""
+Password hashing on a dedicated, bounded process pool.
+
+bcrypt is deliberately slow (~250 ms at cost 12). Running it on the shared
+request thread pool lets a login spike starve album/photo requests, so
+`hash_pw` / `verify_and_update` are shipped to a small ProcessPoolExecutor.
+At most PWHASH_WORKERS + PWHASH_MAX_QUEUE calls may be in flight; anything
+beyond that is shed immediately with a 503 instead of queueing forever.
+A call that times out (PWHASH_TIMEOUT) keeps its slot until the worker has
+actually finished the job, so overload can't push more work past the cap.
+
+PWHASH_WORKERS=0 runs hashing inline (handy for debugging).
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+PWHASH_WORKERS = int(os.getenv("PWHASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PWHASH_MAX_QUEUE = int(os.getenv("PWHASH_MAX_QUEUE", "32"))
+PWHASH_TIMEOUT = float(os.getenv("PWHASH_TIMEOUT", "10"))
+# "spawn" keeps the children clear of locks held by our own threads at fork time
+PWHASH_START_METHOD = os.getenv("PWHASH_START_METHOD", "spawn")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Hashes below BCRYPT_ROUNDS report needs_update=True and get rehashed on login
+pwd_ctx = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_inflight = 0
+
+_metrics: Dict[str, Any] = {
+    "hash_calls": 0,
+    "verify_calls": 0,
+    "rehashes": 0,
+    "rejected": 0,
+    "queue_seconds_total": 0.0,
+    "run_seconds_total": 0.0,
+    "run_seconds_max": 0.0,
+}
+
+
+# ---- worker-side functions (must be top-level so they pickle) ----
+def _timed(fn: Callable, *args) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+def _hash_job(p: str) -> Tuple[str, float]:
+    return _timed(pwd_ctx.hash, p)
+
+def _verify_job(p: str, h: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    return _timed(pwd_ctx.verify_and_update, p, h)
+
+
+# ---- parent side ----
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PWHASH_WORKERS,
+                mp_context=multiprocessing.get_context(PWHASH_START_METHOD),
+            )
+        return _pool
+
+def _reset_pool() -> None:
+    global _pool
+    with _lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _acquire() -> None:
+    global _inflight
+    with _lock:
+        if _inflight >= PWHASH_WORKERS + PWHASH_MAX_QUEUE:
+            _metrics["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="authentication is busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _inflight += 1
+
+def _release(_future=None) -> None:
+    global _inflight
+    with _lock:
+        _inflight -= 1
+
+def _submit(job: Callable, *args):
+    # the slot is given back when the job is done, not when the caller stops
+    # waiting: a timed-out job still occupies a worker
+    try:
+        future = _get_pool().submit(job, *args)
+    except BaseException:
+        _release()
+        raise
+    future.add_done_callback(_release)
+    return future
+
+def _run(job: Callable, *args):
+    _acquire()
+    t0 = time.perf_counter()
+    try:
+        if PWHASH_WORKERS <= 0:
+            try:
+                out, run_s = job(*args)
+            finally:
+                _release()
+        else:
+            try:
+                out, run_s = _submit(job, *args).result(timeout=PWHASH_TIMEOUT)
+            except BrokenProcessPool:
+                # a worker died (OOM-killed etc.): start a fresh pool and retry once
+                # (the broken future is done and has given its slot back)
+                _reset_pool()
+                _acquire()
+                out, run_s = _submit(job, *args).result(timeout=PWHASH_TIMEOUT)
+    except FutureTimeout:
+        raise HTTPException(
+            status_code=503,
+            detail="authentication timed out, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    total = time.perf_counter() - t0
+    with _lock:
+        _metrics["run_seconds_total"] += run_s
+        _metrics["run_seconds_max"] = max(_metrics["run_seconds_max"], run_s)
+        _metrics["queue_seconds_total"] += max(0.0, total - run_s)
+    return out
+
+def hash_pw(p: str) -> str:
+    with _lock:
+        _metrics["hash_calls"] += 1
+    return _run(_hash_job, p)
+
+def verify_and_update(p: str, h: str) -> Tuple[bool, Optional[str]]:
+    """Return (ok, new_hash); new_hash is set when `h` uses an outdated cost factor."""
+    with _lock:
+        _metrics["verify_calls"] += 1
+    ok, new_hash = _run(_verify_job, p, h)
+    if ok and new_hash:
+        with _lock:
+            _metrics["rehashes"] += 1
+    return ok, new_hash
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics)
+        out["inflight"] = _inflight
+    out["workers"] = PWHASH_WORKERS
+    out["max_queue"] = PWHASH_MAX_QUEUE
+    return out
+
+
+def _noop() -> None:
+    return None
+
+def warm_up() -> None:
+    """Start the worker processes now instead of on the first login."""
+    if PWHASH_WORKERS <= 0:
+        return
+    pool = _get_pool()
+    for f in [pool.submit(_noop) for _ in range(PWHASH_WORKERS)]:
+        f.result(timeout=PWHASH_TIMEOUT * 3)
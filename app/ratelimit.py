@@ -0,0 +1,137 @@
+# app/ratelimit.py
+"""
+Token-bucket rate limiting for cheap rejection of abusive traffic.
+
+Used by POST /login (see app/main.py) *before* the Users lookup and bcrypt,
+so a throttled attempt costs a dict lookup instead of a scan + ~250 ms hash.
+
+* LocalLimiter  – per-process buckets split over N shards, each with its own
+                  lock, so concurrent logins rarely contend. A full shard
+                  drops its least recently used bucket, so a flood of fresh
+                  keys can't push out one that is being hammered.
+* RedisLimiter  – optional shared buckets (RATELIMIT_REDIS_URL) for several
+                  workers/hosts; one atomic Lua call per check. Falls back to
+                  the local buckets if Redis is unreachable.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+log = logging.getLogger("uvicorn.error")
+
+RATELIMIT_REDIS_URL = os.getenv("RATELIMIT_REDIS_URL", "")
+RATELIMIT_SHARDS = int(os.getenv("RATELIMIT_SHARDS", "16"))
+RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", "200000"))
+
+# per-minute refill and burst size for the two login buckets
+LOGIN_IP_PER_MIN = float(os.getenv("LOGIN_IP_PER_MIN", "30"))
+LOGIN_IP_BURST = float(os.getenv("LOGIN_IP_BURST", "30"))
+LOGIN_EMAIL_PER_MIN = float(os.getenv("LOGIN_EMAIL_PER_MIN", "6"))
+LOGIN_EMAIL_BURST = float(os.getenv("LOGIN_EMAIL_BURST", "10"))
+
+
+class LocalLimiter:
+    """Sharded in-process token buckets: key -> [tokens, last_refill]."""
+
+    def __init__(self, shards: int = RATELIMIT_SHARDS, max_keys: int = RATELIMIT_MAX_KEYS):
+        self._shards: List["OrderedDict[str, List[float]]"] = [OrderedDict() for _ in range(max(1, shards))]
+        self._locks = [threading.Lock() for _ in self._shards]
+        self._max_per_shard = max(1, max_keys // len(self._shards))
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """Consume `cost` tokens; return 0 if allowed, else seconds until it would be."""
+        i = hash(key) % len(self._shards)
+        shard = self._shards[i]
+        now = time.monotonic()
+        with self._locks[i]:
+            b = shard.get(key)
+            if b is None:
+                if len(shard) >= self._max_per_shard:
+                    # drop the least recently used bucket; a forgotten key just starts full again
+                    shard.popitem(last=False)
+                b = shard[key] = [burst, now]
+            else:
+                shard.move_to_end(key)
+                b[0] = min(burst, b[0] + (now - b[1]) * rate)
+                b[1] = now
+            if b[0] >= cost:
+                b[0] -= cost
+                return 0.0
+            return (cost - b[0]) / rate if rate > 0 else 60.0
+
+
+# KEYS[1]=bucket, ARGV = rate/s, burst, cost, now(ms); returns retry-after in ms
+_LUA_TAKE = """
+local b = redis.call('HMGET', KEYS[1], 't', 'ts')
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local t = tonumber(b[1]) or burst
+local ts = tonumber(b[2]) or now
+t = math.min(burst, t + math.max(0, now - ts) / 1000 * rate)
+local wait = 0
+if t >= cost then t = t - cost else wait = math.ceil((cost - t) / rate * 1000) end
+redis.call('HSET', KEYS[1], 't', t, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return wait
+"""
+
+
+class RedisLimiter:
+    """Shared token buckets kept in Redis; degrades to a LocalLimiter on errors."""
+
+    def __init__(self, url: str, prefix: str = "rl:"):
+        import redis  # type: ignore  # only paid for when RATELIMIT_REDIS_URL is set
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05)
+        self._script = self._client.register_script(_LUA_TAKE)
+        self._prefix = prefix
+        self._fallback = LocalLimiter()
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        try:
+            wait_ms = self._script(
+                keys=[self._prefix + key],
+                args=[rate, burst, cost, int(time.time() * 1000)],
+            )
+            return int(wait_ms) / 1000.0
+        except Exception as e:  # pragma: no cover
+            log.warning("rate limit backend unavailable, using local buckets: %s", e)
+            return self._fallback.take(key, rate, burst, cost)
+
+
+def _make_limiter():
+    if RATELIMIT_REDIS_URL:
+        try:
+            return RedisLimiter(RATELIMIT_REDIS_URL)
+        except ImportError:
+            print("[BOOT] RATELIMIT_REDIS_URL set but redis package missing; using local buckets")
+    return LocalLimiter()
+
+
+limiter = _make_limiter()
+
+
+def _reject(wait: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="too many login attempts, slow down",
+        headers={"Retry-After": str(max(1, math.ceil(wait)))},
+    )
+
+
+def check_login(ip: Optional[str], email: str) -> None:
+    """Raise 429 if this client IP or target email is over its login budget."""
+    if ip:
+        wait = limiter.take(f"login:ip:{ip}", LOGIN_IP_PER_MIN / 60.0, LOGIN_IP_BURST)
+        if wait:
+            raise _reject(wait)
+    wait = limiter.take(f"login:email:{email.strip().lower()}", LOGIN_EMAIL_PER_MIN / 60.0, LOGIN_EMAIL_BURST)
+    if wait:
+        raise _reject(wait)
@@ -0,0 +1,316 @@
+# app/render.py
+"""
+On-demand photo renditions for `GET /photos/{photo_id}/render`.
+
+Lightboxes and retina screens want sizes no fixed rendition covers, so the
+client asks for a bounding box (w and/or h), a format and a quality, and
+gets the photo scaled to fit inside it (never upscaled, aspect kept).
+
+* Decoding is the expensive part. JPEGs are decoded with `draft()` straight
+  to the smallest DCT scale (1/2, 1/4, 1/8) that still covers the box, and
+  `thumbnail(reducing_gap=...)` shrinks the rest with `reduce()` before the
+  final LANCZOS pass. A 24 MP original rendered at 1600 px never exists in
+  memory at full size.
+* Work runs on a bounded pool of RENDER_WORKERS threads. Pillow releases the
+  GIL while it decodes, resamples and encodes, so threads use every core
+  without shipping megabytes to worker processes. At most
+  RENDER_WORKERS + RENDER_MAX_QUEUE renders may be in flight; beyond that the
+  request is shed with a 503, as pwhash does.
+* Outputs go to an on-disk LRU under RENDER_CACHE_DIR bounded by
+  RENDER_CACHE_BYTES. The key is sha256 of (blob key, w, h, fmt, q,
+  RENDER_VERSION), so the same request always lands on the same file, and
+  bumping RENDER_VERSION retires every old output. Hits are streamed from
+  the cached file, opened under the cache lock so a concurrent eviction
+  can unlink it but not pull it out from under the response; they carry a
+  day-long private Cache-Control and an ETag, so the browser rarely asks
+  twice. Identical misses in flight share one render (app/singleflight.py)
+  and answer from its bytes.
+* The byte budget is per process: each worker counts and evicts only the
+  files it wrote or found at its first use, so with several workers sharing
+  RENDER_CACHE_DIR the directory can grow to workers x RENDER_CACHE_BYTES.
+  Size it as (disk you can spare) / workers.
+
+Blob keys are never rewritten with different bytes (they carry the photo
+id), so cached outputs never go stale; deleting a photo leaves its
+renditions to age out of the LRU, and they are only reachable through the
+ownership check anyway.
+"""
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+from . import singleflight
+
+log = logging.getLogger("uvicorn.error")
+
+RENDER_CACHE_DIR = Path(os.getenv("RENDER_CACHE_DIR", "render_cache"))
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", str(1024 * 1024 * 1024)))
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(os.cpu_count() or 2)))
+RENDER_MAX_QUEUE = int(os.getenv("RENDER_MAX_QUEUE", "32"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "20"))
+RENDER_MAX_DIM = int(os.getenv("RENDER_MAX_DIM", "4096"))
+RENDER_DEFAULT_QUALITY = int(os.getenv("RENDER_DEFAULT_QUALITY", "82"))
+RENDER_VERSION = "1"  # bump when the pipeline's output changes
+CACHE_CONTROL = "private, max-age=86400"
+
+# fmt parameter -> (Pillow format, extension, content type)
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "jpg": ("JPEG", "jpg", "image/jpeg"),
+    "webp": ("WEBP", "webp", "image/webp"),
+    "png": ("PNG", "png", "image/png"),
+}
+
+
+class DiskLRU:
+    """Files under `root`, least recently used deleted first once over `maxbytes` (this process's files)."""
+
+    def __init__(self, root: Path = RENDER_CACHE_DIR, maxbytes: int = RENDER_CACHE_BYTES):
+        self.root, self.maxbytes = Path(root), maxbytes
+        self._lock = threading.Lock()
+        self._files: "OrderedDict[str, int]" = OrderedDict()  # relative path -> size, oldest first
+        self._bytes = 0
+        self._loaded = False
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _load(self) -> None:
+        # first use: pick up what a previous run left, oldest mtime first
+        # (hits touch their file, so mtime tracks last use across restarts)
+        if self._loaded:
+            return
+        self._loaded = True
+        found = []
+        if self.root.is_dir():
+            for p in self.root.rglob("*"):
+                if not p.is_file():
+                    continue
+                if p.name.startswith(".tmp-"):  # a writer that died mid-write
+                    p.unlink(missing_ok=True)
+                    continue
+                st = p.stat()
+                found.append((st.st_mtime, str(p.relative_to(self.root)), st.st_size))
+        for _, rel, size in sorted(found):
+            self._files[rel] = size
+            self._bytes += size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.maxbytes and self._files:
+            rel, size = self._files.popitem(last=False)
+            self._bytes -= size
+            self._stats["evictions"] += 1
+            try:
+                (self.root / rel).unlink()
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def rel_path(name: str) -> str:
+        return f"{name[:2]}/{name[2:4]}/{name}"
+
+    def get(self, name: str) -> Optional[BinaryIO]:
+        """The cached file, already open (the caller closes it), or None.
+
+        It is opened under the lock `_evict` unlinks under, so an eviction
+        racing this read can remove the name but not the open file.
+        """
+        rel = self.rel_path(name)
+        with self._lock:
+            self._load()
+            f = None
+            if rel in self._files:
+                try:
+                    f = open(self.root / rel, "rb")
+                except FileNotFoundError:  # removed behind our back
+                    self._bytes -= self._files.pop(rel)
+            if f is None:
+                self._stats["misses"] += 1
+                return None
+            self._files.move_to_end(rel)
+            self._stats["hits"] += 1
+        try:
+            os.utime(f.fileno())
+        except OSError:
+            pass
+        return f
+
+    def put(self, name: str, body: bytes) -> None:
+        rel = self.rel_path(name)
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".tmp-{uuid.uuid4().hex}"
+        tmp.write_bytes(body)
+        os.replace(tmp, path)  # readers see the whole file or none
+        with self._lock:
+            self._load()
+            self._bytes += len(body) - self._files.pop(rel, 0)
+            self._files[rel] = len(body)
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, files=len(self._files), bytes=self._bytes, max_bytes=self.maxbytes)
+
+
+cache = DiskLRU()
+
+_pool: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_inflight = 0
+_metrics: Dict[str, Any] = {"renders": 0, "rejected": 0, "failed": 0, "render_seconds_total": 0.0}
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS), thread_name_prefix="render")
+        return _pool
+
+
+def parse(w: Optional[int], h: Optional[int], fmt: Optional[str], q: Optional[int]) -> Tuple[int, int, str, int]:
+    """Validated (w, h, fmt, q); 0 means "unbounded" for one of w / h."""
+    if not w and not h:
+        raise HTTPException(400, "w or h is required")
+    for name, v in (("w", w), ("h", h)):
+        if v is not None and not 1 <= v <= RENDER_MAX_DIM:
+            raise HTTPException(400, f"{name} must be between 1 and {RENDER_MAX_DIM}")
+    fmt = (fmt or "jpeg").lower()
+    if fmt not in FORMATS:
+        raise HTTPException(400, f"fmt must be one of {', '.join(sorted(set(FORMATS) - {'jpg'}))}")
+    q = RENDER_DEFAULT_QUALITY if q is None else q
+    if not 1 <= q <= 95:
+        raise HTTPException(400, "q must be between 1 and 95")
+    if FORMATS[fmt][0] == "PNG":
+        q = 0  # lossless: quality doesn't apply, keep it out of the key
+    return w or 0, h or 0, fmt, q
+
+
+def cache_name(blob_key: str, w: int, h: int, fmt: str, q: int) -> str:
+    digest = hashlib.sha256(f"{RENDER_VERSION}\n{blob_key}\n{w}x{h}\n{FORMATS[fmt][0]}\n{q}".encode()).hexdigest()
+    return f"{digest}.{FORMATS[fmt][1]}"
+
+
+def content_type(fmt: str) -> str:
+    return FORMATS[fmt][2]
+
+
+def _render(source: Any, w: int, h: int, fmt: str, q: int) -> bytes:
+    """`source` is a path or the original's bytes."""
+    from PIL import Image, ImageOps  # type: ignore
+
+    box = (w or RENDER_MAX_DIM * 4, h or RENDER_MAX_DIM * 4)
+    try:
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        # JPEG: decode at a reduced DCT scale; the box is squared because EXIF
+        # rotation may still swap width and height
+        side = max(w, h)
+        img.draft(img.mode if img.mode in ("RGB", "L") else "RGB", (side, side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(box, Image.LANCZOS, reducing_gap=3.0)  # reduce() by integer factors first
+    except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise HTTPException(422, f"photo can't be rendered: {e}")
+
+    pil_format = FORMATS[fmt][0]
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+    buf = io.BytesIO()
+    if pil_format == "PNG":
+        img.save(buf, pil_format, optimize=True)
+    elif pil_format == "WEBP":
+        img.save(buf, pil_format, quality=q, method=4)
+    else:
+        img.save(buf, pil_format, quality=q, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def _release(_future=None) -> None:
+    global _inflight
+    with _lock:
+        _inflight -= 1
+
+
+def _run(fn, *args):
+    global _inflight
+    with _lock:
+        if _inflight >= max(1, RENDER_WORKERS) + RENDER_MAX_QUEUE:
+            _metrics["rejected"] += 1
+            raise HTTPException(status_code=503, detail="renderer is busy, retry shortly", headers={"Retry-After": "1"})
+        _inflight += 1
+    t0 = time.perf_counter()
+    try:
+        future = _get_pool().submit(contextvars.copy_context().run, fn, *args)
+    except BaseException:
+        _release()
+        raise
+    # the slot is given back when the render is done, not when we stop
+    # waiting for it: a timed-out render still occupies a worker (as in pwhash)
+    future.add_done_callback(_release)
+    try:
+        return future.result(timeout=RENDER_TIMEOUT)
+    except FutureTimeout:
+        raise HTTPException(status_code=503, detail="render timed out, retry shortly", headers={"Retry-After": "1"})
+    finally:
+        with _lock:
+            _metrics["render_seconds_total"] += time.perf_counter() - t0
+
+
+def rendition(blob_key: str, load, w: int, h: int, fmt: str, q: int) -> Union[BinaryIO, bytes]:
+    """The cached output as an open file, or on a miss the freshly rendered bytes
+    (also written to the cache); `load()` returns a path or the original's bytes."""
+    name = cache_name(blob_key, w, h, fmt, q)
+    hit = cache.get(name)
+    if hit is not None:
+        return hit
+
+    def make() -> bytes:
+        source = load()
+        if source is None:
+            raise HTTPException(404, "Photo file not found")
+        try:
+            body = _run(_render, source, w, h, fmt, q)
+        except HTTPException as e:
+            if e.status_code == 422:
+                with _lock:
+                    _metrics["failed"] += 1
+            raise
+        with _lock:
+            _metrics["renders"] += 1
+        cache.put(name, body)
+        return body
+
+    return singleflight.do(("render", name), make)
+
+
+def iter_file(f: BinaryIO, chunk: int = 256 * 1024) -> Iterator[bytes]:
+    """Stream an open cache file, closing it at the end (or when the client goes away)."""
+    try:
+        while True:
+            data = f.read(chunk)
+            if not data:
+                return
+            yield data
+    finally:
+        f.close()
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        out = dict(_metrics, inflight=_inflight)
+    out.update({f"cache_{k}": v for k, v in cache.stats().items()})
+    return out
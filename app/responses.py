@@ -0,0 +1,45 @@
+# app/responses.py
+"""
+Fast JSON responses.
+
+FastJSONResponse renders with orjson (stdlib json when it isn't installed)
+and encodes the `Decimal`s boto3 returns for DynamoDB numbers itself – the
+same int-or-float mapping as FastAPI's jsonable_encoder. It is the app's
+default response class; listing endpoints also *return* one directly, which
+skips the jsonable_encoder walk over every item:
+
+    return FastJSONResponse({"items": page, "next_key": next_key})
+"""
+from __future__ import annotations
+
+import json
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
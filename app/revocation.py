@@ -0,0 +1,180 @@
+# app/revocation.py
+"""
+Access-token revocation list.
+
+Revoked JWT ids (jti) and per-user cut-offs ("tokens issued before X are
+dead") are kept in two small dicts so `current_user` can check them with two
+lookups. In Dynamo mode every revocation is also written to the Tokens table
+and a daemon thread re-syncs the list every REVOCATION_SYNC_SECONDS, so other
+workers pick up logouts / password resets within that window. The sync
+reads only live revocation records (a Query on the Tokens `type-index` GSI,
+see scripts/tokens_ttl.py), not every reset / verify token in the table. The same goes
+for any shared backend (dynamo, sqlite); only STORAGE_BACKEND=memory is
+purely process-local.
+
+With a shared cache backend (SHARED_CACHE_URL, app/kv.py) each revocation is
+also broadcast, so the other workers apply it immediately; the periodic sync
+stays as the safety net for messages lost while a worker was disconnected.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .kv import get_kv
+from .storage import store
+
+SYNC_SECONDS = int(os.getenv("REVOCATION_SYNC_SECONDS", "30"))
+CHANNEL = "revocations"
+
+log = logging.getLogger("uvicorn.error")
+
+# revocation records go to the shared Tokens store unless this process is all there is
+token_store = store.tokens if store.backend != "memory" else None
+
+# jti -> token exp (entry can be dropped once the token would have expired anyway)
+_revoked_jtis: Dict[str, int] = {}
+# user_id -> (not_before_ms, expires_at): tokens with iat <= not_before_ms are
+# revoked. iat carries milliseconds (auth.create_token), so a login right after
+# a password reset, in the same second, gets a token that works.
+_revoked_users: Dict[str, tuple[int, int]] = {}
+
+_lock = threading.Lock()
+_sync_thread: Optional[threading.Thread] = None
+_listening = False
+
+
+def _ms(seconds: float) -> int:
+    return int(round(float(seconds) * 1000))
+
+
+def is_revoked(jti: Optional[str], user_id: str, iat: float) -> bool:
+    """Hot-path check; never touches the network."""
+    if token_store is not None and _sync_thread is None:
+        _start_sync()
+    if not _listening:
+        _listen()
+    if jti and jti in _revoked_jtis:
+        return True
+    cut = _revoked_users.get(user_id)
+    return bool(cut and _ms(iat) <= cut[0])
+
+
+def _cut_user(uid: str, not_before_ms: int, exp: int) -> None:
+    with _lock:
+        if not_before_ms >= _revoked_users.get(uid, (0, 0))[0]:
+            _revoked_users[uid] = (not_before_ms, exp)
+
+
+def _apply(message: str) -> None:
+    # "jti:<jti>:<exp>" | "user-ms:<user_id>:<not_before_ms>:<exp>"
+    # | "user:<user_id>:<not_before>:<exp>" (whole seconds, from older workers)
+    kind, _, rest = message.partition(":")
+    if kind == "jti":
+        jti, _, exp = rest.rpartition(":")
+        with _lock:
+            _revoked_jtis[jti] = int(exp)
+    elif kind == "user-ms":
+        uid, nb, exp = rest.rsplit(":", 2)
+        _cut_user(uid, int(nb), int(exp))
+    elif kind == "user":
+        uid, nb, exp = rest.rsplit(":", 2)
+        _cut_user(uid, int(nb) * 1000 + 999, int(exp))
+
+
+def _listen() -> None:
+    global _listening
+    with _lock:
+        if _listening:
+            return
+        _listening = True
+    kv = get_kv()
+    if kv is not None:
+        kv.subscribe(CHANNEL, _apply)
+
+
+def _broadcast(message: str) -> None:
+    kv = get_kv()
+    if kv is not None:
+        kv.publish(CHANNEL, message)
+
+
+def revoke_jti(jti: str, expires_at: int) -> None:
+    with _lock:
+        _revoked_jtis[jti] = int(expires_at)
+    _broadcast(f"jti:{jti}:{int(expires_at)}")
+    if token_store is not None:
+        token_store.put({
+            "token": f"revoked#{jti}",
+            "type": "revoked_jti",
+            "jti": jti,
+            "expires_at": int(expires_at),
+        })
+
+
+def revoke_user(user_id: str, ttl_seconds: int) -> None:
+    """Revoke every token issued to `user_id` up to now (e.g. after a password reset)."""
+    now = time.time()
+    entry = (_ms(now), int(now) + int(ttl_seconds))
+    with _lock:
+        _revoked_users[user_id] = entry
+    _broadcast(f"user-ms:{user_id}:{entry[0]}:{entry[1]}")
+    if token_store is not None:
+        token_store.put({
+            "token": f"revoked-user#{user_id}",
+            "type": "revoked_user",
+            "user_id": user_id,
+            "not_before": int(now),  # whole seconds, for records read by older workers
+            "not_before_ms": entry[0],
+            "expires_at": entry[1],
+        })
+
+
+def _prune(now: int) -> None:
+    with _lock:
+        for jti, exp in list(_revoked_jtis.items()):
+            if exp < now:
+                _revoked_jtis.pop(jti, None)
+        for uid, (_, exp) in list(_revoked_users.items()):
+            if exp < now:
+                _revoked_users.pop(uid, None)
+
+
+def sync() -> None:
+    """Pull revocations written by other workers from the Tokens store."""
+    now = int(time.time())
+    if token_store is not None:
+        items = token_store.list_by_type(["revoked_jti", "revoked_user"], expires_after=now)
+        for it in items:
+            exp = int(it.get("expires_at", 0))
+            if exp < now:
+                continue
+            if it.get("type") == "revoked_jti":
+                with _lock:
+                    _revoked_jtis[str(it["jti"])] = exp
+            elif "not_before_ms" in it:
+                _cut_user(str(it["user_id"]), int(it["not_before_ms"]), exp)
+            else:  # written by an older worker: the whole second counts as "before"
+                _cut_user(str(it["user_id"]), int(it.get("not_before", 0)) * 1000 + 999, exp)
+    _prune(now)
+
+
+def _sync_loop() -> None:
+    while True:
+        try:
+            sync()
+        except Exception as e:  # pragma: no cover
+            log.warning("revocation sync failed: %s", e)
+        time.sleep(SYNC_SECONDS)
+
+
+def _start_sync() -> None:
+    global _sync_thread
+    with _lock:
+        if _sync_thread is not None:
+            return
+        _sync_thread = threading.Thread(target=_sync_loop, name="revocation-sync", daemon=True)
+    _sync_thread.start()
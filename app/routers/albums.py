@@ -3,18 +3,20 @@ import uuid
 import time
 from typing import Optional
 
-from fastapi import APIRouter, Query, HTTPException, Depends, status, Body
+from fastapi import APIRouter, Query, HTTPException, Depends, Request, status, Body
 from pydantic import BaseModel
-from boto3.dynamodb.conditions import Key, Attr
 
+from .. import etags, fields as sparse
 from ..auth import current_user
-from ..aws_config import dyna, s3, S3_BUCKET
+from ..responses import FastJSONResponse
+from ..storage import store
+from .covers import COVER_KEY, resolve_covers
 
 
 router = APIRouter()
 
-table_albums = dyna.Table("Albums")
-table_photos = dyna.Table("PhotoMeta")
+ALBUM_FIELDS = ("album_id", "title", "owner", "created_at", "cover_url")
+ALBUM_SOURCES = {"cover_url": ("album_id", COVER_KEY)}
 
 
 #  models
@@ -24,32 +26,7 @@ class AlbumUpdateIn(BaseModel):
 
 #  helpers 
 def _album_item(album_id: str):
-    return table_albums.get_item(Key={"album_id": album_id}).get("Item")
-
-
-def _latest_photo_for_album(album_id: str) -> Optional[dict]:
-    """Return the newest photo item (highest uploaded_at) or None."""
-    resp = table_photos.query(
-        IndexName="album_id-index",
-        KeyConditionExpression=Key("album_id").eq(album_id),
-        ScanIndexForward=False,  # newest first
-        Limit=1,
-    )
-    items = resp.get("Items", [])
-    return items[0] if items else None
-
-
-def _make_cover_url(photo_item: dict | None) -> Optional[str]:
-    if not photo_item:
-        return None
-    try:
-        return s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": S3_BUCKET, "Key": photo_item["s3_key"]},
-            ExpiresIn=3600,
-        )
-    except Exception:  # pragma: no cover
-        return None
+    return store.albums.get(album_id)
 
 
 #  create album 
@@ -65,22 +42,22 @@ def create_album(
     if not title:
         raise HTTPException(400, "title is required")
     # disallow duplicates per user
-    if table_albums.scan(
-        FilterExpression=Attr("owner").eq(user_id) & Attr("title").eq(title)
-)   ["Items"]:
+    if store.albums.title_exists(user_id, title):
         raise HTTPException(400, "album title already exists")
 
 
     album_id = str(uuid.uuid4())
     now = int(time.time())
-    table_albums.put_item(
-        Item={
+    store.albums.put(
+        {
             "album_id": album_id,
             "title": title,
             "owner": user_id,
             "created_at": now,
+            COVER_KEY: "",
         }
     )
+    etags.bump_user(user_id)
     # no cover until a photo is uploaded
     return {
         "album_id": album_id,
@@ -94,23 +71,33 @@ def create_album(
 # list albums 
 @router.get("/albums/")
 def list_albums(
+    request: Request,
     limit: int = Query(50, gt=0),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of item fields"),
     user_id: str = Depends(current_user),
 ):
-    # scan then filter by owner (simple, fine for small tables)
-    resp = table_albums.scan()
-    items = [a for a in resp.get("Items", []) if a["owner"] == user_id]
-    # sort oldest->newest (change if you prefer reverse)
-    items.sort(key=lambda a: a["created_at"])
-
-    # attach cover_url for each
-    for a in items:
-        p = _latest_photo_for_album(a["album_id"])
-        a["cover_url"] = _make_cover_url(p)
-
-    # slice to limit
+    wanted = sparse.parse(fields, ALBUM_FIELDS)
+    # revalidation costs one Users GetItem: no album scan, no cover queries
+    user = store.users.get(user_id, ["user_id", etags.USER_ALBUMS_VERSION])
+    etag = None
+    if user is not None:
+        etag = etags.listing_etag("albums", user_id, user.get(etags.USER_ALBUMS_VERSION, 0), limit, fields or "")
+        if etags.matches(request, etag):
+            return etags.not_modified(etag)
+
+    # owner's albums, oldest->newest
+    items = store.albums.list_by_owner(user_id, sparse.attributes(wanted, ALBUM_SOURCES))
+
+    # slice to limit, then attach cover_url for each (stored cover keys, no per-album query)
     items = items[:limit]
-    return {"items": items, "next_key": None}  # simple paging for now
+    if sparse.wants(wanted, "cover_url"):
+        covers = resolve_covers(items)
+        for a in items:
+            a["cover_url"] = covers[a["album_id"]]
+    # without `fields`, still only the public ones: cover_key / version are storage internals
+    items = [sparse.trim(a, wanted or ALBUM_FIELDS) for a in items]
+    resp = FastJSONResponse({"items": items, "next_key": None})  # simple paging for now
+    return etags.set_headers(resp, etag)
 
 
 # rename album 
@@ -123,18 +110,16 @@ def rename_album(
     alb = _album_item(album_id)
     if not alb or alb["owner"] != user_id:
         raise HTTPException(404, "Album not found")
-    if table_albums.scan(
-        FilterExpression=Attr("owner").eq(user_id) & Attr("title").eq(data.title)
-)   ["Items"]:
+    if store.albums.title_exists(user_id, data.title):
         raise HTTPException(400, "album title already exists")
 
 
     alb["title"] = data.title
-    table_albums.put_item(Item=alb)  # overwrite
-    # refresh cover (cheap reuse)
-    p = _latest_photo_for_album(album_id)
-    alb["cover_url"] = _make_cover_url(p)
-    return alb
+    # partial update: a full put would race uploads writing cover_key / version
+    store.albums.update(album_id, {"title": data.title})
+    etags.bump_user(user_id)
+    alb["cover_url"] = resolve_covers([alb])[album_id]
+    return sparse.trim(alb, ALBUM_FIELDS)
 
 
 
@@ -144,15 +129,12 @@ def delete_album(album_id: str, user_id: str = Depends(current_user)):
     if not alb or alb["owner"] != user_id:
         raise HTTPException(404, "Album not found")
 
-    resp = table_photos.query(
-        IndexName="album_id-index",
-        KeyConditionExpression=Key("album_id").eq(album_id),
-    )
-    for p in resp.get("Items", []):
-        table_photos.delete_item(Key={"photo_id": p["photo_id"]})
+    for p in store.photos.list_album(album_id):
+        store.photos.delete(p["photo_id"])
         try:
-            s3.delete_object(Bucket=S3_BUCKET, Key=p["s3_key"])
+            store.blobs.delete(p["s3_key"])
         except Exception:
             pass
 
-    table_albums.delete_item(Key={"album_id": album_id})
+    store.albums.delete(album_id)
+    etags.bump_user(user_id)
@@ -4,15 +4,12 @@ from fastapi.responses import RedirectResponse, HTMLResponse
 from pydantic import BaseModel, EmailStr
 import os
 import time
-import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key, Attr
 
 from ..tokens import new_token, digest_token, expiry_ts, now_ts
-from ..emailer import send_email, verification_email_html, reset_email_html
-
-AWS_REGION = os.getenv("AWS_REGION", os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
-USERS_TABLE = os.getenv("DYNAMO_USERS", "Users")
+from ..emailer import enqueue_email, verification_email_html, reset_email_html
+from ..auth import revoke_user_tokens
+from ..storage import store
 
 # Frontend (SPA) base URL, e.g., https://nuagevault.app
 PUBLIC_UI_URL = os.getenv("PUBLIC_UI_URL", "http://localhost:5173")
@@ -21,9 +18,6 @@ PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", os.getenv("BACKEND_URL", "http://lo
 
 TOKEN_EXPIRE_MINUTES = int(os.getenv("TOKEN_EXPIRE_MINUTES", "60"))
 
-ddb = boto3.resource("dynamodb", region_name=AWS_REGION)
-users = ddb.Table(USERS_TABLE)
-
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
@@ -43,7 +37,7 @@ class ResetRequest(BaseModel):
 
 
 try:
-    from app.auth import hash_password  # type: ignore
+    from app.auth import hash_pw as hash_password  # type: ignore
 except Exception:
     import hashlib
     def hash_password(pwd: str) -> str:
@@ -53,49 +47,25 @@ except Exception:
 
 def get_user_by_email(email: str) -> dict | None:
     """
-    Prefer the GSI 'email-index' (PK=email, String; store emails lowercased).
-    While the GSI is missing/CREATING, fall back to a table scan.
+    Emails are looked up lowercased (the 'email-index' GSI / sqlite index),
+    then as typed for accounts registered before we normalised them.
     """
     e = (email or "").lower()
-
-    # Fast path: Query the GSI
     try:
-        resp = users.query(
-            IndexName="email-index",
-            KeyConditionExpression=Key("email").eq(e),
-            Limit=1,
-        )
-        items = resp.get("Items") or []
-        if items:
-            return items[0]
-    except ClientError:
-        # GSI missing or not ready → fall through to scan
-        pass
-    except Exception:
-        # Any transient issue → fall through to scan
-        pass
-
-    # Fallback: scan (fine for small tables; remove later if desired)
-    try:
-        resp = users.scan(
-            FilterExpression=Attr("email").eq(e),
-            Limit=1,
-        )
-        items = resp.get("Items") or []
-        return items[0] if items else None
-    except ClientError as e:
-        msg = getattr(e, "response", {}).get("Error", {}).get("Message", str(e))
-        raise HTTPException(status_code=500, detail=f"dynamo scan failed: {msg}")
+        user = store.users.find_by_email(e)
+        if user is None and email and email != e:
+            user = store.users.find_by_email(email)
+        return user
+    except ClientError as ex:
+        msg = getattr(ex, "response", {}).get("Error", {}).get("Message", str(ex))
+        raise HTTPException(status_code=500, detail=f"user lookup failed: {msg}")
 
 
 def mark_verified(user_id: str):
-    users.update_item(
-        Key={"user_id": user_id},
-        UpdateExpression=(
-            "SET email_verified = :v, email_verified_at = :at "
-            "REMOVE email_verify_token_hash, email_verify_expires_at"
-        ),
-        ExpressionAttributeValues={":v": True, ":at": now_ts()},
+    store.users.update(
+        user_id,
+        {"email_verified": True, "email_verified_at": now_ts()},
+        remove=("email_verify_token_hash", "email_verify_expires_at"),
     )
 
 
@@ -122,7 +92,7 @@ def _send_verification_email(email: str, raw_token: str):
     verify_url = f"{PUBLIC_UI_URL}/verify?token={raw_token}&email={email}"
     # Or switch to server-first:
     # verify_url = f"{PUBLIC_API_URL}/auth/verify-email?token={raw_token}&email={email}"
-    send_email(email, "Verify your email", verification_email_html(verify_url))
+    enqueue_email(email, "Verify your email", verification_email_html(verify_url))
 
 
 
@@ -136,11 +106,7 @@ def resend_verification(req: ForgotRequest):
 
     raw, tok_hash = new_token()
     exp = expiry_ts(TOKEN_EXPIRE_MINUTES)
-    users.update_item(
-        Key={"user_id": user["user_id"]},
-        UpdateExpression="SET email_verify_token_hash = :h, email_verify_expires_at = :e",
-        ExpressionAttributeValues={":h": tok_hash, ":e": exp},
-    )
+    store.users.update(user["user_id"], {"email_verify_token_hash": tok_hash, "email_verify_expires_at": exp})
     _send_verification_email(req.email, raw)
     return {"ok": True}
 
@@ -201,13 +167,9 @@ def forgot_password(req: ForgotRequest):
 
     raw, tok_hash = new_token()
     exp = expiry_ts(30)  # 30 minutes
-    users.update_item(
-        Key={"user_id": user["user_id"]},
-        UpdateExpression="SET pwd_reset_token_hash = :h, pwd_reset_expires_at = :e",
-        ExpressionAttributeValues={":h": tok_hash, ":e": exp},
-    )
+    store.users.update(user["user_id"], {"pwd_reset_token_hash": tok_hash, "pwd_reset_expires_at": exp})
     reset_url = f"{PUBLIC_UI_URL}/reset-password?token={raw}&email={req.email}"
-    send_email(req.email, "Reset your password", reset_email_html(reset_url))
+    enqueue_email(req.email, "Reset your password", reset_email_html(reset_url))
     return {"ok": True}
 
 
@@ -223,13 +185,11 @@ def reset_password(req: ResetRequest):
     if digest_token(req.token) != user.get("pwd_reset_token_hash"):
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    # DynamoDB UpdateExpression: SET before REMOVE
-    users.update_item(
-        Key={"user_id": user["user_id"]},
-        UpdateExpression=(
-            "SET password_hash = :ph "
-            "REMOVE pwd_reset_token_hash, pwd_reset_expires_at"
-        ),
-        ExpressionAttributeValues={":ph": hash_password(req.new_password)},
+    store.users.update(
+        user["user_id"],
+        {"password_hash": hash_password(req.new_password)},
+        remove=("pwd_reset_token_hash", "pwd_reset_expires_at"),
     )
+    # Sessions opened with the old password must not outlive the reset
+    revoke_user_tokens(user["user_id"])
     return {"ok": True}
@@ -0,0 +1,65 @@
+# app/routers/blobs.py
+"""
+Serves blobs for storage backends that keep bytes locally (memory / local).
+
+URLs come from store.blobs.url()/upload_url() and carry an HMAC signature
+plus expiry, so they behave like S3 presigned urls: no auth header needed,
+useless once expired. With S3 storage these routes always 404.
+"""
+import uuid
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from app import ingest
+from app.storage import store
+from app.storage.base import check_local_signature
+
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+
+def _check(method: str, key: str, exp: int, sig: str, dl: Optional[str] = None) -> None:
+    if not store.blobs.local:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not check_local_signature(method, key, exp, sig, dl):
+        raise HTTPException(status_code=403, detail="Invalid or expired signature")
+
+
+@router.get("/{key:path}")
+def get_blob(key: str, exp: int, sig: str, dl: Optional[str] = None):
+    _check("GET", key, exp, sig, dl)
+    headers = {"Cache-Control": "private, max-age=3600"}
+    if dl:
+        headers["Content-Disposition"] = f'attachment; filename="{dl}"'
+    on_disk = store.blobs.path(key)
+    if on_disk:
+        # file-backed: streamed by the server (sendfile/pathsend), Range requests supported
+        return FileResponse(on_disk[0], media_type=on_disk[1], headers=headers)
+    found = store.blobs.get(key)
+    if not found:
+        raise HTTPException(status_code=404, detail="Not found")
+    body, content_type = found
+    return Response(content=body, media_type=content_type, headers=headers)
+
+
+@router.put("/{key:path}")
+async def put_blob(key: str, exp: int, sig: str, request: Request):
+    _check("PUT", key, exp, sig)
+    # same admission and size cap as POST /upload; the URL names no user, so
+    # the per-user share goes to the key's folder (photos/{album_id})
+    size = ingest.reservation(request.headers.get("content-length"))
+    async with ingest.admit(f"blob:{key.rsplit('/', 1)[0]}", size):
+        body = Request(request.scope, ingest.limit_body(request.receive, size))
+        ingest.UPLOAD_DIR.mkdir(exist_ok=True)
+        temp_path = ingest.UPLOAD_DIR / f"tmp-{uuid.uuid4()}"
+        try:
+            with temp_path.open("wb") as tmp:  # spooled to disk, never held in memory
+                async for chunk in body.stream():
+                    await run_in_threadpool(tmp.write, chunk)
+            content_type = request.headers.get("content-type") or "application/octet-stream"
+            await run_in_threadpool(store.blobs.upload_file, str(temp_path), key, content_type)
+        finally:
+            temp_path.unlink(missing_ok=True)
+    return Response(status_code=200)
@@ -1,42 +1,119 @@
 from ..auth import current_user
 # app/routers/covers.py
-import os
-import boto3
-from fastapi import APIRouter, Depends, HTTPException
-from boto3.dynamodb.conditions import Key
-from app.s3util import sign_key
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app import singleflight
+from app.storage import store
+
+log = logging.getLogger("uvicorn.error")
+
+# Albums carry `cover_key`: the s3_key of their newest photo, "" when empty.
+# Uploads set it, deleting the cover photo recomputes it; albums written before
+# the attribute existed fall back to a PhotoMeta query once and get it stored.
+COVER_KEY = "cover_key"
+MAX_BATCH = 100
+LOOKUP_WORKERS = 16
 
 router = APIRouter(prefix="/albums", tags=["covers"])
 
-_dynamo = boto3.resource("dynamodb", region_name=os.getenv("AWS_REGION", "us-east-1"))
-_photo_table = _dynamo.Table(os.getenv("DDB_PHOTO_TABLE", "PhotoMeta"))
+
+def set_cover(album_id: str, key: str) -> None:
+    try:
+        store.albums.update(album_id, {COVER_KEY: key})
+    except Exception as e:  # the listing falls back to a lookup
+        log.warning("cover update failed for %s: %s", album_id, e)
+    # lookups already in flight may predate this write; don't let new callers join them
+    singleflight.forget(("cover", album_id))
+
+
+def cover_removed(album: dict, key: str) -> None:
+    """A photo with `key` was deleted from `album`: pick the next newest if it was the cover."""
+    if album.get(COVER_KEY) not in (key, None):
+        return
+    photo = store.photos.latest(album["album_id"])
+    set_cover(album["album_id"], (photo or {}).get("s3_key") or "")
+
+
+def _latest_key(album_id: str) -> str:
+    # many clients opening one album at once share a single GSI query
+    def load():
+        photo = store.photos.latest(album_id)
+        return (photo or {}).get("s3_key") or (photo or {}).get("key") or ""
+    return singleflight.do(("cover", album_id), load)
+
+
+def _lookup(album_id: str) -> str:
+    key = _latest_key(album_id)
+    set_cover(album_id, key)
+    return key
+
+
+def _sign(key: str) -> Optional[str]:
+    if not key:
+        return None
+    try:
+        return store.blobs.url(key, expires=3600)
+    except Exception:  # pragma: no cover
+        return None
+
+
+def resolve_covers(albums: Iterable[dict]) -> Dict[str, Optional[str]]:
+    """album_id -> signed cover URL (None when the album has no photos)."""
+    albums = list(albums)
+    keys = {a["album_id"]: a[COVER_KEY] for a in albums if COVER_KEY in a}
+    missing = [a["album_id"] for a in albums if COVER_KEY not in a]
+    if len(missing) == 1:
+        keys[missing[0]] = _lookup(missing[0])
+    elif missing:
+        # legacy albums: run the GSI queries side by side, each in a copy of
+        # the request context so tracing still sees the calls
+        with ThreadPoolExecutor(max_workers=min(LOOKUP_WORKERS, len(missing))) as pool:
+            futures = {aid: pool.submit(contextvars.copy_context().run, _lookup, aid) for aid in missing}
+            for aid, fut in futures.items():
+                keys[aid] = fut.result()
+    return {a["album_id"]: _sign(keys[a["album_id"]]) for a in albums}
+
+
+def _parse_ids(ids: List[str]) -> List[str]:
+    out = []
+    for value in ids:
+        out.extend(p.strip() for p in value.split(",") if p.strip())
+    return list(dict.fromkeys(out))
+
+
+@router.get("/covers")
+def get_album_covers(ids: List[str] = Query(...), user_id: str = Depends(current_user)):
+    """Covers for many albums at once: `?ids=a,b,c` or `?ids=a&ids=b`."""
+    album_ids = _parse_ids(ids)
+    if len(album_ids) > MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH} ids per request")
+    try:
+        found = store.albums.get_many(album_ids)
+        owned = [found[a] for a in album_ids if a in found and found[a].get("owner") == user_id]
+        urls = resolve_covers(owned)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"cover lookup failed: {e}")
+    # unknown and foreign albums look the same: no cover
+    return {"covers": {a: urls.get(a) for a in album_ids}}
+
 
 @router.get("/{album_id}/cover")
 def get_album_cover(album_id: str, _: str = Depends(current_user)):
     # latest photo in this album (GSI: album_id-index)
     try:
-        q = _photo_table.query(
-            IndexName="album_id-index",
-            KeyConditionExpression=Key("album_id").eq(album_id),
-            ScanIndexForward=False,  # newest first
-            Limit=1,
-        )
+        key = _latest_key(album_id)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"dynamo query failed: {e}")
+        raise HTTPException(status_code=500, detail=f"cover lookup failed: {e}")
 
-    items = q.get("Items", [])
-    if not items:
-        return {"url": None}
-
-    photo = items[0]
-    key = photo.get("s3_key") or photo.get("key")
     if not key:
         return {"url": None}
 
     try:
-        url = sign_key(key, expires=3600)
+        url = store.blobs.url(key, expires=3600)
         return {"url": url}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"s3 sign failed: {e}")
-
@@ -1,43 +1,47 @@
 # app/routers/photos.py
 from fastapi import (
-    APIRouter, UploadFile, File, Form, Query, Body,
-    HTTPException, Depends, status
+    APIRouter, Query, Body,
+    HTTPException, Depends, Request, Response, status
 )
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
 from pathlib import Path
 from datetime import datetime, timezone
 from typing import Optional
 from pydantic import BaseModel
-from boto3.dynamodb.conditions import Key
+import importlib.util
+import os
+import shutil
 import time
 import uuid
-import boto3
-
-# Pillow optional
-try:
-    from PIL import Image, ExifTags  # type: ignore
-    HAS_PIL = True
-except Exception:
-    Image = None       # type: ignore[assignment]
-    ExifTags = None    # type: ignore[assignment]
-    HAS_PIL = False
 
+from .. import etags, fields as sparse, ingest, pagecache, render, singleflight
 from ..auth import current_user                     
-from ..aws_config import REGION, S3_BUCKET, dyna
-from .albums import table_albums  # reuse Albums table
+from ..responses import dumps
+from ..storage import store
+from . import covers
 
-router = APIRouter(prefix="/photos", tags=["photos"])
-table_photos = dyna.Table("PhotoMeta")
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Pillow optional, and imported on the first upload rather than at boot
+HAS_PIL = importlib.util.find_spec("PIL") is not None
 
-def _s3():
-    return boto3.client("s3", region_name=REGION)
+router = APIRouter(prefix="/photos", tags=["photos"])
 
-def _assert_album_ownership(album_id: str, user_id: str):
-    resp = table_albums.get_item(Key={"album_id": album_id})
-    album = resp.get("Item")
+PHOTO_FIELDS = (
+    "photo_id", "album_id", "s3_key", "uploader", "filename", "width", "height", "taken_at", "uploaded_at",
+    "url", "download_url",
+)
+PHOTO_SOURCES = {"url": ("s3_key",), "download_url": ("s3_key", "filename")}
+SPOOL_CHUNK = 1024 * 1024
+
+def _assert_album_ownership(album_id: str, user_id: str) -> dict:
+    # concurrent requests for one album share the GetItem; the owner check is
+    # still per caller, and the album dict is shared, so read it, never write it
+    # (etags.bump_album forgets this flight after a version bump)
+    album = singleflight.do(("album", album_id), lambda: store.albums.get(album_id))
     if not album or album.get("owner") != user_id:
         raise HTTPException(404, "Album not found")
+    return album
 
 def _safe_filename(name: str) -> str:
     name = (name or "").strip().replace("\r", "").replace("\n", "")
@@ -47,10 +51,12 @@ def extract_exif(fp: Path):
     if not HAS_PIL:
         return 0, 0, ""
     try:
-        img = Image.open(fp)  # type: ignore[union-attr]
+        from PIL import ExifTags, Image  # type: ignore
+
+        img = Image.open(fp)
         width, height = img.size  # type: ignore[assignment]
         exif = img._getexif() or {}  # type: ignore[attr-defined]
-        tag_map = {ExifTags.TAGS.get(k): v for k, v in exif.items()}  # type: ignore[union-attr]
+        tag_map = {ExifTags.TAGS.get(k): v for k, v in exif.items()}
         taken_raw = tag_map.get("DateTimeOriginal")
         taken_at = (
             datetime.strptime(taken_raw, "%Y:%m:%d %H:%M:%S")
@@ -86,7 +92,7 @@ def create_photo_presigned(
     key = f"photos/{album_id}/{photo_id}-{filename}"
 
     now = int(time.time())
-    table_photos.put_item(Item={
+    store.photos.put({
         "photo_id":    photo_id,
         "album_id":    album_id,
         "s3_key":      key,
@@ -97,13 +103,10 @@ def create_photo_presigned(
         "taken_at":    "",
         "uploaded_at": now,
     })
+    covers.set_cover(album_id, key)
+    etags.bump_album(album_id, user_id)
 
-    s3 = _s3()
-    put_url = s3.generate_presigned_url(
-        "put_object",
-        Params={"Bucket": S3_BUCKET, "Key": key, "ContentType": mime},
-        ExpiresIn=900,
-    )
+    put_url = store.blobs.upload_url(key, mime, expires=900)
 
     return {
         "ok": True,
@@ -115,34 +118,60 @@ def create_photo_presigned(
         "finalize_required": False,
     }
 
-@router.post("/upload", status_code=status.HTTP_201_CREATED)
+# the form is parsed inside the handler (after admission), so document it here
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["album_id", "file"],
+            "properties": {"album_id": {"type": "string"}, "file": {"type": "string", "format": "binary"}},
+        }}},
+    },
+}
+
+@router.post("/upload", status_code=status.HTTP_201_CREATED, openapi_extra=UPLOAD_FORM)
 async def upload_photo_multipart(
-    album_id: str = Form(...),
-    file: UploadFile = File(...),
+    request: Request,
     user_id: str = Depends(current_user),             # ✅
 ):
+    # reserve a slot and spool budget before reading a byte of the body
+    # spooled twice: the multipart parser's temp file, then the UPLOAD_DIR copy
+    size = ingest.reservation(request.headers.get("content-length"), copies=2)
+    async with ingest.admit(user_id, size, copies=2):
+        body = Request(request.scope, ingest.limit_body(request.receive, size))
+        async with body.form(max_files=1) as form:
+            album_id, file = form.get("album_id"), form.get("file")
+            if not isinstance(album_id, str) or not album_id:
+                raise HTTPException(422, "album_id is required")
+            if not isinstance(file, StarletteUploadFile):
+                raise HTTPException(422, "file is required")
+            return await run_in_threadpool(_ingest_upload, album_id, file, user_id)
+
+def _ingest_upload(album_id: str, file: StarletteUploadFile, user_id: str) -> dict:
     _assert_album_ownership(album_id, user_id)
 
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(400, "file must be an image")
 
-    temp_path = UPLOAD_DIR / f"tmp-{uuid.uuid4()}"
-    with temp_path.open("wb") as tmp:
-        tmp.write(await file.read())
+    ingest.UPLOAD_DIR.mkdir(exist_ok=True)
+    temp_path = ingest.UPLOAD_DIR / f"tmp-{uuid.uuid4()}"
+    try:
+        with temp_path.open("wb") as tmp:
+            shutil.copyfileobj(file.file, tmp, SPOOL_CHUNK)
+
+        width, height, taken_at = extract_exif(temp_path)
 
-    width, height, taken_at = extract_exif(temp_path)
+        photo_id = str(uuid.uuid4())
+        filename = _safe_filename(file.filename or "upload.bin")
+        key = f"photos/{album_id}/{photo_id}-{filename}"
+        store.blobs.upload_file(
+            str(temp_path), key, file.content_type or "application/octet-stream"
+        )
+    finally:
+        temp_path.unlink(missing_ok=True)
 
-    photo_id = str(uuid.uuid4())
-    filename = _safe_filename(file.filename or "upload.bin")
-    key = f"photos/{album_id}/{photo_id}-{filename}"
-    s3 = _s3()
-    s3.upload_file(
-        str(temp_path), S3_BUCKET, key,
-        ExtraArgs={"ContentType": file.content_type or "application/octet-stream"}
-    )
-    temp_path.unlink(missing_ok=True)
-
-    table_photos.put_item(Item={
+    store.photos.put({
         "photo_id":    photo_id,
         "album_id":    album_id,
         "s3_key":      key,
@@ -153,67 +182,97 @@ async def upload_photo_multipart(
         "taken_at":    taken_at,
         "uploaded_at": int(time.time())
     })
+    covers.set_cover(album_id, key)
+    etags.bump_album(album_id, user_id)
 
-    url = s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": S3_BUCKET, "Key": key},
-        ExpiresIn=3600
-    )
+    url = store.blobs.url(key, expires=3600)
     return {"ok": True, "mode": "multipart", "photo_id": photo_id, "url": url}
 
 @router.get("/")
 def list_photos(
+    request: Request,
     album_id: str = Query(...),
     limit: int = Query(50, gt=1),
     last_key: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of item fields"),
     user_id: str = Depends(current_user),             # ✅
 ):
-    _assert_album_ownership(album_id, user_id)
-
-    resp = table_photos.query(
-        IndexName="album_id-index",
-        KeyConditionExpression=Key("album_id").eq(album_id),
-    )
-    items = resp.get("Items", [])
-    while "LastEvaluatedKey" in resp:
-        resp = table_photos.query(
-            IndexName="album_id-index",
-            KeyConditionExpression=Key("album_id").eq(album_id),
-            ExclusiveStartKey=resp["LastEvaluatedKey"],
-        )
-        items.extend(resp.get("Items", []))
-
-    items.sort(key=lambda p: p.get("uploaded_at", 0))
-
-    start = 0
-    if last_key:
-        for i, p in enumerate(items):
-            if p.get("photo_id") == last_key:
-                start = i + 1
-                break
-    page = items[start : start + limit]
-
-    s3 = _s3()
+    wanted = sparse.parse(fields, PHOTO_FIELDS)
+    album = _assert_album_ownership(album_id, user_id)
+    # the ownership GetItem already has the album's version: 304 without the PhotoMeta query
+    version = album.get(etags.ALBUM_VERSION, 0)
+    etag = etags.listing_etag("photos", album_id, version, limit, last_key or "", fields or "")
+    if etags.matches(request, etag):
+        return etags.not_modified(etag)
+
+    # rendered pages are cached per album version; identical misses in flight
+    # share one query + presign pass, and the version keeps a request that
+    # follows an upload off both older pages and older flights
+    page_key = (album_id, version, limit, last_key or "", fields or "")
+    body = pagecache.photo_pages.get(page_key)
+    if body is None:
+        body = singleflight.do(("photos.page",) + page_key, lambda: _render_page(page_key, last_key, wanted))
+
+    return etags.set_headers(Response(body, media_type="application/json"), etag)
+
+def _render_page(page_key: tuple, last_key: Optional[str], wanted) -> bytes:
+    album_id, _, limit = page_key[:3]
+    items, next_key = _load_page(album_id, limit, last_key, wanted)
+    body = dumps({"items": items, "next_key": next_key})
+    pagecache.photo_pages.put(page_key, body)
+    return body
+
+def _load_page(album_id: str, limit: int, last_key: Optional[str], wanted):
+    page, next_key = store.photos.page(album_id, limit, last_key, sparse.attributes(wanted, PHOTO_SOURCES))
+
+    want_url, want_download = sparse.wants(wanted, "url"), sparse.wants(wanted, "download_url")
     for p in page:
-        key = p["s3_key"]
-        fname = _safe_filename(p.get("filename") or key.split("/")[-1])
-        p["url"] = s3.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": S3_BUCKET, "Key": key},
-            ExpiresIn=3600,
-        )
-        p["download_url"] = s3.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": S3_BUCKET,
-                "Key": key,
-                "ResponseContentDisposition": f'attachment; filename="{fname}"',
-            },
-            ExpiresIn=3600,
-        )
-
-    next_key = page[-1]["photo_id"] if page and (start + limit) < len(items) else None
-    return {"items": page, "next_key": next_key}
+        key = p["s3_key"] if want_url or want_download else None
+        if want_url:
+            p["url"] = store.blobs.url(key, expires=3600)
+        if want_download:
+            fname = _safe_filename(p.get("filename") or key.split("/")[-1])
+            p["download_url"] = store.blobs.url(key, expires=3600, download_name=fname)
+    return [sparse.trim(p, wanted) for p in page], next_key
+
+@router.get("/{photo_id}/render")
+def render_photo(
+    photo_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, description="Max width in px"),
+    h: Optional[int] = Query(None, description="Max height in px"),
+    fmt: Optional[str] = Query(None, description="jpeg (default), webp or png"),
+    q: Optional[int] = Query(None, description="Quality 1-95 for jpeg / webp"),
+    user_id: str = Depends(current_user),
+):
+    """The photo scaled to fit inside w x h, rendered once and then served from the disk cache."""
+    w, h, fmt, q = render.parse(w, h, fmt, q)
+    item = store.photos.get(photo_id)
+    if not item:
+        raise HTTPException(404, "Photo not found")
+    _assert_album_ownership(item["album_id"], user_id)
+    if not HAS_PIL:
+        raise HTTPException(503, "image processing unavailable")
+
+    key = item["s3_key"]
+    name = render.cache_name(key, w, h, fmt, q)
+    etag = f'"{name.split(".")[0][:32]}"'
+    headers = {"ETag": etag, "Cache-Control": render.CACHE_CONTROL}
+    if etags.matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    def load():
+        on_disk = store.blobs.path(key)
+        if on_disk:
+            return on_disk[0]
+        found = store.blobs.get(key)
+        return found[0] if found else None
+
+    out = render.rendition(key, load, w, h, fmt, q)
+    if isinstance(out, bytes):
+        return Response(out, media_type=render.content_type(fmt), headers=headers)
+    headers["Content-Length"] = str(os.fstat(out.fileno()).st_size)
+    return StreamingResponse(render.iter_file(out), media_type=render.content_type(fmt), headers=headers)
 
 @router.delete("/{photo_id}/", status_code=204)
 def delete_photo_trailing(photo_id: str, user_id: str = Depends(current_user)):
@@ -224,16 +283,18 @@ def delete_photo(photo_id: str, user_id: str = Depends(current_user)):
     return _delete_photo(photo_id, user_id)
 
 def _delete_photo(photo_id: str, user_id: str):
-    item = table_photos.get_item(Key={"photo_id": photo_id}).get("Item")
+    item = store.photos.get(photo_id)
     if not item:
         raise HTTPException(404, "Photo not found")
 
     album_id = item["album_id"]
-    _assert_album_ownership(album_id, user_id)
+    album = _assert_album_ownership(album_id, user_id)
 
-    table_photos.delete_item(Key={"photo_id": photo_id})
+    store.photos.delete(photo_id)
+    covers.cover_removed(album, item["s3_key"])
+    etags.bump_album(album_id, user_id)
     try:
-        _s3().delete_object(Bucket=S3_BUCKET, Key=item["s3_key"])
+        store.blobs.delete(item["s3_key"])
     except Exception:
         pass
     return {}
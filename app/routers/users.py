@@ -1,39 +1,33 @@
 # app/routers/users.py
 from __future__ import annotations
 
-import os
-from pathlib import Path
+import logging
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile as StarletteUploadFile
 
-# boto3 conditions are optional; only needed in Dynamo path
-try:
-    from boto3.dynamodb.conditions import Attr, Key  # type: ignore
-except Exception:  # pragma: no cover
-    Attr = None  # type: ignore
-    Key = None  # type: ignore
-
-from app.auth import current_user, get_user_by_id  # works for both backends
-
-# Try to load AWS wiring; guard usage if in memory mode
-try:
-    from app.aws_config import dyna, s3, S3_BUCKET
-except Exception:  # pragma: no cover
-    dyna = None  # type: ignore
-    s3 = None  # type: ignore
-    S3_BUCKET = os.getenv("S3_BUCKET", "")  # type: ignore
+from app import avatars, fields as sparse, ingest
+from app.auth import current_user, get_user_by_id  # works for every storage backend
+from app.storage import store
 
 router = APIRouter()
-AUTH_BACKEND = os.getenv("AUTH_BACKEND", "dynamo").lower().strip()
-PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://127.0.0.1:8000")
+log = logging.getLogger("uvicorn.error")
 
-# Dynamo tables (only valid if using dynamo backend)
-table_users = dyna.Table("Users") if dyna else None  # type: ignore
-table_albums = dyna.Table("Albums") if dyna else None  # type: ignore
-table_photos = dyna.Table("PhotoMeta") if dyna else None  # type: ignore
-table_tokens = dyna.Table("Tokens") if dyna else None  # type: ignore
+# profile fields -> the Users attributes they are read from; password and
+# token hashes are never part of the projection
+ME_SOURCES = {
+    "user_id": (),
+    "email": ("email",),
+    "display_name": ("display_name", "email"),
+    "bio": ("bio",),
+    "avatar_url": ("avatar_key", "avatar_version"),
+    "avatar_urls": ("avatar_version",),
+    "is_verified": ("email_verified", "is_verified"),
+}
 
 
 class ProfileUpdateIn(BaseModel):
@@ -42,193 +36,146 @@ class ProfileUpdateIn(BaseModel):
 
 
 @router.get("/users/me")
-def get_me(user_id: str = Depends(current_user)):
-    # Fetch user depending on backend
-    if AUTH_BACKEND == "memory" or not table_users:
-        item = get_user_by_id(user_id)
-    else:
-        resp = table_users.get_item(Key={"user_id": user_id})  # type: ignore[union-attr]
-        item = resp.get("Item")
-
+def get_me(
+    fields: Optional[str] = Query(None, description="Comma-separated subset of profile fields"),
+    user_id: str = Depends(current_user),
+):
+    wanted = sparse.parse(fields, ME_SOURCES)
+    item = get_user_by_id(user_id, sparse.attributes(wanted or list(ME_SOURCES), ME_SOURCES, "user_id"))
     if not item:
         raise HTTPException(status_code=404, detail="User not found")
 
     avatar_url: Optional[str] = None
-    key = item.get("avatar_key")
-    if key:
-        if s3 and S3_BUCKET:
-            try:
-                avatar_url = s3.generate_presigned_url(
-                    "get_object",
-                    Params={"Bucket": S3_BUCKET, "Key": key},
-                    ExpiresIn=3600,
-                )
-            except Exception:
-                avatar_url = None
-        else:
-            # local fallback: we store "avatars/<user_id>.png"
-            avatar_url = f"{PUBLIC_API_URL}/static/{key}"
-
-    return {
+    avatar_urls: Optional[dict] = None
+    version, key = item.get("avatar_version"), item.get("avatar_key")
+    if version:
+        # stable, immutable URLs: the browser keeps them until the avatar changes
+        avatar_url, avatar_urls = avatars.default_url(user_id, version), avatars.urls(user_id, version)
+    elif key and sparse.wants(wanted, "avatar_url"):
+        try:  # uploaded before variants existed: the original, presigned
+            avatar_url = store.blobs.url(key, expires=3600)
+        except Exception:
+            avatar_url = None
+
+    email = item.get("email") or ""
+    return sparse.trim({
         "user_id": user_id,
-        "email": item["email"],
-        "display_name": item.get("display_name") or item["email"].split("@")[0],
+        "email": email,
+        "display_name": item.get("display_name") or email.split("@")[0],
         "bio": item.get("bio", ""),
         "avatar_url": avatar_url,
+        "avatar_urls": avatar_urls,
         "is_verified": bool(item.get("email_verified", item.get("is_verified", False))),
-    }
+    }, wanted)
 
 
 @router.put("/users/me")
 def update_me(data: ProfileUpdateIn, user_id: str = Depends(current_user)):
-    if AUTH_BACKEND == "memory" or not table_users:
-        item = get_user_by_id(user_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="User not found")
-        item["display_name"] = data.display_name
-        item["bio"] = data.bio or ""
-        # Save back to memory backend
-        try:
-            from app.auth import _put_user as _auth_put_user  # type: ignore
-            _auth_put_user(item)
-        except Exception:
-            try:
-                from app.auth import _mem_users  # type: ignore
-                _mem_users[user_id] = item  # type: ignore[index]
-            except Exception:
-                pass
-        return {"msg": "updated"}
-
-    # Dynamo path
-    resp = table_users.get_item(Key={"user_id": user_id})  # type: ignore[union-attr]
-    item = resp.get("Item")
-    if not item:
+    if not get_user_by_id(user_id, ["user_id"]):
         raise HTTPException(status_code=404, detail="User not found")
-
-    item["display_name"] = data.display_name
-    item["bio"] = data.bio or ""
-    table_users.put_item(Item=item)  # type: ignore[union-attr]
+    store.users.update(user_id, {"display_name": data.display_name, "bio": data.bio or ""})
     return {"msg": "updated"}
 
 
-@router.put("/users/me/avatar")
-def update_avatar(
-    request: Request,
-    file: UploadFile = File(...),
-    user_id: str = Depends(current_user),
-):
-    contents = file.file.read()
+# the form is parsed inside the handler (after admission), so document it here
+AVATAR_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    },
+}
+
+
+@router.put("/users/me/avatar", openapi_extra=AVATAR_FORM)
+async def update_avatar(request: Request, user_id: str = Depends(current_user)):
+    # decoding is the expensive part: take an upload slot before reading the body
+    size = min(ingest.reservation(request.headers.get("content-length")), avatars.AVATAR_FORM_BYTES)
+    async with ingest.admit(user_id, size):
+        body = Request(request.scope, ingest.limit_body(request.receive, size))
+        async with body.form(max_files=1) as form:
+            file = form.get("file")
+            if not isinstance(file, StarletteUploadFile):
+                raise HTTPException(422, "file is required")
+            return await run_in_threadpool(_store_avatar, file, user_id)
+
+
+def _store_avatar(file: StarletteUploadFile, user_id: str) -> dict:
+    contents = file.file.read(avatars.AVATAR_MAX_BYTES + 1)
     if not contents:
         raise HTTPException(status_code=400, detail="empty file")
+    if len(contents) > avatars.AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"avatar larger than {avatars.AVATAR_MAX_BYTES} bytes")
 
-    # Local fallback when no S3
-    if AUTH_BACKEND == "memory" or not s3 or not S3_BUCKET:
-        root: Path = getattr(request.app.state, "local_upload_root", Path("local_uploads"))
-        (root / "avatars").mkdir(parents=True, exist_ok=True)
-        rel_key = f"avatars/{user_id}.png"
-        out_path = root / rel_key
-        with open(out_path, "wb") as f:
-            f.write(contents)
-
-        # update user record in memory
-        item = get_user_by_id(user_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="User not found")
-        item["avatar_key"] = rel_key
-        try:
-            from app.auth import _put_user as _auth_put_user  # type: ignore
-            _auth_put_user(item)
-        except Exception:
-            try:
-                from app.auth import _mem_users  # type: ignore
-                _mem_users[user_id] = item  # type: ignore[index]
-            except Exception:
-                pass
-
-        return {"avatar_url": f"{PUBLIC_API_URL}/static/{rel_key}"}
-
-    # Dynamo/S3 path
-    key = f"avatars/{user_id}.png"
-    s3.put_object(  # type: ignore[union-attr]
-        Bucket=S3_BUCKET,
-        Key=key,
-        Body=contents,
-        ContentType=file.content_type or "image/png",
-    )
-
-    # Update record
-    resp = table_users.get_item(Key={"user_id": user_id})  # type: ignore[union-attr]
-    item = resp.get("Item")
-    if not item:
+    user = get_user_by_id(user_id, avatars.USER_FIELDS)
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    item["avatar_key"] = key
-    table_users.put_item(Item=item)  # type: ignore[union-attr]
 
-    url = s3.generate_presigned_url(  # type: ignore[union-attr]
-        "get_object",
-        Params={"Bucket": S3_BUCKET, "Key": key},
-        ExpiresIn=3600,
-    )
-    return {"avatar_url": url}
+    version = avatars.version_of(contents)
+    if user.get("avatar_version") != version:  # the same picture again: nothing to do
+        written = []
+        for size, body in avatars.render(contents).items():
+            written.append(avatars.key(user_id, version, size))
+            store.blobs.put(written[-1], body, avatars.content_type())
+        store.users.update(user_id, {
+            "avatar_key": avatars.key(user_id, version, avatars.AVATAR_SIZES[-1]),
+            "avatar_version": version,
+            "avatar_keys": written,
+        })
+        old = avatars.keys(user)
+        if old:
+            try:  # nothing links to them any more; a failure only leaves garbage
+                store.blobs.delete_many(old)
+            except Exception as e:
+                log.warning("old avatar cleanup failed for %s: %s", user_id, e)
+
+    return {"avatar_url": avatars.default_url(user_id, version), "avatar_urls": avatars.urls(user_id, version)}
+
+
+@router.get("/avatars/{user_id}/{version}/{name}")
+def get_avatar(user_id: str, version: str, name: str, request: Request):
+    """Public, immutable avatar variant; the URL changes whenever the picture does."""
+    key = avatars.blob_key(user_id, version, name)
+    if not key:
+        raise HTTPException(status_code=404, detail="Not found")
+    headers = {"Cache-Control": avatars.AVATAR_CACHE_CONTROL, "ETag": f'"{version}-{name}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)  # immutable: no need to look
+    on_disk = store.blobs.path(key)
+    if on_disk:
+        return FileResponse(on_disk[0], media_type=on_disk[1], headers=headers)
+    found = store.blobs.get(key)
+    if not found:
+        raise HTTPException(status_code=404, detail="Not found")
+    body, content_type = found
+    return Response(content=body, media_type=content_type, headers=headers)
 
 
 @router.delete("/users/me", status_code=status.HTTP_204_NO_CONTENT)
 def delete_me(user_id: str = Depends(current_user)):
-    if AUTH_BACKEND == "memory" or not table_users:
-        # memory cleanup only
-        try:
-            from app.auth import _mem_users, _mem_tokens  # type: ignore
-            _mem_users.pop(user_id, None)
-            for tok, data in list(_mem_tokens.items()):
-                if data.get("user_id") == user_id:
-                    _mem_tokens.pop(tok, None)
-        except Exception:
-            pass
-        return  # 204
-
-    # Dynamo path (unchanged)
-    user = table_users.get_item(Key={"user_id": user_id}).get("Item")  # type: ignore[union-attr]
+    user = get_user_by_id(user_id, avatars.USER_FIELDS)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    keys_to_delete = []
-    if user.get("avatar_key"):
-        keys_to_delete.append({"Key": user["avatar_key"]})
-
-    albums = table_albums.scan(  # type: ignore[union-attr]
-        FilterExpression=Attr("owner").eq(user_id)
-    ).get("Items", [])
+    keys_to_delete = avatars.keys(user)
 
-    for alb in albums:
+    for alb in store.albums.list_by_owner(user_id):
         alb_id = alb["album_id"]
-        photos = table_photos.query(  # type: ignore[union-attr]
-            IndexName="album_id-index",
-            KeyConditionExpression=Key("album_id").eq(alb_id),
-        ).get("Items", [])
-
-        for p in photos:
+        for p in store.photos.list_album(alb_id):
             if p.get("s3_key"):
-                keys_to_delete.append({"Key": p["s3_key"]})
-            table_photos.delete_item(Key={"photo_id": p["photo_id"]})  # type: ignore[union-attr]
-
-        table_albums.delete_item(Key={"album_id": alb_id})  # type: ignore[union-attr]
-
-    if table_tokens:
-        toks = table_tokens.scan(  # type: ignore[union-attr]
-            FilterExpression=Attr("user_id").eq(user_id)
-        ).get("Items", [])
-        for t in toks:
-            table_tokens.delete_item(Key={"token": t["token"]})  # type: ignore[union-attr]
-
-    table_users.delete_item(Key={"user_id": user_id})  # type: ignore[union-attr]
-
-    if s3 and S3_BUCKET and keys_to_delete:
-        while keys_to_delete:
-            batch = keys_to_delete[:1000]
-            keys_to_delete = keys_to_delete[1000:]
-            try:
-                s3.delete_objects(Bucket=S3_BUCKET, Delete={"Objects": batch})
-            except Exception:
-                pass
+                keys_to_delete.append(p["s3_key"])
+            store.photos.delete(p["photo_id"])
+        store.albums.delete(alb_id)
+
+    # one-time tokens of this user, then the user itself
+    for t in store.tokens.list_by_user(user_id):
+        store.tokens.delete(t["token"])
+    store.users.delete(user_id)
+
+    if keys_to_delete:
+        store.blobs.delete_many(keys_to_delete)
 
     return  # 204
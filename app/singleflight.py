@@ -0,0 +1,86 @@
+# app/singleflight.py
+"""
+Single-flight coalescing for hot reads.
+
+When a popular album is opened by many clients at once, every request would
+run the same Albums GetItem, PhotoMeta query and presigning loop. `do(key,
+fn)` lets the first caller for a key run `fn` while identical calls that
+arrive before it finishes wait for, and share, its result (or exception).
+Nothing is kept afterwards: this collapses concurrent work, it is not a
+cache.
+
+Keys start with the operation name, e.g. ("photos.page", album_id, version,
+limit, cursor, fields). Anything that changes the answer belongs in the key;
+the album's version is part of the listing key, so a listing started before
+an upload is never handed to a request that arrives after it.
+
+Results are shared between callers and must be treated as read-only.
+Sync endpoints run on worker threads, so waiting is a plain Event wait.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class Group:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, op: str, result: str) -> None:
+        s = self._stats.setdefault(op, {"leader": 0, "shared": 0})
+        s[result] += 1
+
+    def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Any]) -> Any:
+        op = str(key[0])
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.followers += 1
+            self._count(op, "leader" if leader else "shared")
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def forget(self, key: Tuple[Hashable, ...]) -> None:
+        """Calls for `key` from now on start a new flight (use after a write)."""
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {op: dict(s, in_flight=sum(1 for k in self._calls if k[0] == op)) for op, s in self._stats.items()}
+
+
+flights = Group()
+do = flights.do
+forget = flights.forget
+stats = flights.stats
@@ -0,0 +1,122 @@
+# app/storage/__init__.py
+"""
+Backend selection for user/token/album/photo/blob storage.
+
+STORAGE_BACKEND=dynamo  – DynamoDB Users/Tokens/Albums/PhotoMeta + S3 (default)
+STORAGE_BACKEND=memory  – in-process dicts with real indexes (default when
+                          AUTH_BACKEND=memory), no AWS calls at all
+STORAGE_BACKEND=sqlite  – one SQLite file in WAL mode (DATABASE_URL=sqlite:///path
+                          or SQLITE_PATH), blobs on local disk by default
+
+BLOB_BACKEND=s3 | local | memory overrides where blob bytes go; `local` is
+the content-addressed store in storage/local.py under LOCAL_BLOB_ROOT.
+
+On the dynamo and sqlite backends, photos are wrapped in the read-through
+item cache from storage/cache.py (ITEM_CACHE=0 to disable); users and albums
+are too when SHARED_CACHE_URL is set, and the cache is then shared between
+workers.
+
+auth.py and the routers use the module-level `store`
+(store.users / store.tokens / store.albums / store.photos / store.blobs).
+"""
+from __future__ import annotations
+
+import os
+
+from typing import Optional
+
+from .base import AlbumStore, BlobStore, PhotoStore, TokenStore, UserStore
+
+AUTH_BACKEND = os.getenv("AUTH_BACKEND", "dynamo").lower().strip()
+STORAGE_BACKEND = (
+    os.getenv("STORAGE_BACKEND") or ("memory" if AUTH_BACKEND == "memory" else "dynamo")
+).lower().strip()
+BLOB_BACKEND = (
+    os.getenv("BLOB_BACKEND") or {"memory": "memory", "sqlite": "local"}.get(STORAGE_BACKEND, "s3")
+).lower().strip()
+LOCAL_BLOB_ROOT = os.getenv("LOCAL_BLOB_ROOT", "blob_store")
+
+
+class Store:
+    def __init__(
+        self,
+        albums: AlbumStore,
+        photos: PhotoStore,
+        blobs: BlobStore,
+        backend: str,
+        users: Optional[UserStore] = None,
+        tokens: Optional[TokenStore] = None,
+    ):
+        self.albums = albums
+        self.photos = photos
+        self.blobs = blobs
+        self.backend = backend
+        self.users = users
+        self.tokens = tokens
+
+
+def _make_blobs() -> BlobStore:
+    if BLOB_BACKEND == "memory":
+        from .memory import MemoryBlobStore
+
+        return MemoryBlobStore()
+    if BLOB_BACKEND == "local":
+        from .local import LocalBlobStore
+
+        return LocalBlobStore(LOCAL_BLOB_ROOT)
+
+    from ..aws_config import S3_BUCKET, s3
+    from .dynamo import S3BlobStore
+
+    return S3BlobStore(s3, S3_BUCKET)
+
+
+def _make_store() -> Store:
+    blobs = _make_blobs()
+
+    if STORAGE_BACKEND == "memory":
+        from .memory import MemoryAlbumStore, MemoryPhotoStore, MemoryTokenStore, MemoryUserStore
+
+        return Store(
+            MemoryAlbumStore(), MemoryPhotoStore(), blobs, "memory",
+            users=MemoryUserStore(), tokens=MemoryTokenStore(),
+        )
+
+    if STORAGE_BACKEND == "sqlite":
+        from .sqlite import (
+            SQLiteAlbumStore,
+            SQLiteDB,
+            SQLitePhotoStore,
+            SQLiteTokenStore,
+            SQLiteUserStore,
+            _db_path,
+        )
+
+        db = SQLiteDB(_db_path())
+        return Store(
+            SQLiteAlbumStore(db), SQLitePhotoStore(db), blobs, "sqlite",
+            users=SQLiteUserStore(db), tokens=SQLiteTokenStore(db),
+        )
+
+    from ..aws_config import dyna
+    from .dynamo import DynamoAlbumStore, DynamoPhotoStore, DynamoTokenStore, DynamoUserStore
+
+    return Store(
+        DynamoAlbumStore(dyna), DynamoPhotoStore(dyna), blobs, "dynamo",
+        users=DynamoUserStore(dyna), tokens=DynamoTokenStore(dyna),
+    )
+
+
+store = _make_store()
+if store.backend != "memory":
+    from . import cache as _item_cache
+
+    if _item_cache.ITEM_CACHE:
+        from ..kv import get_kv
+
+        _item_cache.wrap(store, get_kv())
+
+__all__ = [
+    "store", "Store", "UserStore", "TokenStore", "AlbumStore", "PhotoStore", "BlobStore",
+    "STORAGE_BACKEND", "BLOB_BACKEND",
+]
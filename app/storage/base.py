@@ -0,0 +1,210 @@
+# app/storage/base.py
+"""
+Storage interfaces used by app/auth.py and the routers.
+
+Items are plain dicts shaped like the DynamoDB items we have always stored
+(Users: user_id/email/password_hash/..., Albums: album_id/owner/title/
+created_at, PhotoMeta: photo_id/album_id/s3_key/uploaded_at/..., Tokens:
+token/type/user_id/expires_at). Every backend returns *copies*, so callers
+may decorate them (url, cover_url, ...) without touching stored state.
+
+Read methods that take `fields` return only those attributes (plus the key
+and sort attributes the method itself needs); on DynamoDB that becomes a
+ProjectionExpression, elsewhere the copy is trimmed.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret")
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://127.0.0.1:8000")
+
+
+Fields = Optional[Iterable[str]]
+
+
+def project(item: Optional[Dict], fields: Fields) -> Optional[Dict]:
+    if item is None or fields is None:
+        return item
+    return {k: item[k] for k in fields if k in item}
+
+
+def with_keys(fields: Fields, *keys: str) -> Optional[List[str]]:
+    """`fields` plus `keys`, order kept and deduplicated; None (= everything) stays None."""
+    if fields is None:
+        return None
+    return list(dict.fromkeys([*keys, *fields]))
+
+
+class UserStore:
+    def get(self, user_id: str, fields: Fields = None) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def put(self, item: Dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def update(self, user_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        """SET `values` and REMOVE `remove` attributes on one user."""
+        raise NotImplementedError
+
+    def incr(self, user_id: str, attr: str, by: int = 1) -> Optional[int]:
+        """Atomically add `by` to a numeric attribute (missing = 0); None if the user doesn't exist."""
+        raise NotImplementedError
+
+
+class TokenStore:
+    """One-time tokens and revocation records, keyed by `token`."""
+
+    def get(self, token: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def put(self, item: Dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, token: str) -> None:
+        raise NotImplementedError
+
+    def list_by_user(self, user_id: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def list_by_type(self, types: Iterable[str], expires_after: int = 0) -> List[Dict]:
+        """Records of the given types whose expires_at is at least `expires_after`."""
+        raise NotImplementedError
+
+
+class AlbumStore:
+    def get(self, album_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def put(self, item: Dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, album_id: str) -> None:
+        raise NotImplementedError
+
+    def list_by_owner(self, owner: str, fields: Fields = None) -> List[Dict]:
+        """Albums owned by `owner`, oldest first (created_at)."""
+        raise NotImplementedError
+
+    def title_exists(self, owner: str, title: str) -> bool:
+        return any(a.get("title") == title for a in self.list_by_owner(owner))
+
+    def incr(self, album_id: str, attr: str, by: int = 1) -> Optional[int]:
+        """Atomically add `by` to a numeric attribute (missing = 0); None if the album doesn't exist."""
+        raise NotImplementedError
+
+    def update(self, album_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        """SET `values` and REMOVE `remove` on an existing album (no-op if it is gone)."""
+        raise NotImplementedError
+
+    def get_many(self, album_ids: Iterable[str]) -> Dict[str, Dict]:
+        """album_id -> item for the ids that exist; raises rather than leave out an id it couldn't read."""
+        out = {}
+        for aid in album_ids:
+            item = self.get(aid)
+            if item:
+                out[aid] = item
+        return out
+
+
+class PhotoStore:
+    def get(self, photo_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def put(self, item: Dict) -> None:
+        raise NotImplementedError
+
+    def delete(self, photo_id: str) -> None:
+        raise NotImplementedError
+
+    def list_album(self, album_id: str, fields: Fields = None) -> List[Dict]:
+        """All photos of an album, oldest first (uploaded_at)."""
+        raise NotImplementedError
+
+    def latest(self, album_id: str) -> Optional[Dict]:
+        items = self.list_album(album_id)
+        return items[-1] if items else None
+
+    def page(
+        self, album_id: str, limit: int, after: Optional[str] = None, fields: Fields = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """One page of an album; `after` / the returned cursor is the last photo_id seen."""
+        items = self.list_album(album_id, with_keys(fields, "photo_id"))
+        start = 0
+        if after:
+            for i, p in enumerate(items):
+                if p.get("photo_id") == after:
+                    start = i + 1
+                    break
+        page = items[start : start + limit]
+        next_key = page[-1]["photo_id"] if page and (start + limit) < len(items) else None
+        return page, next_key
+
+
+class BlobStore:
+    # True when blobs are served by this API (routers/blobs.py) rather than S3
+    local = False
+
+    def put(self, key: str, body: bytes, content_type: str = "application/octet-stream") -> None:
+        raise NotImplementedError
+
+    def upload_file(self, path: str, key: str, content_type: str = "application/octet-stream") -> None:
+        with open(path, "rb") as f:
+            self.put(key, f.read(), content_type)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """(body, content_type) or None."""
+        raise NotImplementedError
+
+    def path(self, key: str) -> Optional[Tuple[str, str]]:
+        """(filesystem path, content_type) when the blob is a local file, else None."""
+        return None
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        for k in keys:
+            try:
+                self.delete(k)
+            except Exception:
+                pass
+
+    def url(self, key: str, expires: int = 3600, download_name: Optional[str] = None) -> str:
+        """Time-limited GET url; `download_name` forces Content-Disposition: attachment."""
+        raise NotImplementedError
+
+    def upload_url(self, key: str, content_type: str, expires: int = 900) -> str:
+        """Time-limited PUT url for direct browser uploads."""
+        raise NotImplementedError
+
+
+# ---- signed urls for blobs served by this API (memory/local backends) ----
+def _blob_sig(method: str, key: str, exp: int, dl: str = "") -> str:
+    msg = f"{method}\n{key}\n{exp}\n{dl}".encode()
+    return hmac.new(JWT_SECRET.encode(), msg, hashlib.sha256).hexdigest()[:32]
+
+
+def signed_local_url(method: str, key: str, expires: int, download_name: Optional[str] = None) -> str:
+    exp = int(time.time()) + int(expires)
+    q = {"exp": exp, "sig": _blob_sig(method, key, exp, download_name or "")}
+    if download_name:
+        q["dl"] = download_name
+    return f"{PUBLIC_API_URL}/blobs/{quote(key)}?{urlencode(q)}"
+
+
+def check_local_signature(method: str, key: str, exp: int, sig: str, download_name: Optional[str] = None) -> bool:
+    if exp < time.time():
+        return False
+    return hmac.compare_digest(sig, _blob_sig(method, key, exp, download_name or ""))
@@ -0,0 +1,457 @@
+# app/storage/cache.py
+"""
+Read-through item cache in front of the Users / Albums / PhotoMeta stores.
+
+Ownership checks (`_assert_album_ownership`) and profile loads read the same
+few items over and over, and they change rarely. `Cached*Store` wrap the
+real stores: `get` (and `AlbumStore.get_many`) go through a bounded LRU,
+and every write made through the wrapper (put / update / incr / delete)
+drops the item's entries before returning, so this process never serves an
+item older than its own last write.
+
+* ITEM_CACHE_TTL seconds (default 30): entries younger than this are served
+  as-is
+* ITEM_CACHE_STALE seconds (default 30): past the TTL, an entry is still
+  served for this long while a background thread re-reads it
+  (stale-while-revalidate; one refresh per key at a time)
+* ITEM_CACHE_SIZE entries per table (default 10000), least recently used
+  evicted first
+* ITEM_CACHE=0 turns the wrappers off
+
+Writes made by *other* processes are only picked up when the TTL runs out,
+so TTL + STALE bounds how stale an item can be across workers. Users and
+Albums carry the listing validators (Users.albums_version, Albums.version,
+see app/etags.py), and a stale validator means a wrong 304 and a stale page
+from the page cache, so those two tables are only cached with the shared
+tier below, whose invalidations reach every worker on write. Without it,
+only PhotoMeta is cached. Projected
+reads (`fields=`) are cached separately from full items, and an item's
+variants are all dropped together. Misses (item does not exist) are not
+cached.
+
+With a shared backend configured (SHARED_CACHE_URL, see app/kv.py) there is
+a second tier behind the per-process LRU: a miss here reads the shared
+cache (pipelined for get_many) before the database, fills go back to it
+unless the item was invalidated meanwhile, and every write resets the
+item's shared entry and broadcasts the invalidation, so the other workers
+drop their copies right away instead of after the TTL. Shared entries live
+ITEM_CACHE_SHARED_TTL seconds (default 300).
+
+Hit / stale / miss / eviction / invalidation counts per table come from
+`stats()` and are exported on /metrics.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from ..kv import VERSION_FIELD
+from .base import AlbumStore, Fields, PhotoStore, UserStore
+
+log = logging.getLogger("uvicorn.error")
+
+ITEM_CACHE = os.getenv("ITEM_CACHE", "1").lower() not in ("0", "false", "no", "off")
+ITEM_CACHE_SIZE = int(os.getenv("ITEM_CACHE_SIZE", "10000"))
+ITEM_CACHE_TTL = float(os.getenv("ITEM_CACHE_TTL", "30"))
+ITEM_CACHE_STALE = float(os.getenv("ITEM_CACHE_STALE", "30"))
+ITEM_CACHE_SHARED_TTL = float(os.getenv("ITEM_CACHE_SHARED_TTL", "300"))
+INVALIDATION_CHANNEL = "item-cache-invalidate"
+
+_caches: Dict[str, "ItemCache"] = {}
+_refresher: Optional[ThreadPoolExecutor] = None
+_refresher_lock = threading.Lock()
+
+
+def _refresh_pool() -> ThreadPoolExecutor:
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="item-cache")
+        return _refresher
+
+
+def _json_default(o):
+    if isinstance(o, Decimal):
+        return {"$d": str(o)}
+    if isinstance(o, (set, frozenset)):
+        return {"$s": sorted(o, key=str)}
+    raise TypeError(f"not cacheable: {type(o).__name__}")
+
+
+def _json_hook(d: Dict):
+    if len(d) == 1:
+        if "$d" in d:
+            return Decimal(d["$d"])
+        if "$s" in d:
+            return set(d["$s"])
+    return d
+
+
+def encode_item(item: Dict) -> bytes:
+    """JSON that round-trips DynamoDB's Decimal and set values."""
+    return json.dumps(item, default=_json_default, separators=(",", ":")).encode()
+
+
+def decode_item(raw: bytes) -> Dict:
+    return json.loads(raw, object_hook=_json_hook)
+
+
+class SharedTier:
+    """One table's entries in the shared KV: a hash per item, one field per projection."""
+
+    def __init__(self, kv, table: str, ttl: float = ITEM_CACHE_SHARED_TTL):
+        self.kv = kv
+        self.table = table
+        self.ttl = ttl
+
+    def _key(self, item_id: str) -> str:
+        return f"item:{self.table}:{item_id}"
+
+    @staticmethod
+    def _field(variant: Hashable) -> str:
+        return "*" if variant is None else ",".join(variant)
+
+    def lookup(self, requests: List[Tuple[str, Hashable]]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+        """(item or None, version to fill against) per (item_id, variant)."""
+        rows = self.kv.hmget_many([(self._key(i), [self._field(v), VERSION_FIELD]) for i, v in requests])
+        out = []
+        for raw, version in rows:
+            item = None
+            if raw is not None:
+                try:
+                    item = decode_item(raw)
+                except ValueError:
+                    pass
+            out.append((item, version.decode() if version is not None else None))
+        return out
+
+    def fill(self, entries: List[Tuple[str, Hashable, Dict, Optional[str]]]) -> None:
+        fills = []
+        for item_id, variant, item, version in entries:
+            try:
+                fills.append((self._key(item_id), self._field(variant), encode_item(item), version))
+            except TypeError:
+                continue
+        self.kv.hset_if_version(fills, self.ttl)
+
+    def reset(self, item_id: str) -> None:
+        # a fresh version makes fills from reads that started before this write fail
+        self.kv.hash_reset(self._key(item_id), uuid.uuid4().hex, self.ttl)
+        self.kv.publish(INVALIDATION_CHANNEL, f"{self.table}:{item_id}")
+
+
+class ItemCache:
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = ITEM_CACHE_SIZE,
+        ttl: float = ITEM_CACHE_TTL,
+        stale: float = ITEM_CACHE_STALE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale = stale
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (item id, variant) -> (item, stored_at); variant is the projected field list or None
+        self._data: "OrderedDict[Tuple[str, Hashable], Tuple[Dict, float]]" = OrderedDict()
+        self._variants: Dict[str, Set[Hashable]] = {}
+        # item id -> counter value of its last invalidate(); a load only lands
+        # in the cache if its id wasn't invalidated while it ran
+        self._generation: Dict[str, int] = {}
+        self._counter = 0
+        self._floor = 0  # generation of ids forgotten by _generation's cleanup
+        self._refreshing: Set[Tuple[str, Hashable]] = set()
+        self._stats = {
+            "hits": 0, "stale": 0, "misses": 0, "shared_hits": 0, "evictions": 0, "invalidations": 0,
+        }
+        self.shared: Optional[SharedTier] = None
+
+    def get(self, item_id: str, load: Callable[[], Optional[Dict]], variant: Hashable = None) -> Optional[Dict]:
+        key = (item_id, variant)
+        now = self._clock()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                item, stored_at = entry
+                age = now - stored_at
+                if age < self.ttl:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return dict(item)
+                if age < self.ttl + self.stale:
+                    self._data.move_to_end(key)
+                    self._stats["stale"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        _refresh_pool().submit(self._refresh, key, load, self._gen(item_id))
+                    return dict(item)
+            generation = self._gen(item_id)
+        version = None
+        if self.shared is not None:
+            shared_item, version = self.shared.lookup([key])[0]
+            if shared_item is not None:
+                self._count("shared_hits")
+                self._store(key, shared_item, generation)
+                return shared_item
+        self._count("misses")
+        item = load()
+        if item is not None:
+            self._store(key, item, generation)
+            if self.shared is not None:
+                self.shared.fill([(item_id, variant, item, version)])
+        return item
+
+    def get_many(self, item_ids: Iterable[str], load_many: Callable[[List[str]], Dict[str, Dict]]) -> Dict[str, Dict]:
+        """Full items for `item_ids`; everything not fresh in the cache is read with one `load_many`."""
+        out: Dict[str, Dict] = {}
+        missing: List[str] = []
+        now = self._clock()
+        with self._lock:
+            for item_id in item_ids:
+                entry = self._data.get((item_id, None))
+                if entry is not None and now - entry[1] < self.ttl:
+                    self._data.move_to_end((item_id, None))
+                    self._stats["hits"] += 1
+                    out[item_id] = dict(entry[0])
+                else:
+                    missing.append(item_id)
+            generations = {i: self._gen(i) for i in missing}
+        versions: Dict[str, Optional[str]] = {}
+        if missing and self.shared is not None:
+            found = self.shared.lookup([(i, None) for i in missing])
+            still_missing = []
+            for item_id, (item, version) in zip(missing, found):
+                if item is not None:
+                    self._count("shared_hits")
+                    self._store((item_id, None), item, generations[item_id])
+                    out[item_id] = item
+                else:
+                    versions[item_id] = version
+                    still_missing.append(item_id)
+            missing = still_missing
+        if missing:
+            self._count("misses", len(missing))
+            loaded = load_many(missing)
+            for item_id, item in loaded.items():
+                self._store((item_id, None), item, generations[item_id])
+                out[item_id] = item
+            if self.shared is not None:
+                self.shared.fill([(i, None, item, versions.get(i)) for i, item in loaded.items()])
+        return out
+
+    def _count(self, stat: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[stat] += n
+
+    def _gen(self, item_id: str) -> int:
+        return self._generation.get(item_id, self._floor)
+
+    def _refresh(self, key: Tuple[str, Hashable], load: Callable[[], Optional[Dict]], generation: int) -> None:
+        try:
+            item = load()
+            if item is None:
+                self.invalidate(key[0])
+            else:
+                self._store(key, item, generation)
+        except Exception as e:  # keep serving the stale copy until it expires
+            log.warning("item cache refresh failed for %s %s: %s", self.name, key[0], e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key: Tuple[str, Hashable], item: Dict, generation: int) -> None:
+        item_id = key[0]
+        with self._lock:
+            if self._gen(item_id) != generation:
+                return  # written while we were reading: our copy may predate the write
+            self._data[key] = (dict(item), self._clock())
+            self._data.move_to_end(key)
+            self._variants.setdefault(item_id, set()).add(key[1])
+            while len(self._data) > self.maxsize:
+                (old_id, old_variant), _ = self._data.popitem(last=False)
+                variants = self._variants.get(old_id)
+                if variants is not None:
+                    variants.discard(old_variant)
+                    if not variants:
+                        del self._variants[old_id]
+                self._stats["evictions"] += 1
+
+    def invalidate(self, item_id: str) -> None:
+        """An item was written: drop it here, in the shared tier, and in the other workers."""
+        self.drop(item_id)
+        if self.shared is not None:
+            self.shared.reset(item_id)
+
+    def drop(self, item_id: str) -> None:
+        with self._lock:
+            self._counter += 1
+            self._generation[item_id] = self._counter
+            for variant in self._variants.pop(item_id, ()):
+                self._data.pop((item_id, variant), None)
+            self._stats["invalidations"] += 1
+            if len(self._generation) > 4 * self.maxsize:
+                self._forget_generations()
+
+    def _forget_generations(self) -> None:
+        # every id now reads as the newest generation: loads already in
+        # flight won't be cached, which is the safe side
+        self._generation.clear()
+        self._floor = self._counter
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._variants.clear()
+            self._counter += 1
+            self._forget_generations()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._data)}
+
+
+def _cache(name: str) -> ItemCache:
+    cache = _caches.get(name)
+    if cache is None:
+        cache = _caches[name] = ItemCache(name)
+    return cache
+
+
+def _variant(fields: Fields) -> Hashable:
+    return None if fields is None else tuple(fields)
+
+
+class _Cached:
+    def __init__(self, inner, cache: ItemCache):
+        self.inner = inner
+        self.cache = cache
+
+    def __getattr__(self, name: str) -> Any:
+        # backend-specific extras (table, index flags, ...) pass straight through
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+
+class CachedUserStore(_Cached, UserStore):
+    def get(self, user_id: str, fields: Fields = None) -> Optional[Dict]:
+        return self.cache.get(user_id, lambda: self.inner.get(user_id, fields), _variant(fields))
+
+    def put(self, item: Dict) -> None:
+        self.inner.put(item)
+        self.cache.invalidate(item["user_id"])
+
+    def delete(self, user_id: str) -> None:
+        self.inner.delete(user_id)
+        self.cache.invalidate(user_id)
+
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        return self.inner.find_by_email(email)  # login path: always the stored hash
+
+    def update(self, user_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        self.inner.update(user_id, values, remove)
+        self.cache.invalidate(user_id)
+
+    def incr(self, user_id: str, attr: str, by: int = 1) -> Optional[int]:
+        try:
+            return self.inner.incr(user_id, attr, by)
+        finally:
+            self.cache.invalidate(user_id)
+
+
+class CachedAlbumStore(_Cached, AlbumStore):
+    def get(self, album_id: str) -> Optional[Dict]:
+        return self.cache.get(album_id, lambda: self.inner.get(album_id))
+
+    def get_many(self, album_ids: Iterable[str]) -> Dict[str, Dict]:
+        return self.cache.get_many(list(dict.fromkeys(album_ids)), self.inner.get_many)
+
+    def put(self, item: Dict) -> None:
+        self.inner.put(item)
+        self.cache.invalidate(item["album_id"])
+
+    def delete(self, album_id: str) -> None:
+        self.inner.delete(album_id)
+        self.cache.invalidate(album_id)
+
+    def list_by_owner(self, owner: str, fields: Fields = None) -> List[Dict]:
+        return self.inner.list_by_owner(owner, fields)
+
+    def title_exists(self, owner: str, title: str) -> bool:
+        return self.inner.title_exists(owner, title)
+
+    def incr(self, album_id: str, attr: str, by: int = 1) -> Optional[int]:
+        try:
+            return self.inner.incr(album_id, attr, by)
+        finally:
+            self.cache.invalidate(album_id)
+
+    def update(self, album_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        try:
+            self.inner.update(album_id, values, remove)
+        finally:
+            self.cache.invalidate(album_id)
+
+
+class CachedPhotoStore(_Cached, PhotoStore):
+    def get(self, photo_id: str) -> Optional[Dict]:
+        return self.cache.get(photo_id, lambda: self.inner.get(photo_id))
+
+    def put(self, item: Dict) -> None:
+        self.inner.put(item)
+        self.cache.invalidate(item["photo_id"])
+
+    def delete(self, photo_id: str) -> None:
+        self.inner.delete(photo_id)
+        self.cache.invalidate(photo_id)
+
+    def list_album(self, album_id: str, fields: Fields = None) -> List[Dict]:
+        return self.inner.list_album(album_id, fields)
+
+    def latest(self, album_id: str) -> Optional[Dict]:
+        return self.inner.latest(album_id)
+
+    def page(self, album_id: str, limit: int, after: Optional[str] = None, fields: Fields = None):
+        return self.inner.page(album_id, limit, after, fields)
+
+
+def _on_invalidation(message: str) -> None:
+    table, _, item_id = message.partition(":")
+    cache = _caches.get(table)
+    if cache is not None and item_id:
+        cache.drop(item_id)
+
+
+def wrap(store, kv=None) -> None:
+    """Put the cache wrappers around `store.photos`, and with `kv` also `store.users` / `.albums`, in place.
+
+    With `kv` (an app.kv backend) the caches get the shared tier and listen
+    for invalidations from other workers. Without it, Users and Albums stay
+    uncached: their version fields are ETag validators and must not be served
+    stale by a worker that missed another's write.
+    """
+    if kv is not None:
+        if store.users is not None:
+            store.users = CachedUserStore(store.users, _cache("users"))
+        store.albums = CachedAlbumStore(store.albums, _cache("albums"))
+    store.photos = CachedPhotoStore(store.photos, _cache("photos"))
+    if kv is not None:
+        for name, cache in _caches.items():
+            cache.shared = SharedTier(kv, name)
+        kv.subscribe(INVALIDATION_CHANNEL, _on_invalidation)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
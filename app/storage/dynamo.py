@@ -0,0 +1,408 @@
+# app/storage/dynamo.py
+"""DynamoDB (Users / Tokens / Albums / PhotoMeta) + S3 implementation of the storage interfaces."""
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+from .base import AlbumStore, BlobStore, Fields, PhotoStore, TokenStore, UserStore, with_keys
+
+USERS_TABLE = os.getenv("DYNAMO_USERS", "Users")
+TOKENS_TABLE = os.getenv("DYNAMO_TOKENS", "Tokens")
+# GSI (PK=user_id) on Tokens, and TTL on expires_at: see scripts/tokens_ttl.py
+TOKENS_USER_INDEX = os.getenv("TOKENS_USER_INDEX", "user_id-index")
+TOKENS_TTL_ATTRIBUTE = "expires_at"
+# GSI (PK=type, SK=expires_at) on Tokens: revocation sync reads live records only
+TOKENS_TYPE_INDEX = os.getenv("TOKENS_TYPE_INDEX", "type-index")
+USERS_EMAIL_INDEX = "email-index"  # see nv-gsi.json
+ALBUMS_TABLE = os.getenv("DYNAMO_ALBUMS", "Albums")
+PHOTOS_TABLE = os.getenv("DYNAMO_PHOTOS", "PhotoMeta")
+# Optional GSI (PK=owner, SK=created_at); we fall back to a filtered scan without it
+ALBUMS_OWNER_INDEX = os.getenv("ALBUMS_OWNER_INDEX", "owner-index")
+PHOTOS_ALBUM_INDEX = "album_id-index"
+BATCH_GET_ATTEMPTS = 5
+# how long a store scans before asking a missing (or still CREATING) GSI again
+INDEX_RECHECK_SECONDS = float(os.getenv("INDEX_RECHECK_SECONDS", "60"))
+
+
+# boto3.dynamodb.conditions pulls in all of boto3; import it when the first
+# condition is built, not when the store is
+def Key(name: str):  # noqa: N802
+    from boto3.dynamodb.conditions import Key as _Key
+
+    return _Key(name)
+
+
+def Attr(name: str):  # noqa: N802
+    from boto3.dynamodb.conditions import Attr as _Attr
+
+    return _Attr(name)
+
+
+def _update(
+    table, key: Dict[str, str], values: Dict[str, Any], remove: Iterable[str] = (), must_exist: bool = False
+) -> None:
+    names: Dict[str, str] = {}
+    vals: Dict[str, Any] = {}
+    sets, rems = [], []
+    for i, (k, v) in enumerate(values.items()):
+        names[f"#s{i}"] = k
+        vals[f":s{i}"] = v
+        sets.append(f"#s{i} = :s{i}")
+    for i, k in enumerate(remove):
+        names[f"#r{i}"] = k
+        rems.append(f"#r{i}")
+    expr = []
+    if sets:
+        expr.append("SET " + ", ".join(sets))  # DynamoDB wants SET before REMOVE
+    if rems:
+        expr.append("REMOVE " + ", ".join(rems))
+    if not expr:
+        return
+    kwargs: Dict[str, Any] = {
+        "Key": key,
+        "UpdateExpression": " ".join(expr),
+        "ExpressionAttributeNames": names,
+    }
+    if vals:
+        kwargs["ExpressionAttributeValues"] = vals
+    if must_exist:
+        names["#k"] = next(iter(key))
+        kwargs["ConditionExpression"] = "attribute_exists(#k)"
+    try:
+        table.update_item(**kwargs)
+    except ClientError as e:
+        if not (must_exist and e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"):
+            raise
+
+
+def _incr(table, key: Dict[str, str], attr: str, by: int) -> Optional[int]:
+    # ADD is atomic server-side; the condition keeps it from creating a stub item
+    try:
+        resp = table.update_item(
+            Key=key,
+            UpdateExpression="ADD #a :by",
+            ConditionExpression="attribute_exists(#k)",
+            ExpressionAttributeNames={"#a": attr, "#k": next(iter(key))},
+            ExpressionAttributeValues={":by": by},
+            ReturnValues="UPDATED_NEW",
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+    return int(resp["Attributes"][attr])
+
+
+def _projection(fields: Fields) -> Dict[str, Any]:
+    """ProjectionExpression kwargs for `fields` (every name goes through a placeholder:
+    `name`, `owner`, `size`... are reserved words)."""
+    if fields is None:
+        return {}
+    names = {f"#p{i}": f for i, f in enumerate(fields)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def _index_missing(e: ClientError) -> bool:
+    """True for what a Query on an absent or not-yet-ACTIVE GSI raises. Throttles,
+    timeouts and AccessDenied are not this, and callers re-raise them."""
+    return e.response.get("Error", {}).get("Code") in ("ValidationException", "ResourceNotFoundException")
+
+
+def _query_all(table, **kwargs) -> List[Dict]:
+    resp = table.query(**kwargs)
+    items = resp.get("Items", [])
+    while "LastEvaluatedKey" in resp:
+        resp = table.query(ExclusiveStartKey=resp["LastEvaluatedKey"], **kwargs)
+        items.extend(resp.get("Items", []))
+    return items
+
+
+def _scan_all(table, **kwargs) -> List[Dict]:
+    resp = table.scan(**kwargs)
+    items = resp.get("Items", [])
+    while "LastEvaluatedKey" in resp:
+        resp = table.scan(ExclusiveStartKey=resp["LastEvaluatedKey"], **kwargs)
+        items.extend(resp.get("Items", []))
+    return items
+
+
+class _LazyTable:
+    """`self.table`, looked up on first use so building the store doesn't build the resource."""
+
+    table_name = ""
+
+    def __init__(self, dyna):
+        self._dyna = dyna
+        self._table = None
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = self._dyna.Table(self.table_name)
+        return self._table
+
+
+class DynamoUserStore(_LazyTable, UserStore):
+    table_name = USERS_TABLE
+
+    def __init__(self, dyna):
+        super().__init__(dyna)
+        self._email_index: Optional[bool] = None  # None: unknown, or missing at the last look
+        self._email_index_retry = 0.0  # monotonic time before which a missing index isn't asked again
+
+    def get(self, user_id: str, fields: Fields = None) -> Optional[Dict]:
+        return self.table.get_item(Key={"user_id": user_id}, **_projection(fields)).get("Item")
+
+    def put(self, item: Dict) -> None:
+        self.table.put_item(Item=item)
+
+    def delete(self, user_id: str) -> None:
+        self.table.delete_item(Key={"user_id": user_id})
+
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        if self._email_index or time.monotonic() >= self._email_index_retry:
+            try:
+                resp = self.table.query(
+                    IndexName=USERS_EMAIL_INDEX,
+                    KeyConditionExpression=Key("email").eq(email),
+                    Limit=1,
+                )
+                self._email_index = True
+                items = resp.get("Items", [])
+                return items[0] if items else None
+            except ClientError as e:
+                if not _index_missing(e):
+                    raise
+                # GSI missing (or still CREATING): scan for now, look again in INDEX_RECHECK_SECONDS
+                self._email_index = None
+                self._email_index_retry = time.monotonic() + INDEX_RECHECK_SECONDS
+        items = _scan_all(self.table, FilterExpression=Attr("email").eq(email))
+        return items[0] if items else None
+
+    def update(self, user_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        _update(self.table, {"user_id": user_id}, values, remove)
+
+    def incr(self, user_id: str, attr: str, by: int = 1) -> Optional[int]:
+        return _incr(self.table, {"user_id": user_id}, attr, by)
+
+
+class DynamoTokenStore(_LazyTable, TokenStore):
+    table_name = TOKENS_TABLE
+
+    def __init__(self, dyna):
+        super().__init__(dyna)
+        self._user_index: Optional[bool] = None  # None: unknown, or missing at the last look
+        self._user_index_retry = 0.0  # monotonic time before which a missing index isn't asked again
+        self._type_index: Optional[bool] = None
+        self._type_index_retry = 0.0
+
+    def get(self, token: str) -> Optional[Dict]:
+        return self.table.get_item(Key={"token": token}).get("Item")
+
+    def put(self, item: Dict) -> None:
+        self.table.put_item(Item=item)
+
+    def delete(self, token: str) -> None:
+        self.table.delete_item(Key={"token": token})
+
+    def list_by_user(self, user_id: str) -> List[Dict]:
+        # expired tokens are deleted by DynamoDB's TTL, but only eventually:
+        # callers that care (one-time tokens) still check expires_at
+        if self._user_index or time.monotonic() >= self._user_index_retry:
+            try:
+                items = _query_all(
+                    self.table, IndexName=TOKENS_USER_INDEX, KeyConditionExpression=Key("user_id").eq(user_id)
+                )
+                self._user_index = True
+                return items
+            except ClientError as e:
+                if not _index_missing(e):
+                    raise
+                # index missing (or still CREATING): scan for now, look again in INDEX_RECHECK_SECONDS
+                self._user_index = None
+                self._user_index_retry = time.monotonic() + INDEX_RECHECK_SECONDS
+        return _scan_all(self.table, FilterExpression=Attr("user_id").eq(user_id))
+
+    def list_by_type(self, types: Iterable[str], expires_after: int = 0) -> List[Dict]:
+        # every worker runs this every REVOCATION_SYNC_SECONDS: one Query per
+        # type over live records, not a scan of every token ever issued
+        types = list(types)
+        if self._type_index or time.monotonic() >= self._type_index_retry:
+            try:
+                items: List[Dict] = []
+                for t in types:
+                    items.extend(_query_all(
+                        self.table,
+                        IndexName=TOKENS_TYPE_INDEX,
+                        KeyConditionExpression=Key("type").eq(t) & Key(TOKENS_TTL_ATTRIBUTE).gte(int(expires_after)),
+                    ))
+                self._type_index = True
+                return items
+            except ClientError as e:
+                if not _index_missing(e):
+                    raise
+                # index missing (or still CREATING): scan for now, look again in INDEX_RECHECK_SECONDS
+                self._type_index = None
+                self._type_index_retry = time.monotonic() + INDEX_RECHECK_SECONDS
+        return _scan_all(
+            self.table,
+            FilterExpression=Attr("type").is_in(types) & Attr(TOKENS_TTL_ATTRIBUTE).gte(int(expires_after)),
+        )
+
+
+class DynamoAlbumStore(_LazyTable, AlbumStore):
+    table_name = ALBUMS_TABLE
+
+    def __init__(self, dyna):
+        super().__init__(dyna)
+        self._owner_index: Optional[bool] = None  # None: unknown, or missing at the last look
+        self._owner_index_retry = 0.0  # monotonic time before which a missing index isn't asked again
+
+    def get(self, album_id: str) -> Optional[Dict]:
+        return self.table.get_item(Key={"album_id": album_id}).get("Item")
+
+    def put(self, item: Dict) -> None:
+        self.table.put_item(Item=item)
+
+    def delete(self, album_id: str) -> None:
+        self.table.delete_item(Key={"album_id": album_id})
+
+    def list_by_owner(self, owner: str, fields: Fields = None) -> List[Dict]:
+        items: Optional[List[Dict]] = None
+        projection = _projection(with_keys(fields, "created_at"))
+        if self._owner_index or time.monotonic() >= self._owner_index_retry:
+            try:
+                items = _query_all(
+                    self.table,
+                    IndexName=ALBUMS_OWNER_INDEX,
+                    KeyConditionExpression=Key("owner").eq(owner),
+                    **projection,
+                )
+                self._owner_index = True
+            except ClientError as e:
+                if not _index_missing(e):
+                    raise
+                # no index (yet): scan for now, look again in INDEX_RECHECK_SECONDS
+                self._owner_index = None
+                self._owner_index_retry = time.monotonic() + INDEX_RECHECK_SECONDS
+        if items is None:
+            items = _scan_all(self.table, FilterExpression=Attr("owner").eq(owner), **projection)
+        items.sort(key=lambda a: a.get("created_at", 0))
+        return items
+
+    def incr(self, album_id: str, attr: str, by: int = 1) -> Optional[int]:
+        return _incr(self.table, {"album_id": album_id}, attr, by)
+
+    def update(self, album_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        _update(self.table, {"album_id": album_id}, values, remove, must_exist=True)
+
+    def get_many(self, album_ids: Iterable[str]) -> Dict[str, Dict]:
+        ids = list(dict.fromkeys(album_ids))
+        out: Dict[str, Dict] = {}
+        for i in range(0, len(ids), 100):  # BatchGetItem takes up to 100 keys
+            request = {self.table.name: {"Keys": [{"album_id": a} for a in ids[i : i + 100]]}}
+            for attempt in range(BATCH_GET_ATTEMPTS):
+                resp = self._dyna.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(self.table.name, []):
+                    out[item["album_id"]] = item
+                request = resp.get("UnprocessedKeys") or {}
+                if not request:
+                    break
+                if attempt + 1 < BATCH_GET_ATTEMPTS:
+                    time.sleep(0.02 * 2 ** attempt)  # throttled keys come back unprocessed
+            else:
+                # a key we couldn't read is not a key that doesn't exist: fail
+                # rather than let the caller report existing albums as missing
+                left = len(request.get(self.table.name, {}).get("Keys", []))
+                raise ClientError(
+                    {
+                        "Error": {
+                            "Code": "ProvisionedThroughputExceededException",
+                            "Message": f"{left} keys still unprocessed after {BATCH_GET_ATTEMPTS} BatchGetItem calls",
+                        },
+                        "ResponseMetadata": {"HTTPStatusCode": 503},
+                    },
+                    "BatchGetItem",
+                )
+        return out
+
+
+class DynamoPhotoStore(_LazyTable, PhotoStore):
+    table_name = PHOTOS_TABLE
+
+    def get(self, photo_id: str) -> Optional[Dict]:
+        return self.table.get_item(Key={"photo_id": photo_id}).get("Item")
+
+    def put(self, item: Dict) -> None:
+        self.table.put_item(Item=item)
+
+    def delete(self, photo_id: str) -> None:
+        self.table.delete_item(Key={"photo_id": photo_id})
+
+    def list_album(self, album_id: str, fields: Fields = None) -> List[Dict]:
+        items = _query_all(
+            self.table,
+            IndexName=PHOTOS_ALBUM_INDEX,
+            KeyConditionExpression=Key("album_id").eq(album_id),
+            **_projection(with_keys(fields, "uploaded_at")),
+        )
+        items.sort(key=lambda p: p.get("uploaded_at", 0))
+        return items
+
+    def latest(self, album_id: str) -> Optional[Dict]:
+        resp = self.table.query(
+            IndexName=PHOTOS_ALBUM_INDEX,
+            KeyConditionExpression=Key("album_id").eq(album_id),
+            ScanIndexForward=False,  # newest first
+            Limit=1,
+        )
+        items = resp.get("Items", [])
+        return items[0] if items else None
+
+
+class S3BlobStore(BlobStore):
+    def __init__(self, s3, bucket: str):
+        self.s3 = s3
+        self.bucket = bucket
+
+    def put(self, key: str, body: bytes, content_type: str = "application/octet-stream") -> None:
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+
+    def upload_file(self, path: str, key: str, content_type: str = "application/octet-stream") -> None:
+        self.s3.upload_file(path, self.bucket, key, ExtraArgs={"ContentType": content_type})
+
+    def get(self, key: str):
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return None
+        return obj["Body"].read(), obj.get("ContentType", "application/octet-stream")
+
+    def delete(self, key: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        objs = [{"Key": k} for k in keys]
+        while objs:
+            batch, objs = objs[:1000], objs[1000:]
+            try:
+                self.s3.delete_objects(Bucket=self.bucket, Delete={"Objects": batch})
+            except Exception:
+                pass
+
+    def url(self, key: str, expires: int = 3600, download_name: Optional[str] = None) -> str:
+        params = {"Bucket": self.bucket, "Key": key}
+        if download_name:
+            params["ResponseContentDisposition"] = f'attachment; filename="{download_name}"'
+        return self.s3.generate_presigned_url("get_object", Params=params, ExpiresIn=expires)
+
+    def upload_url(self, key: str, content_type: str, expires: int = 900) -> str:
+        return self.s3.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires,
+        )
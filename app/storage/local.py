@@ -0,0 +1,300 @@
+# app/storage/local.py
+"""
+Content-addressed blob store on the local filesystem (BLOB_BACKEND=local).
+
+Layout under LOCAL_BLOB_ROOT:
+
+    objects/ab/cd/abcd1234...      bytes, named by sha256 of the content
+    refs/ef/01/ef01...             {"key", "sha256", "size", "content_type"},
+                                   named by sha256 of the logical key
+    tmp/                           in-flight writes (same filesystem, so rename is atomic)
+
+Two hex levels of fan-out (65536 leaf dirs) keep every directory small even
+with millions of blobs. Identical uploads share one object; delete() only
+drops the ref and gc() reclaims objects nothing points at any more. gc()
+runs on a background thread (start_gc(), called at app startup and by the
+first delete): every LOCAL_BLOB_GC_INTERVAL seconds, and LOCAL_BLOB_GC_DELAY
+seconds after a delete. Objects written or reused within the last
+LOCAL_BLOB_GC_GRACE seconds are left for a later sweep, so an upload racing
+the sweep keeps its object.
+
+Writes go to tmp/ and are renamed into place, so readers never see a partial
+file. Durability is LOCAL_BLOB_FSYNC:
+  batch  (default) group commit: a flusher thread fsyncs every file queued
+         within LOCAL_BLOB_FSYNC_WINDOW_MS, renames them, fsyncs each parent
+         dir once, then releases the writers
+  always fsync + rename inline in the writer
+  off    rename only (tests, scratch boxes)
+
+Objects are plain immutable files, so path() lets routers/blobs.py answer
+with FileResponse (sendfile / pathsend, Range support) instead of loading
+the bytes into Python.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .base import BlobStore, signed_local_url
+
+FSYNC_MODE = os.getenv("LOCAL_BLOB_FSYNC", "batch").lower().strip()
+FSYNC_WINDOW = float(os.getenv("LOCAL_BLOB_FSYNC_WINDOW_MS", "2")) / 1000.0
+GC_INTERVAL = float(os.getenv("LOCAL_BLOB_GC_INTERVAL", "3600"))  # 0 = never sweep on its own
+GC_DELAY = float(os.getenv("LOCAL_BLOB_GC_DELAY", "30"))  # lets a burst of deletes share one sweep
+GC_GRACE = int(os.getenv("LOCAL_BLOB_GC_GRACE", "3600"))
+_CHUNK = 1024 * 1024
+
+log = logging.getLogger("uvicorn.error")
+
+
+def _fanout(hexdigest: str) -> str:
+    return os.path.join(hexdigest[:2], hexdigest[2:4], hexdigest)
+
+
+def _fsync_path(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _GroupCommit:
+    """Batches fsync + rename of (tmp, final) pairs across concurrent writers."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[List[Tuple[str, str]], threading.Event, list]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def commit(self, moves: List[Tuple[str, str]]) -> None:
+        done, err = threading.Event(), []
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="blob-fsync", daemon=True)
+                self._thread.start()
+            self._pending.append((moves, done, err))
+            self._cond.notify()
+        done.wait()
+        if err:
+            raise err[0]
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            time.sleep(FSYNC_WINDOW)  # let concurrent writers join this batch
+            with self._cond:
+                batch, self._pending = self._pending, []
+            dirs = set()
+            for moves, done, err in batch:
+                try:
+                    for tmp, final in moves:
+                        _fsync_path(tmp)
+                    for tmp, final in moves:  # in order: object before its ref
+                        os.replace(tmp, final)
+                        dirs.add(os.path.dirname(final))
+                except Exception as e:
+                    err.append(e)
+            for d in dirs:
+                try:
+                    _fsync_path(d)
+                except OSError:
+                    pass
+            for _, done, _ in batch:
+                done.set()
+
+
+class LocalBlobStore(BlobStore):
+    local = True
+
+    def __init__(
+        self,
+        root: str,
+        fsync: str = FSYNC_MODE,
+        gc_interval: float = GC_INTERVAL,
+        gc_delay: float = GC_DELAY,
+        gc_grace: int = GC_GRACE,
+    ):
+        self.root = os.path.abspath(root)
+        self.fsync = fsync
+        self.gc_interval, self.gc_delay, self.gc_grace = gc_interval, gc_delay, gc_grace
+        self._gc_wake = threading.Event()
+        self._gc_lock = threading.Lock()
+        self._gc_thread: Optional[threading.Thread] = None
+        self._objects = os.path.join(self.root, "objects")
+        self._refs = os.path.join(self.root, "refs")
+        self._tmp = os.path.join(self.root, "tmp")
+        for d in (self._objects, self._refs, self._tmp):
+            os.makedirs(d, exist_ok=True)
+        self._committer = _GroupCommit() if fsync == "batch" else None
+
+    # ---- paths ----
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, _fanout(digest))
+
+    def _ref_path(self, key: str) -> str:
+        return os.path.join(self._refs, _fanout(hashlib.sha256(key.encode()).hexdigest()))
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self._tmp, uuid.uuid4().hex)
+
+    def _commit(self, moves: List[Tuple[str, str]]) -> None:
+        for _, final in moves:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+        if self._committer is not None:
+            self._committer.commit(moves)
+            return
+        for tmp, final in moves:
+            if self.fsync == "always":
+                _fsync_path(tmp)
+            os.replace(tmp, final)
+        if self.fsync == "always":
+            for d in {os.path.dirname(f) for _, f in moves}:
+                _fsync_path(d)
+
+    @staticmethod
+    def _reuse(obj: str) -> bool:
+        """True if the object already exists; bumps its mtime so gc()'s grace period covers the new ref."""
+        try:
+            os.utime(obj)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write_ref(self, key: str, digest: str, size: int, content_type: str, moves: List[Tuple[str, str]]) -> None:
+        tmp = self._tmp_path()
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "sha256": digest, "size": size, "content_type": content_type}, f)
+        moves.append((tmp, self._ref_path(key)))
+
+    def _read_ref(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._ref_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # ---- BlobStore ----
+    def put(self, key: str, body: bytes, content_type: str = "application/octet-stream") -> None:
+        digest = hashlib.sha256(body).hexdigest()
+        moves: List[Tuple[str, str]] = []
+        obj = self._object_path(digest)
+        if not self._reuse(obj):
+            tmp = self._tmp_path()
+            with open(tmp, "wb") as f:
+                f.write(body)
+            moves.append((tmp, obj))
+        self._write_ref(key, digest, len(body), content_type, moves)
+        self._commit(moves)
+
+    def upload_file(self, path: str, key: str, content_type: str = "application/octet-stream") -> None:
+        # hash while streaming, then let copyfile use copy_file_range/sendfile for the bytes
+        h, size = hashlib.sha256(), 0
+        with open(path, "rb") as f:
+            while chunk := f.read(_CHUNK):
+                h.update(chunk)
+                size += len(chunk)
+        digest = h.hexdigest()
+        moves: List[Tuple[str, str]] = []
+        obj = self._object_path(digest)
+        if not self._reuse(obj):
+            tmp = self._tmp_path()
+            shutil.copyfile(path, tmp)
+            moves.append((tmp, obj))
+        self._write_ref(key, digest, size, content_type, moves)
+        self._commit(moves)
+
+    def stat(self, key: str) -> Optional[Dict]:
+        """Ref metadata (sha256, size, content_type) without touching the bytes."""
+        ref = self._read_ref(key)
+        if ref and os.path.exists(self._object_path(ref["sha256"])):
+            return ref
+        return None
+
+    def path(self, key: str) -> Optional[Tuple[str, str]]:
+        ref = self.stat(key)
+        return (self._object_path(ref["sha256"]), ref["content_type"]) if ref else None
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        found = self.path(key)
+        if not found:
+            return None
+        with open(found[0], "rb") as f:
+            return f.read(), found[1]
+
+    def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._ref_path(key))
+        except FileNotFoundError:
+            return
+        self.start_gc()
+        self._gc_wake.set()
+
+    def start_gc(self) -> None:
+        """Sweep now, then every gc_interval seconds and gc_delay seconds after a delete."""
+        if self.gc_interval <= 0:
+            return
+        with self._gc_lock:
+            if self._gc_thread is None:
+                self._gc_thread = threading.Thread(target=self._gc_loop, name="blob-gc", daemon=True)
+                self._gc_thread.start()
+
+    def _gc_loop(self) -> None:
+        while True:
+            try:
+                removed = self.gc(self.gc_grace)
+                if removed:
+                    log.info("blob gc removed %d unreferenced objects", removed)
+            except Exception as e:
+                log.warning("blob gc failed: %s", e)
+            if self._gc_wake.wait(self.gc_interval):
+                time.sleep(self.gc_delay)
+                self._gc_wake.clear()  # deletes up to here ride along with this sweep
+
+    def gc(self, grace_seconds: int = 3600) -> int:
+        """Remove objects no ref points at (older than `grace_seconds`); returns the count."""
+        live = set()
+        for dirpath, _, files in os.walk(self._refs):
+            for name in files:
+                try:
+                    with open(os.path.join(dirpath, name)) as f:
+                        live.add(json.load(f)["sha256"])
+                except (OSError, ValueError, KeyError):
+                    continue
+        cutoff, removed = time.time() - grace_seconds, 0
+        for dirpath, _, files in os.walk(self._objects):
+            for name in files:
+                p = os.path.join(dirpath, name)
+                try:
+                    if name not in live and os.stat(p).st_mtime < cutoff:
+                        os.unlink(p)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        for name in os.listdir(self._tmp):  # writers that died mid-upload
+            p = os.path.join(self._tmp, name)
+            try:
+                if os.stat(p).st_mtime < cutoff:
+                    os.unlink(p)
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        for k in keys:
+            self.delete(k)
+
+    def url(self, key: str, expires: int = 3600, download_name: Optional[str] = None) -> str:
+        return signed_local_url("GET", key, expires, download_name)
+
+    def upload_url(self, key: str, content_type: str, expires: int = 900) -> str:
+        return signed_local_url("PUT", key, expires)
@@ -0,0 +1,293 @@
+# app/storage/memory.py
+"""
+Pure in-memory storage (STORAGE_BACKEND=memory) for dev and benchmarking.
+
+Keeps real indexes instead of scanning:
+* albums: owner -> sorted [(created_at, album_id)], (owner, title) -> album_id
+* photos: album_id -> sorted [(uploaded_at, photo_id)]  (the album_id-index GSI)
+* users:  email -> user_id
+* tokens: user_id -> tokens, and a min-heap on expires_at so expired tokens
+          are swept a few at a time on writes instead of living forever
+Blobs are bytes in a dict, served by routers/blobs.py through signed urls.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .base import (
+    AlbumStore, BlobStore, Fields, PhotoStore, TokenStore, UserStore, project, signed_local_url, with_keys,
+)
+
+
+class MemoryUserStore(UserStore):
+    def __init__(self):
+        self.items: Dict[str, Dict] = {}
+        self._by_email: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def get(self, user_id: str, fields: Fields = None) -> Optional[Dict]:
+        item = self.items.get(user_id)
+        return project(dict(item), fields) if item else None
+
+    def put(self, item: Dict) -> None:
+        item = dict(item)
+        with self._lock:
+            old = self.items.get(item["user_id"])
+            if old and self._by_email.get(old.get("email")) == old["user_id"]:
+                self._by_email.pop(old.get("email"), None)
+            self.items[item["user_id"]] = item
+            self._by_email.setdefault(item.get("email"), item["user_id"])
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            old = self.items.pop(user_id, None)
+            if old and self._by_email.get(old.get("email")) == user_id:
+                self._by_email.pop(old.get("email"), None)
+
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        uid = self._by_email.get(email)
+        return self.get(uid) if uid else None
+
+    def update(self, user_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        with self._lock:
+            item = dict(self.items.get(user_id) or {"user_id": user_id})
+            item.update(values)
+            for k in remove:
+                item.pop(k, None)
+            self.put(item)
+
+    def incr(self, user_id: str, attr: str, by: int = 1) -> Optional[int]:
+        with self._lock:
+            item = self.items.get(user_id)
+            if item is None:
+                return None
+            item[attr] = int(item.get(attr, 0)) + by
+            return item[attr]
+
+
+class MemoryTokenStore(TokenStore):
+    SWEEP_BATCH = 64  # expired tokens removed per write, at most
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.items: Dict[str, Dict] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        # (expires_at, token); overwritten / deleted tokens leave stale entries
+        # that are skipped when popped and compacted away when they pile up
+        self._expiry: List[Tuple[float, str]] = []
+        self._clock = clock
+        self._lock = threading.RLock()
+
+    def get(self, token: str) -> Optional[Dict]:
+        item = self.items.get(token)
+        return dict(item) if item else None
+
+    def put(self, item: Dict) -> None:
+        with self._lock:
+            old = self.items.get(item["token"]) or {}
+            self._remove(item["token"])
+            self.items[item["token"]] = dict(item)
+            if item.get("user_id"):
+                self._by_user.setdefault(item["user_id"], set()).add(item["token"])
+            exp = item.get("expires_at")
+            if exp is not None and exp != old.get("expires_at"):  # same expiry: its heap entry still holds
+                heapq.heappush(self._expiry, (float(exp), item["token"]))
+            self.sweep(self.SWEEP_BATCH)
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._remove(token)
+
+    def _remove(self, token: str) -> None:
+        item = self.items.pop(token, None)
+        uid = (item or {}).get("user_id")
+        if uid and uid in self._by_user:
+            self._by_user[uid].discard(token)
+            if not self._by_user[uid]:
+                del self._by_user[uid]
+
+    def sweep(self, limit: Optional[int] = None) -> int:
+        """Drop up to `limit` expired tokens (all when None); returns how many went."""
+        now, removed = self._clock(), 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] < now and (limit is None or removed < limit):
+                exp, token = heapq.heappop(self._expiry)
+                item = self.items.get(token)
+                if item is not None and float(item.get("expires_at", -1)) == exp:
+                    self._remove(token)
+                    removed += 1
+            if len(self._expiry) > 2 * len(self.items) + self.SWEEP_BATCH:
+                self._expiry = list({
+                    (e, t) for e, t in self._expiry
+                    if t in self.items and float(self.items[t].get("expires_at", -1)) == e
+                })
+                heapq.heapify(self._expiry)
+        return removed
+
+    def list_by_user(self, user_id: str) -> List[Dict]:
+        with self._lock:
+            return [dict(self.items[t]) for t in self._by_user.get(user_id, ())]
+
+    def list_by_type(self, types: Iterable[str], expires_after: int = 0) -> List[Dict]:
+        wanted = set(types)
+        return [
+            dict(t) for t in list(self.items.values())
+            if t.get("type") in wanted and float(t.get("expires_at", 0)) >= expires_after
+        ]
+
+
+class MemoryAlbumStore(AlbumStore):
+    def __init__(self):
+        self._items: Dict[str, Dict] = {}
+        self._by_owner: Dict[str, List[Tuple]] = {}
+        self._titles: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _sort_key(item: Dict) -> Tuple:
+        return (item.get("created_at", 0), item["album_id"])
+
+    def _unindex(self, item: Dict) -> None:
+        lst = self._by_owner.get(item.get("owner"), [])
+        i = bisect.bisect_left(lst, self._sort_key(item))
+        if i < len(lst) and lst[i][1] == item["album_id"]:
+            lst.pop(i)
+        if self._titles.get((item.get("owner"), item.get("title"))) == item["album_id"]:
+            self._titles.pop((item.get("owner"), item.get("title")), None)
+
+    def get(self, album_id: str) -> Optional[Dict]:
+        item = self._items.get(album_id)
+        return dict(item) if item else None
+
+    def put(self, item: Dict) -> None:
+        item = dict(item)
+        with self._lock:
+            old = self._items.get(item["album_id"])
+            if old:
+                self._unindex(old)
+            self._items[item["album_id"]] = item
+            bisect.insort(self._by_owner.setdefault(item.get("owner"), []), self._sort_key(item))
+            self._titles[(item.get("owner"), item.get("title"))] = item["album_id"]
+
+    def delete(self, album_id: str) -> None:
+        with self._lock:
+            old = self._items.pop(album_id, None)
+            if old:
+                self._unindex(old)
+
+    def list_by_owner(self, owner: str, fields: Fields = None) -> List[Dict]:
+        with self._lock:
+            return [project(dict(self._items[aid]), fields) for _, aid in self._by_owner.get(owner, [])]
+
+    def title_exists(self, owner: str, title: str) -> bool:
+        return (owner, title) in self._titles
+
+    def incr(self, album_id: str, attr: str, by: int = 1) -> Optional[int]:
+        with self._lock:
+            item = self._items.get(album_id)
+            if item is None:
+                return None
+            item[attr] = int(item.get(attr, 0)) + by
+            return item[attr]
+
+    def update(self, album_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        with self._lock:
+            item = self._items.get(album_id)
+            if item is None:
+                return
+            item = dict(item)
+            item.update(values)
+            for k in remove:
+                item.pop(k, None)
+            self.put(item)
+
+    def get_many(self, album_ids: Iterable[str]) -> Dict[str, Dict]:
+        items = self._items
+        return {aid: dict(items[aid]) for aid in album_ids if aid in items}
+
+
+class MemoryPhotoStore(PhotoStore):
+    def __init__(self):
+        self._items: Dict[str, Dict] = {}
+        self._by_album: Dict[str, List[Tuple]] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _sort_key(item: Dict) -> Tuple:
+        return (item.get("uploaded_at", 0), item["photo_id"])
+
+    def _unindex(self, item: Dict) -> None:
+        lst = self._by_album.get(item.get("album_id"), [])
+        i = bisect.bisect_left(lst, self._sort_key(item))
+        if i < len(lst) and lst[i][1] == item["photo_id"]:
+            lst.pop(i)
+        if not lst:
+            self._by_album.pop(item.get("album_id"), None)
+
+    def get(self, photo_id: str) -> Optional[Dict]:
+        item = self._items.get(photo_id)
+        return dict(item) if item else None
+
+    def put(self, item: Dict) -> None:
+        item = dict(item)
+        with self._lock:
+            old = self._items.get(item["photo_id"])
+            if old:
+                self._unindex(old)
+            self._items[item["photo_id"]] = item
+            bisect.insort(self._by_album.setdefault(item.get("album_id"), []), self._sort_key(item))
+
+    def delete(self, photo_id: str) -> None:
+        with self._lock:
+            old = self._items.pop(photo_id, None)
+            if old:
+                self._unindex(old)
+
+    def list_album(self, album_id: str, fields: Fields = None) -> List[Dict]:
+        with self._lock:
+            return [project(dict(self._items[pid]), fields) for _, pid in self._by_album.get(album_id, [])]
+
+    def latest(self, album_id: str) -> Optional[Dict]:
+        with self._lock:
+            lst = self._by_album.get(album_id)
+            return dict(self._items[lst[-1][1]]) if lst else None
+
+    def page(
+        self, album_id: str, limit: int, after: Optional[str] = None, fields: Fields = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        fields = with_keys(fields, "photo_id")
+        with self._lock:
+            lst = self._by_album.get(album_id, [])
+            start = 0
+            cur = self._items.get(after) if after else None
+            if cur is not None and cur.get("album_id") == album_id:
+                start = bisect.bisect_right(lst, self._sort_key(cur))
+            window = lst[start : start + limit]
+            page = [project(dict(self._items[pid]), fields) for _, pid in window]
+            more = (start + limit) < len(lst)
+        return page, (page[-1]["photo_id"] if page and more else None)
+
+
+class MemoryBlobStore(BlobStore):
+    local = True
+
+    def __init__(self):
+        self._blobs: Dict[str, Tuple[bytes, str]] = {}
+
+    def put(self, key: str, body: bytes, content_type: str = "application/octet-stream") -> None:
+        self._blobs[key] = (bytes(body), content_type)
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        return self._blobs.get(key)
+
+    def delete(self, key: str) -> None:
+        self._blobs.pop(key, None)
+
+    def url(self, key: str, expires: int = 3600, download_name: Optional[str] = None) -> str:
+        return signed_local_url("GET", key, expires, download_name)
+
+    def upload_url(self, key: str, content_type: str, expires: int = 900) -> str:
+        return signed_local_url("PUT", key, expires)
@@ -0,0 +1,307 @@
+# app/storage/sqlite.py
+"""
+SQLite storage (STORAGE_BACKEND=sqlite) for single-box installs without DynamoDB.
+
+* WAL journal + synchronous=NORMAL: readers never block the writer and
+  commits don't fsync the main database file.
+* One connection per thread (threading.local), created on first use; the
+  sqlite3 module keeps a per-connection prepared-statement cache, and every
+  query here is a constant SQL string with ? parameters so they all hit it.
+* Items are stored whole as JSON next to the columns we look things up by,
+  so reads are indexed B-tree lookups: users(email), albums(owner,
+  created_at), albums(owner, title), photos(album_id, uploaded_at),
+  tokens(user_id), tokens(type).
+
+Blobs are not stored here; pair it with a local/S3 blob store.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .base import AlbumStore, Fields, PhotoStore, TokenStore, UserStore, project, with_keys
+
+
+def _db_path() -> str:
+    url = os.getenv("DATABASE_URL", "")
+    if url.startswith("sqlite:///"):
+        return url[len("sqlite:///"):]
+    return os.getenv("SQLITE_PATH", "cloudphoto.db")
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    email   TEXT,
+    data    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS tokens (
+    token      TEXT PRIMARY KEY,
+    type       TEXT,
+    user_id    TEXT,
+    expires_at INTEGER,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tokens_user ON tokens(user_id);
+CREATE INDEX IF NOT EXISTS tokens_type ON tokens(type);
+
+CREATE TABLE IF NOT EXISTS albums (
+    album_id   TEXT PRIMARY KEY,
+    owner      TEXT,
+    title      TEXT,
+    created_at INTEGER,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS albums_owner ON albums(owner, created_at);
+CREATE INDEX IF NOT EXISTS albums_owner_title ON albums(owner, title);
+
+CREATE TABLE IF NOT EXISTS photos (
+    photo_id    TEXT PRIMARY KEY,
+    album_id    TEXT,
+    uploaded_at INTEGER,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS photos_album ON photos(album_id, uploaded_at, photo_id);
+"""
+
+
+def _json_default(o: Any):
+    if isinstance(o, Decimal):
+        return int(o) if o == o.to_integral_value() else float(o)
+    raise TypeError(f"not JSON serializable: {type(o).__name__}")
+
+
+def _dump(item: Dict) -> str:
+    return json.dumps(item, default=_json_default, separators=(",", ":"))
+
+
+def _load(row: Optional[Tuple]) -> Optional[Dict]:
+    return json.loads(row[0]) if row else None
+
+
+def _incr(db: "SQLiteDB", table: str, key_col: str, key: str, attr: str, by: int) -> Optional[int]:
+    # one statement, so concurrent bumps can't lose an update
+    path = "$." + attr
+    row = db.one(
+        f"UPDATE {table} SET data = json_set(data, ?, coalesce(json_extract(data, ?), 0) + ?) "
+        f"WHERE {key_col} = ? RETURNING json_extract(data, ?)",
+        (path, path, by, key, path),
+    )
+    return int(row[0]) if row else None
+
+
+class SQLiteDB:
+    """Per-thread connection pool over one database file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def conn(self) -> sqlite3.Connection:
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(
+                self.path,
+                timeout=5.0,
+                isolation_level=None,      # autocommit; explicit BEGIN for multi-statement writes
+                check_same_thread=True,    # each thread gets its own connection anyway
+                cached_statements=256,
+            )
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA busy_timeout=5000")
+            c.execute("PRAGMA temp_store=MEMORY")
+            if not self._ready:
+                with self._init_lock:
+                    if not self._ready:
+                        c.executescript(_SCHEMA)
+                        self._ready = True
+            self._local.conn = c
+        return c
+
+    def one(self, sql: str, args: Tuple = ()) -> Optional[Tuple]:
+        return self.conn().execute(sql, args).fetchone()
+
+    def all(self, sql: str, args: Tuple = ()) -> List[Tuple]:
+        return self.conn().execute(sql, args).fetchall()
+
+    def run(self, sql: str, args: Tuple = ()) -> None:
+        self.conn().execute(sql, args)
+
+
+class SQLiteUserStore(UserStore):
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def get(self, user_id: str, fields: Fields = None) -> Optional[Dict]:
+        return project(_load(self.db.one("SELECT data FROM users WHERE user_id = ?", (user_id,))), fields)
+
+    def put(self, item: Dict) -> None:
+        self.db.run(
+            "INSERT OR REPLACE INTO users (user_id, email, data) VALUES (?, ?, ?)",
+            (item["user_id"], item.get("email"), _dump(item)),
+        )
+
+    def delete(self, user_id: str) -> None:
+        self.db.run("DELETE FROM users WHERE user_id = ?", (user_id,))
+
+    def find_by_email(self, email: str) -> Optional[Dict]:
+        return _load(self.db.one("SELECT data FROM users WHERE email = ? LIMIT 1", (email,)))
+
+    def update(self, user_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        c = self.db.conn()
+        c.execute("BEGIN IMMEDIATE")  # read-modify-write without lost updates
+        try:
+            item = _load(c.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone())
+            item = item or {"user_id": user_id}
+            item.update(values)
+            for k in remove:
+                item.pop(k, None)
+            self.put(item)
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def incr(self, user_id: str, attr: str, by: int = 1) -> Optional[int]:
+        return _incr(self.db, "users", "user_id", user_id, attr, by)
+
+
+class SQLiteTokenStore(TokenStore):
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def get(self, token: str) -> Optional[Dict]:
+        return _load(self.db.one("SELECT data FROM tokens WHERE token = ?", (token,)))
+
+    def put(self, item: Dict) -> None:
+        self.db.run(
+            "INSERT OR REPLACE INTO tokens (token, type, user_id, expires_at, data) VALUES (?, ?, ?, ?, ?)",
+            (item["token"], item.get("type"), item.get("user_id"), int(item.get("expires_at", 0)), _dump(item)),
+        )
+
+    def delete(self, token: str) -> None:
+        self.db.run("DELETE FROM tokens WHERE token = ?", (token,))
+
+    def list_by_user(self, user_id: str) -> List[Dict]:
+        return [json.loads(r[0]) for r in self.db.all("SELECT data FROM tokens WHERE user_id = ?", (user_id,))]
+
+    def list_by_type(self, types: Iterable[str], expires_after: int = 0) -> List[Dict]:
+        out: List[Dict] = []
+        for t in types:
+            rows = self.db.all("SELECT data FROM tokens WHERE type = ? AND expires_at >= ?", (t, int(expires_after)))
+            out.extend(json.loads(r[0]) for r in rows)
+        return out
+
+
+class SQLiteAlbumStore(AlbumStore):
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def get(self, album_id: str) -> Optional[Dict]:
+        return _load(self.db.one("SELECT data FROM albums WHERE album_id = ?", (album_id,)))
+
+    def put(self, item: Dict) -> None:
+        self.db.run(
+            "INSERT OR REPLACE INTO albums (album_id, owner, title, created_at, data) VALUES (?, ?, ?, ?, ?)",
+            (item["album_id"], item.get("owner"), item.get("title"), int(item.get("created_at", 0)), _dump(item)),
+        )
+
+    def delete(self, album_id: str) -> None:
+        self.db.run("DELETE FROM albums WHERE album_id = ?", (album_id,))
+
+    def list_by_owner(self, owner: str, fields: Fields = None) -> List[Dict]:
+        rows = self.db.all(
+            "SELECT data FROM albums WHERE owner = ? ORDER BY created_at, album_id", (owner,)
+        )
+        return [project(json.loads(r[0]), fields) for r in rows]
+
+    def title_exists(self, owner: str, title: str) -> bool:
+        return self.db.one("SELECT 1 FROM albums WHERE owner = ? AND title = ? LIMIT 1", (owner, title)) is not None
+
+    def incr(self, album_id: str, attr: str, by: int = 1) -> Optional[int]:
+        return _incr(self.db, "albums", "album_id", album_id, attr, by)
+
+    def update(self, album_id: str, values: Dict[str, Any], remove: Iterable[str] = ()) -> None:
+        c = self.db.conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            item = _load(c.execute("SELECT data FROM albums WHERE album_id = ?", (album_id,)).fetchone())
+            if item is not None:
+                item.update(values)
+                for k in remove:
+                    item.pop(k, None)
+                self.put(item)  # keeps the owner/title/created_at columns in step
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def get_many(self, album_ids: Iterable[str]) -> Dict[str, Dict]:
+        ids = list(dict.fromkeys(album_ids))
+        out: Dict[str, Dict] = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            marks = ",".join("?" * len(chunk))
+            for (data,) in self.db.all(f"SELECT data FROM albums WHERE album_id IN ({marks})", tuple(chunk)):
+                item = json.loads(data)
+                out[item["album_id"]] = item
+        return out
+
+
+class SQLitePhotoStore(PhotoStore):
+    def __init__(self, db: SQLiteDB):
+        self.db = db
+
+    def get(self, photo_id: str) -> Optional[Dict]:
+        return _load(self.db.one("SELECT data FROM photos WHERE photo_id = ?", (photo_id,)))
+
+    def put(self, item: Dict) -> None:
+        self.db.run(
+            "INSERT OR REPLACE INTO photos (photo_id, album_id, uploaded_at, data) VALUES (?, ?, ?, ?)",
+            (item["photo_id"], item.get("album_id"), int(item.get("uploaded_at", 0)), _dump(item)),
+        )
+
+    def delete(self, photo_id: str) -> None:
+        self.db.run("DELETE FROM photos WHERE photo_id = ?", (photo_id,))
+
+    def list_album(self, album_id: str, fields: Fields = None) -> List[Dict]:
+        rows = self.db.all(
+            "SELECT data FROM photos WHERE album_id = ? ORDER BY uploaded_at, photo_id", (album_id,)
+        )
+        return [project(json.loads(r[0]), fields) for r in rows]
+
+    def latest(self, album_id: str) -> Optional[Dict]:
+        return _load(self.db.one(
+            "SELECT data FROM photos WHERE album_id = ? ORDER BY uploaded_at DESC, photo_id DESC LIMIT 1",
+            (album_id,),
+        ))
+
+    def page(
+        self, album_id: str, limit: int, after: Optional[str] = None, fields: Fields = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        # keyset pagination on (uploaded_at, photo_id): one index range read per page
+        cur = self.db.one(
+            "SELECT uploaded_at, photo_id FROM photos WHERE photo_id = ? AND album_id = ?", (after, album_id)
+        ) if after else None
+        if cur:
+            rows = self.db.all(
+                "SELECT data FROM photos WHERE album_id = ? AND (uploaded_at, photo_id) > (?, ?) "
+                "ORDER BY uploaded_at, photo_id LIMIT ?",
+                (album_id, cur[0], cur[1], limit + 1),
+            )
+        else:
+            rows = self.db.all(
+                "SELECT data FROM photos WHERE album_id = ? ORDER BY uploaded_at, photo_id LIMIT ?",
+                (album_id, limit + 1),
+            )
+        page = [project(json.loads(r[0]), with_keys(fields, "photo_id")) for r in rows[:limit]]
+        return page, (page[-1]["photo_id"] if page and len(rows) > limit else None)
@@ -0,0 +1,207 @@
+# app/tracing.py
+"""
+Request-scoped AWS call tracing.
+
+TracingMiddleware opens a trace per HTTP request (a ContextVar, so it follows
+the request into the worker thread of a sync endpoint). botocore hooks on the
+shared clients append every DynamoDB/S3 call to it with its duration and, for
+DynamoDB, the consumed capacity – ReturnConsumedCapacity=TOTAL is added to
+the request parameters while a trace is open. Presigned URLs are counted too
+(they never reach the network, so they have no duration).
+
+The summary goes out as a Server-Timing header, aggregated per operation:
+
+    Server-Timing: dynamodb.Query;dur=8.4;desc="x3 1.5cu", s3.presign;desc="x20", total;dur=41.2
+
+It names internal operations, so it is off by default: SERVER_TIMING=1 sends
+it on every response (dev), and with SERVER_TIMING_TOKEN set, only requests
+carrying "X-Server-Timing: <token>" get it.
+
+Requests slower than SLOW_REQUEST_MS are also logged as one JSON line with
+every call they made, in order.
+"""
+from __future__ import annotations
+
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger("uvicorn.error")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+SERVER_TIMING_TOKEN = os.getenv("SERVER_TIMING_TOKEN", "")
+
+# operations that accept ReturnConsumedCapacity
+_CAPACITY_OPS = {
+    "GetItem", "PutItem", "UpdateItem", "DeleteItem", "Query", "Scan",
+    "BatchGetItem", "BatchWriteItem", "TransactGetItems", "TransactWriteItems",
+}
+
+
+class Trace:
+    __slots__ = ("calls", "started", "_lock")
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, call: Dict[str, Any]) -> None:
+        call["at_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Calls aggregated per "service.Operation": count, total ms, capacity units."""
+        out: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            calls = list(self.calls)
+        for c in calls:
+            s = out.setdefault(c["op"], {"count": 0, "ms": 0.0, "cu": 0.0})
+            s["count"] += 1
+            s["ms"] += c.get("ms") or 0.0
+            s["cu"] += c.get("cu") or 0.0
+        return out
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = []
+        for op, s in self.summary().items():
+            desc = f"x{s['count']}"
+            if s["cu"]:
+                desc += f" {s['cu']:g}cu"
+            dur = f";dur={s['ms']:.1f}" if s["ms"] else ""
+            parts.append(f'{op}{dur};desc="{desc}"')
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("aws_trace", default=None)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+class TracingMiddleware:
+    """Pure ASGI: one Trace per HTTP request, Server-Timing header, slow-request log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace()
+        token = _current.set(trace)
+        status = [500]
+        timing = _wants_timing(scope)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if timing:
+                    total = (time.perf_counter() - trace.started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing(total).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _current.reset(token)
+            total = (time.perf_counter() - trace.started) * 1000
+            if total >= SLOW_REQUEST_MS:
+                _log_slow(scope, status[0], total, trace)
+
+
+def _wants_timing(scope) -> bool:
+    if SERVER_TIMING:
+        return True
+    if not SERVER_TIMING_TOKEN:
+        return False
+    want = SERVER_TIMING_TOKEN.encode("latin-1")
+    return any(k == b"x-server-timing" and hmac.compare_digest(v, want) for k, v in scope.get("headers", ()))
+
+
+def _log_slow(scope, status: int, total_ms: float, trace: Trace) -> None:
+    route = scope.get("route")
+    record = {
+        "event": "slow_request",
+        "method": scope.get("method"),
+        "path": scope.get("path"),
+        "route": getattr(route, "path", None),
+        "status": status,
+        "duration_ms": round(total_ms, 1),
+        "aws": {op: {k: round(v, 3) for k, v in s.items()} for op, s in trace.summary().items()},
+        "calls": trace.calls,
+    }
+    log.warning("slow request %s", json.dumps(record, default=str))
+
+
+# ---- botocore event hooks ----
+def _op(event_name: str) -> str:
+    parts = event_name.split(".")
+    return f"{parts[1]}.{parts[2]}" if len(parts) >= 3 else event_name
+
+
+def _before_parameter_build(event_name: str, params=None, model=None, context=None, **_):
+    trace = _current.get()
+    if trace is None or params is None:
+        return
+    service, _, op = _op(event_name).partition(".")
+    if (context or {}).get("is_presign_request"):
+        trace.add({"op": f"{service}.presign", "operation": op})
+    elif service == "dynamodb" and op in _CAPACITY_OPS:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _before_call(event_name: str, context: Optional[dict] = None, **_):
+    if context is not None and _current.get() is not None:
+        context["trace_t0"] = time.perf_counter()
+
+
+def _capacity(parsed: Optional[dict]) -> float:
+    cc = (parsed or {}).get("ConsumedCapacity")
+    if not cc:
+        return 0.0
+    if isinstance(cc, dict):
+        cc = [cc]
+    return float(sum(c.get("CapacityUnits", 0) or 0 for c in cc))
+
+
+def _finish(event_name: str, context: Optional[dict], **fields) -> None:
+    trace = _current.get()
+    t0 = (context or {}).get("trace_t0")
+    if trace is None or t0 is None:
+        return
+    trace.add({"op": _op(event_name), "ms": round((time.perf_counter() - t0) * 1000, 3), **fields})
+
+
+def _after_call(event_name: str, http_response=None, parsed=None, context: Optional[dict] = None, **_):
+    fields: Dict[str, Any] = {"status": getattr(http_response, "status_code", None)}
+    cu = _capacity(parsed)
+    if cu:
+        fields["cu"] = cu
+    _finish(event_name, context, **fields)
+
+
+def _after_call_error(event_name: str, exception=None, context: Optional[dict] = None, **_):
+    _finish(event_name, context, error=type(exception).__name__ if exception else "unknown")
+
+
+def instrument_botocore(*clients) -> None:
+    """Attach the tracing hooks to boto3 clients (idempotent: hooks have unique ids)."""
+    for client in clients:
+        events = client.meta.events
+        events.register("before-parameter-build", _before_parameter_build, unique_id="trace-before-param-build")
+        events.register("before-call", _before_call, unique_id="trace-before-call")
+        events.register("after-call", _after_call, unique_id="trace-after-call")
+        events.register("after-call-error", _after_call_error, unique_id="trace-after-call-error")
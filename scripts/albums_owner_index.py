@@ -0,0 +1,35 @@
+# scripts/albums_owner_index.py
+# One-off setup for the Albums table; safe to re-run.
+#  * GSI `owner-index`: GET /albums/, /stats and the duplicate-title check on
+#    create / rename list a user's albums with a Query instead of scanning
+#    every album of every user
+import os
+import boto3
+
+REGION = os.getenv("REGION", "us-east-1")
+TABLE = os.getenv("DYNAMO_ALBUMS", "Albums")
+OWNER_INDEX = os.getenv("ALBUMS_OWNER_INDEX", "owner-index")
+
+client = boto3.client("dynamodb", region_name=REGION)
+
+table = client.describe_table(TableName=TABLE)["Table"]
+existing = {i["IndexName"]: i.get("IndexStatus") for i in table.get("GlobalSecondaryIndexes", [])}
+if OWNER_INDEX in existing:
+    print(f"{OWNER_INDEX} already exists ({existing[OWNER_INDEX]})")
+elif any(status != "ACTIVE" for status in existing.values()):
+    # DynamoDB builds one GSI at a time
+    print(f"another index is still being built; re-run this script to create {OWNER_INDEX}")
+else:
+    gsi = {
+        "IndexName": OWNER_INDEX,
+        "KeySchema": [{"AttributeName": "owner", "KeyType": "HASH"}],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+    if table.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        gsi["ProvisionedThroughput"] = {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1}
+    client.update_table(
+        TableName=TABLE,
+        AttributeDefinitions=[{"AttributeName": "owner", "AttributeType": "S"}],
+        GlobalSecondaryIndexUpdates=[{"Create": gsi}],
+    )
+    print(f"creating {OWNER_INDEX}; the app picks it up once it is ACTIVE (until then it falls back to a scan)")
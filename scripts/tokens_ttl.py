@@ -0,0 +1,56 @@
+# scripts/tokens_ttl.py
+# One-off setup for the Tokens table; safe to re-run.
+#  * TTL on `expires_at`: DynamoDB deletes expired one-time tokens and
+#    revocation records itself (usually within a day or two of expiry)
+#  * GSI `user_id-index`: DELETE /users/me finds a user's tokens with a Query
+#    instead of scanning the whole table
+#  * GSI `type-index` (type, expires_at): the revocation sync every worker
+#    runs reads live revocation records with a Query instead of a scan
+import os
+import boto3
+
+REGION = os.getenv("REGION", "us-east-1")
+TABLE = os.getenv("DYNAMO_TOKENS", "Tokens")
+USER_INDEX = os.getenv("TOKENS_USER_INDEX", "user_id-index")
+TYPE_INDEX = os.getenv("TOKENS_TYPE_INDEX", "type-index")
+
+client = boto3.client("dynamodb", region_name=REGION)
+
+ttl = client.describe_time_to_live(TableName=TABLE)["TimeToLiveDescription"]
+if ttl.get("TimeToLiveStatus") in ("ENABLED", "ENABLING"):
+    print(f"TTL already {ttl['TimeToLiveStatus'].lower()} on {ttl.get('AttributeName')}")
+else:
+    client.update_time_to_live(
+        TableName=TABLE,
+        TimeToLiveSpecification={"Enabled": True, "AttributeName": "expires_at"},
+    )
+    print("TTL enabled on expires_at")
+
+indexes = {
+    USER_INDEX: (
+        [{"AttributeName": "user_id", "KeyType": "HASH"}],
+        [{"AttributeName": "user_id", "AttributeType": "S"}],
+    ),
+    TYPE_INDEX: (
+        [{"AttributeName": "type", "KeyType": "HASH"}, {"AttributeName": "expires_at", "KeyType": "RANGE"}],
+        [{"AttributeName": "type", "AttributeType": "S"}, {"AttributeName": "expires_at", "AttributeType": "N"}],
+    ),
+}
+for name, (key_schema, attributes) in indexes.items():
+    # DynamoDB takes one GSI creation per UpdateTable: re-run once the first is ACTIVE
+    table = client.describe_table(TableName=TABLE)["Table"]
+    existing = {i["IndexName"]: i.get("IndexStatus") for i in table.get("GlobalSecondaryIndexes", [])}
+    if name in existing:
+        print(f"{name} already exists ({existing[name]})")
+        continue
+    if any(status != "ACTIVE" for status in existing.values()):
+        print(f"another index is still being built; re-run this script to create {name}")
+        break
+    gsi = {"IndexName": name, "KeySchema": key_schema, "Projection": {"ProjectionType": "ALL"}}
+    if table.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        gsi["ProvisionedThroughput"] = {"ReadCapacityUnits": 1, "WriteCapacityUnits": 1}
+    client.update_table(
+        TableName=TABLE, AttributeDefinitions=attributes, GlobalSecondaryIndexUpdates=[{"Create": gsi}]
+    )
+    print(f"creating {name}; the app picks it up once it is ACTIVE (until then it falls back to a scan)")
+    break
@@ -0,0 +1,68 @@
+"""
+Cold-start benchmark: process start → first 200 from /healthz.
+
+    python -m tests.bench.coldstart            # 5 runs of `uvicorn app.main:app`
+    WARMUP=1 python -m tests.bench.coldstart 3 # include the lifespan warm-up
+
+Each run starts a fresh uvicorn on a free port, polls /healthz until it
+answers, then asks /healthz?timing=1 for the server's own breakdown
+(interpreter / import / lifespan / warm-up; see app/startup.py).
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_once(timeout: float = 60.0) -> dict:
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if time.perf_counter() - t0 > timeout:
+                raise TimeoutError("no /healthz response")
+            if proc.poll() is not None:
+                raise RuntimeError(f"server exited with {proc.returncode}")
+            try:
+                with urllib.request.urlopen(base + "/healthz", timeout=1) as r:
+                    if r.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.005)
+        wall_ms = (time.perf_counter() - t0) * 1000
+        with urllib.request.urlopen(base + "/healthz?timing=1", timeout=5) as r:
+            server = json.load(r).get("startup_ms", {})
+        return {"first_healthz_ms": round(wall_ms, 1), "server": server}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main(runs: int = 5) -> None:
+    results = [run_once() for _ in range(runs)]
+    for r in results:
+        print(json.dumps(r))
+    walls = [r["first_healthz_ms"] for r in results]
+    print(f"cold start to first /healthz (WARMUP={os.getenv('WARMUP', '0')}): "
+          f"median {statistics.median(walls):.0f} ms, min {min(walls):.0f}, max {max(walls):.0f} over {runs} runs")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
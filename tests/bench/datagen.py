@@ -0,0 +1,92 @@
+"""
+Synthetic dataset generator for the scaling benchmarks.
+
+grow(store, n) tops the store up to n users, n albums and n photos. Albums
+belong to random users and photos to random albums, so every table is "big"
+while any single user stays small. Sizes are cumulative: growing 10³ → 10⁴
+writes only the extra 9000 rows of each kind.
+
+Writes take the cheapest path the backend offers: DynamoDB batch_writer
+(25 items per BatchWriteItem), one SQLite transaction per chunk, and plain
+dict puts for the memory backend.
+"""
+from __future__ import annotations
+
+import contextlib
+import random
+import time
+import uuid
+from typing import Dict, Iterator, List
+
+_CHUNK = 5000
+
+
+@contextlib.contextmanager
+def _bulk(part) -> Iterator:
+    """Yield a put(item) function writing through the fastest path of one store part."""
+    table = getattr(part, "table", None)
+    db = getattr(part, "db", None)
+    if table is not None:  # DynamoDB
+        with table.batch_writer() as bw:
+            yield lambda item: bw.put_item(Item=item)
+    elif db is not None:  # SQLite: one transaction instead of a commit per row
+        conn = db.conn()
+        conn.execute("BEGIN")
+        try:
+            yield part.put
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    else:
+        yield part.put
+
+
+class Dataset:
+    def __init__(self, seed: int = 1234):
+        self.rng = random.Random(seed)
+        self.user_ids: List[str] = []
+        self.album_ids: List[str] = []
+        self.photos = 0
+        self.now = int(time.time())
+
+    @property
+    def size(self) -> int:
+        return self.photos
+
+    def grow(self, store, n: int) -> Dict[str, float]:
+        """Load rows until every table holds (at least) n synthetic rows; returns seconds per table."""
+        timings: Dict[str, float] = {}
+
+        t0 = time.perf_counter()
+        while len(self.user_ids) < n:
+            with _bulk(store.users) as put:
+                for _ in range(min(_CHUNK, n - len(self.user_ids))):
+                    uid = str(uuid.UUID(int=self.rng.getrandbits(128)))
+                    self.user_ids.append(uid)
+                    put({"user_id": uid, "email": f"{uid}@scale.example.com",
+                         "password_hash": "x", "email_verified": True})
+        timings["users"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        while len(self.album_ids) < n:
+            with _bulk(store.albums) as put:
+                for _ in range(min(_CHUNK, n - len(self.album_ids))):
+                    aid = str(uuid.UUID(int=self.rng.getrandbits(128)))
+                    self.album_ids.append(aid)
+                    put({"album_id": aid, "owner": self.rng.choice(self.user_ids),
+                         "title": f"album-{len(self.album_ids)}", "created_at": self.now})
+        timings["albums"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        while self.photos < n:
+            with _bulk(store.photos) as put:
+                for _ in range(min(_CHUNK, n - self.photos)):
+                    self.photos += 1
+                    pid = str(uuid.UUID(int=self.rng.getrandbits(128)))
+                    aid = self.rng.choice(self.album_ids)
+                    put({"photo_id": pid, "album_id": aid, "s3_key": f"photos/{aid}/{pid}-p.jpg",
+                         "uploader": "synthetic", "filename": "p.jpg", "width": 64, "height": 64,
+                         "taken_at": "", "uploaded_at": self.now + self.photos, "size": 2048})
+        timings["photos"] = time.perf_counter() - t0
+        return timings
@@ -0,0 +1,209 @@
+"""
+Endpoint benchmark harness (used by tests/bench/test_bench_endpoints.py).
+
+* drive()       – fires N requests at a fixed concurrency through httpx's ASGI
+                  transport (no sockets, same app object the tests use)
+* AwsCallCounter – counts botocore API calls by "service.Operation" via the
+                  clients' before-call event, so every result carries AWS
+                  calls per request next to the latency numbers; after-call
+                  also sums the items DynamoDB examined (ScannedCount)
+* save()/compare() – JSON baselines; compare flags p95 regressions beyond a
+                  tolerance and *any* increase in AWS calls per request
+
+Compare two runs from the command line:
+
+    python -m tests.bench.harness bench_results/base.json bench_results/new.json
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+RequestFn = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+class AwsCallCounter:
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.examined = 0
+        self._lock = threading.Lock()
+        self._emitters: List[Any] = []
+
+    def attach(self, *clients) -> "AwsCallCounter":
+        for c in clients:
+            ev = c.meta.events
+            ev.register("before-call", self._on_call)
+            ev.register("after-call.dynamodb", self._on_result)
+            self._emitters.append(ev)
+        return self
+
+    def detach(self) -> None:
+        for ev in self._emitters:
+            ev.unregister("before-call", self._on_call)
+            ev.unregister("after-call.dynamodb", self._on_result)
+        self._emitters = []
+
+    def _on_call(self, event_name: str, **_):
+        op = event_name.split(".", 1)[1]  # before-call.dynamodb.GetItem -> dynamodb.GetItem
+        with self._lock:
+            self.counts[op] += 1
+
+    def _on_result(self, parsed=None, **_):
+        parsed = parsed or {}
+        if "ScannedCount" in parsed:  # Query / Scan: items read, not items returned
+            n = int(parsed["ScannedCount"])
+        elif "Responses" in parsed:  # BatchGetItem
+            n = sum(len(v) for v in parsed["Responses"].values())
+        else:
+            n = 1 if "Item" in parsed else 0
+        with self._lock:
+            self.examined += n
+
+    def take(self) -> Counter:
+        with self._lock:
+            out, self.counts = self.counts, Counter()
+            out["_examined"] = self.examined
+            self.examined = 0
+        return out
+
+
+def percentile(sorted_vals: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_vals:
+        return 0.0
+    k = math.ceil(pct / 100.0 * len(sorted_vals)) - 1
+    return sorted_vals[max(0, min(len(sorted_vals) - 1, k))]
+
+
+async def _drive(
+    app, fn: RequestFn, requests: int, concurrency: int, warmup: int, counter: Optional[AwsCallCounter]
+) -> Dict[str, Any]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for i in range(warmup):
+            await fn(client, -1 - i)
+        if counter:
+            counter.take()  # warm-up calls don't count
+
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+        next_i = 0
+
+        async def worker():
+            nonlocal next_i
+            while next_i < requests:
+                i = next_i
+                next_i += 1
+                t0 = time.perf_counter()
+                r = await fn(client, i)
+                latencies.append(time.perf_counter() - t0)
+                statuses[r.status_code] += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return {"latencies": latencies, "statuses": statuses, "wall": wall}
+
+
+def drive(
+    name: str,
+    app,
+    fn: RequestFn,
+    *,
+    requests: int,
+    concurrency: int,
+    counter: Optional[AwsCallCounter] = None,
+    warmup: int = 5,
+) -> Dict[str, Any]:
+    """Run one endpoint benchmark and return its result record."""
+    run = asyncio.run(_drive(app, fn, requests, concurrency, warmup, counter))
+    calls = counter.take() if counter else Counter()
+    examined = calls.pop("_examined", 0)
+    lat = sorted(run["latencies"])
+    n = len(lat)
+    errors = sum(c for s, c in run["statuses"].items() if s >= 400)
+    return {
+        "name": name,
+        "requests": n,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(run["statuses"].items())},
+        "throughput_rps": round(n / run["wall"], 2) if run["wall"] else 0.0,
+        "mean_ms": round(sum(lat) / n * 1000, 3) if n else 0.0,
+        "p50_ms": round(percentile(lat, 50) * 1000, 3),
+        "p95_ms": round(percentile(lat, 95) * 1000, 3),
+        "p99_ms": round(percentile(lat, 99) * 1000, 3),
+        "aws_calls_per_request": round(sum(calls.values()) / n, 3) if n else 0.0,
+        "aws_calls_by_op": {op: round(c / n, 3) for op, c in sorted(calls.items())} if n else {},
+        "items_examined_per_request": round(examined / n, 3) if n else 0.0,
+    }
+
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def save(results: Dict[str, Dict[str, Any]], path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    doc = {
+        "meta": {
+            "git": _git_sha(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": int(time.time()),
+        },
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> Dict[str, Dict[str, Any]]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(base: Dict[str, Dict], new: Dict[str, Dict], tolerance: float = 0.20) -> List[str]:
+    """Human-readable table; lines starting with 'REGRESSION' are failures."""
+    lines = [f"{'endpoint':<22}{'p50 ms':>16}{'p95 ms':>18}{'rps':>16}{'aws/req':>14}"]
+    for name in sorted(set(base) | set(new)):
+        b, n = base.get(name), new.get(name)
+        if not b or not n:
+            lines.append(f"{name:<22} only in {'new' if n else 'base'}")
+            continue
+        lines.append(
+            f"{name:<22}{b['p50_ms']:>7.1f} →{n['p50_ms']:>7.1f}"
+            f"{b['p95_ms']:>8.1f} →{n['p95_ms']:>8.1f}"
+            f"{b['throughput_rps']:>7.0f} →{n['throughput_rps']:>7.0f}"
+            f"{b['aws_calls_per_request']:>6.1f} →{n['aws_calls_per_request']:>5.1f}"
+        )
+        if b["p95_ms"] and n["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            lines.append(f"REGRESSION {name}: p95 {b['p95_ms']:.1f} ms -> {n['p95_ms']:.1f} ms")
+        if n["aws_calls_per_request"] > b["aws_calls_per_request"] + 1e-9:
+            lines.append(
+                f"REGRESSION {name}: AWS calls/request "
+                f"{b['aws_calls_per_request']} -> {n['aws_calls_per_request']}"
+            )
+    return lines
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m tests.bench.harness BASE.json NEW.json [tolerance]")
+    out = compare(load(sys.argv[1]), load(sys.argv[2]), float(sys.argv[3]) if len(sys.argv) > 3 else 0.20)
+    print("\n".join(out))
+    sys.exit(1 if any(line.startswith("REGRESSION") for line in out) else 0)
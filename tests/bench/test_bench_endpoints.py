@@ -0,0 +1,146 @@
+"""
+Endpoint benchmarks – skipped unless BENCH=1.
+
+    BENCH=1 pytest -q tests/bench -s
+    BENCH=1 BENCH_BASELINE=bench_results/main.json pytest -q tests/bench -s
+
+Data is seeded into the moto tables/bucket from tests/conftest.py. Knobs:
+BENCH_REQUESTS (200), BENCH_CONCURRENCY (8), BENCH_ALBUMS (10),
+BENCH_PHOTOS (100 per album), BENCH_OUT (bench_results/<git sha>.json),
+BENCH_BASELINE (compare against it and fail on regressions),
+BENCH_TOLERANCE (0.20 = 20% p95 slack).
+"""
+import io
+import os
+import time
+import uuid
+
+import pytest
+from PIL import Image
+
+from app import auth, ratelimit
+from app.aws_config import dyna, s3
+from app.main import app
+from app.storage import store
+
+from tests.bench import harness
+
+pytestmark = pytest.mark.skipif(os.getenv("BENCH") != "1", reason="benchmarks run with BENCH=1")
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "200"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "8"))
+ALBUMS = int(os.getenv("BENCH_ALBUMS", "10"))
+PHOTOS = int(os.getenv("BENCH_PHOTOS", "100"))
+LOGIN_USERS = 8
+PASSWORD = "Bench123!"
+
+
+@pytest.fixture(scope="module")
+def seeded(aws_stubs):
+    pw_hash = auth.hash_pw(PASSWORD)
+    user_id = str(uuid.uuid4())
+    store.users.put({"user_id": user_id, "email": f"{user_id}@bench.example.com",
+                     "password_hash": pw_hash, "email_verified": True})
+    emails = []
+    for _ in range(LOGIN_USERS):
+        uid = str(uuid.uuid4())
+        emails.append(f"{uid}@bench.example.com")
+        store.users.put({"user_id": uid, "email": emails[-1], "password_hash": pw_hash, "email_verified": True})
+
+    album_ids, now = [], int(time.time())
+    for a in range(ALBUMS):
+        aid = str(uuid.uuid4())
+        album_ids.append(aid)
+        store.albums.put({"album_id": aid, "owner": user_id, "title": f"bench-{a}", "created_at": now + a})
+        for p in range(PHOTOS):
+            pid = str(uuid.uuid4())
+            store.photos.put({
+                "photo_id": pid, "album_id": aid, "s3_key": f"photos/{aid}/{pid}-p.jpg",
+                "uploader": user_id, "filename": "p.jpg", "width": 64, "height": 64,
+                "taken_at": "", "uploaded_at": now + p, "size": 2048,
+            })
+
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (10, 120, 200)).save(buf, format="JPEG")
+    return {
+        "headers": {"Authorization": f"Bearer {auth.create_token(user_id)}"},
+        "album_ids": album_ids,
+        "emails": emails,
+        "jpeg": buf.getvalue(),
+    }
+
+
+@pytest.fixture(scope="module")
+def report():
+    counter = harness.AwsCallCounter().attach(s3, dyna.meta.client)
+    results = {}
+    yield counter, results
+    counter.detach()
+    if not results:
+        return
+    out = os.getenv("BENCH_OUT") or f"bench_results/{harness._git_sha()}.json"
+    harness.save(results, out)
+    print(f"\nbenchmark results written to {out}")
+    base = os.getenv("BENCH_BASELINE")
+    if base:
+        lines = harness.compare(harness.load(base), results, float(os.getenv("BENCH_TOLERANCE", "0.20")))
+        print("\n".join(lines))
+        regressions = [line for line in lines if line.startswith("REGRESSION")]
+        assert not regressions, "\n".join(regressions)
+
+
+def _run(report, name, fn, requests=REQUESTS, concurrency=CONCURRENCY):
+    counter, results = report
+    r = harness.drive(name, app, fn, requests=requests, concurrency=concurrency, counter=counter)
+    results[name] = r
+    print(
+        f"\n{name:<14} {r['throughput_rps']:>8.1f} req/s  p50 {r['p50_ms']:.1f}  p95 {r['p95_ms']:.1f}"
+        f"  p99 {r['p99_ms']:.1f} ms  aws/req {r['aws_calls_per_request']}"
+    )
+    assert r["errors"] == 0, r["statuses"]
+    return r
+
+
+def test_bench_list_albums(seeded, report):
+    async def fn(client, i):
+        return await client.get("/albums/", headers=seeded["headers"])
+    _run(report, "list_albums", fn)
+
+
+def test_bench_list_photos(seeded, report):
+    albums = seeded["album_ids"]
+
+    async def fn(client, i):
+        params = {"album_id": albums[i % len(albums)], "limit": 50}
+        return await client.get("/photos/", params=params, headers=seeded["headers"])
+    _run(report, "list_photos", fn)
+
+
+def test_bench_stats(seeded, report):
+    async def fn(client, i):
+        return await client.get("/stats/", headers=seeded["headers"])
+    _run(report, "stats", fn)
+
+
+def test_bench_upload(seeded, report):
+    album = seeded["album_ids"][0]
+
+    async def fn(client, i):
+        files = {"file": (f"b{i}.jpg", seeded["jpeg"], "image/jpeg")}
+        return await client.post("/photos/upload", data={"album_id": album}, files=files,
+                                 headers=seeded["headers"])
+    _run(report, "upload", fn, requests=max(10, REQUESTS // 4))
+
+
+def test_bench_login(seeded, report, monkeypatch):
+    # measure the login path itself, not the throttle
+    monkeypatch.setattr(ratelimit, "LOGIN_IP_PER_MIN", 1e9)
+    monkeypatch.setattr(ratelimit, "LOGIN_IP_BURST", 1e9)
+    monkeypatch.setattr(ratelimit, "LOGIN_EMAIL_PER_MIN", 1e9)
+    monkeypatch.setattr(ratelimit, "LOGIN_EMAIL_BURST", 1e9)
+    emails = seeded["emails"]
+
+    async def fn(client, i):
+        return await client.post("/login", json={"email": emails[i % len(emails)], "password": PASSWORD})
+    # bcrypt dominates: fewer requests
+    _run(report, "login", fn, requests=max(8, REQUESTS // 10))
@@ -0,0 +1,97 @@
+"""
+Serialization / wire-size benchmark for a 1,000-photo list_photos page –
+skipped unless BENCH=1.
+
+    BENCH=1 pytest -q tests/bench/test_bench_payload.py -s
+
+Compares the default FastAPI path (jsonable_encoder + json.dumps, what a
+plain dict return went through) with FastJSONResponse (orjson, Decimal
+handled in the encoder), and reports bytes on the wire raw / gzip / br.
+Results go to bench_results/payload-<git sha>.json.
+"""
+import json
+import os
+import time
+import uuid
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app import compression
+from app.responses import FastJSONResponse
+
+from tests.bench import harness
+
+pytestmark = pytest.mark.skipif(os.getenv("BENCH") != "1", reason="benchmarks run with BENCH=1")
+
+PHOTOS = int(os.getenv("BENCH_PAYLOAD_PHOTOS", "1000"))
+ROUNDS = int(os.getenv("BENCH_PAYLOAD_ROUNDS", "20"))
+
+
+def _page(n: int) -> dict:
+    """A list_photos page as DynamoDB returns it (Decimal numbers) plus two presigned URLs per photo."""
+    aid = str(uuid.uuid4())
+    sig = "X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=AKIAEXAMPLE%2F20250101%2Fus-east-1%2Fs3%2Faws4_request"
+    items = []
+    for i in range(n):
+        pid = str(uuid.uuid4())
+        key = f"photos/{aid}/{pid}-IMG_{i:04d}.jpg"
+        url = (f"https://test-bucket.s3.amazonaws.com/{key}?{sig}&X-Amz-Date=20250101T000000Z"
+               f"&X-Amz-Expires=3600&X-Amz-SignedHeaders=host&X-Amz-Signature={uuid.uuid4().hex * 2}")
+        items.append({
+            "photo_id": pid, "album_id": aid, "s3_key": key, "uploader": str(uuid.uuid4()),
+            "filename": f"IMG_{i:04d}.jpg", "width": Decimal(4032), "height": Decimal(3024),
+            "taken_at": "2024-06-01T12:00:00+00:00", "uploaded_at": Decimal(1735689600 + i),
+            "size": Decimal(2_400_000 + i), "url": url,
+            "download_url": url + "&response-content-disposition=attachment%3B%20filename%3DIMG.jpg",
+        })
+    return {"items": items, "next_key": None}
+
+
+def _best_ms(fn) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return round(best * 1000, 3)
+
+
+def test_bench_payload_encode_and_wire_size():
+    page = _page(PHOTOS)
+
+    def default_path():
+        return json.dumps(jsonable_encoder(page), ensure_ascii=False, separators=(",", ":")).encode()
+
+    body = FastJSONResponse(page).body
+    assert json.loads(body) == json.loads(default_path())
+
+    out = {
+        "photos": PHOTOS,
+        "encode_ms": {
+            "jsonable_encoder+json": _best_ms(default_path),
+            "FastJSONResponse": _best_ms(lambda: FastJSONResponse(page)),
+        },
+        "bytes": {"raw": len(body)},
+        "compress_ms": {},
+    }
+    encodings = ["gzip"] + (["br"] if compression.brotli is not None else [])
+    for enc in encodings:
+        out["bytes"][enc] = len(compression.compress(body, enc))
+        out["compress_ms"][enc] = _best_ms(lambda: compression.compress(body, enc))
+
+    path = os.getenv("BENCH_PAYLOAD_OUT") or f"bench_results/payload-{harness._git_sha()}.json"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(out, f, indent=2)
+
+    print(f"\n{PHOTOS}-photo page:")
+    for name, ms in out["encode_ms"].items():
+        print(f"   encode  {name:<24} {ms:>8.2f} ms")
+    for enc, n in out["bytes"].items():
+        extra = f"  ({out['compress_ms'][enc]:.2f} ms)" if enc in out["compress_ms"] else ""
+        print(f"   bytes   {enc:<24} {n:>8}{extra}")
+
+    assert out["encode_ms"]["FastJSONResponse"] < out["encode_ms"]["jsonable_encoder+json"]
+    assert out["bytes"]["gzip"] < out["bytes"]["raw"] / 2
@@ -21,6 +21,10 @@ os.environ.setdefault("JWT_SECRET", "unit-test-secret")
 os.environ.setdefault("EMAIL_SENDER", "no-reply@test.local")
 os.environ.setdefault("PUBLIC_UI_URL", "http://localhost:5173")
 os.environ.setdefault("AUTO_VERIFY_USERS", "1")
+# tests count AWS calls per request; test_item_cache.py wraps the stores itself,
+# test_page_cache.py swaps in its own page cache
+os.environ.setdefault("ITEM_CACHE", "0")
+os.environ.setdefault("PAGE_CACHE_BYTES", "0")
 
 
 def pytest_configure():
@@ -79,9 +83,32 @@ def aws_stubs():
         dyna.create_table(
             TableName="Tokens",
             KeySchema=[{"AttributeName": "token", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "token", "AttributeType": "S"}],
+            AttributeDefinitions=[
+                {"AttributeName": "token", "AttributeType": "S"},
+                {"AttributeName": "user_id", "AttributeType": "S"},
+                {"AttributeName": "type", "AttributeType": "S"},
+                {"AttributeName": "expires_at", "AttributeType": "N"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "user_id-index",
+                    "KeySchema": [{"AttributeName": "user_id", "KeyType": "HASH"}],
+                    "Projection": {"ProjectionType": "ALL"},
+                },
+                {
+                    "IndexName": "type-index",
+                    "KeySchema": [
+                        {"AttributeName": "type", "KeyType": "HASH"},
+                        {"AttributeName": "expires_at", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                },
+            ],
             BillingMode="PAY_PER_REQUEST",
         )
+        dyna.meta.client.update_time_to_live(
+            TableName="Tokens", TimeToLiveSpecification={"Enabled": True, "AttributeName": "expires_at"}
+        )
 
         # S3 bucket
         s3 = boto3.client("s3", region_name="us-east-1")
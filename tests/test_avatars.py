@@ -0,0 +1,85 @@
+import io
+import uuid
+from urllib.parse import urlparse
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import avatars, ingest
+from app.auth import current_user
+from app.main import app
+from app.storage import store
+
+client = TestClient(app)
+
+
+def _jpeg(w: int, h: int, color=(200, 30, 30)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), color).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+def _put(body: bytes):
+    return client.put("/users/me/avatar", files={"file": ("me.jpg", body, "image/jpeg")})
+
+@pytest.fixture
+def user(monkeypatch):
+    uid = str(uuid.uuid4())
+    store.users.put({"user_id": uid, "email": f"{uid}@avatar.example.com", "avatar_key": f"avatars/{uid}.png"})
+    store.blobs.put(f"avatars/{uid}.png", b"legacy original", "image/png")
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    return uid
+
+def test_upload_stores_square_variants_under_stable_urls(user):
+    r = _put(_jpeg(1200, 800))
+    assert r.status_code == 200, r.text
+    urls = r.json()["avatar_urls"]
+    assert sorted(map(int, urls)) == list(avatars.AVATAR_SIZES)
+
+    me1, me2 = client.get("/users/me").json(), client.get("/users/me").json()
+    assert me1["avatar_url"] == me2["avatar_url"] == r.json()["avatar_url"] == urls[str(avatars.AVATAR_SIZES[-1])]
+    assert store.blobs.get(f"avatars/{user}.png") is None  # the old original is gone
+
+    for size, url in urls.items():
+        got = client.get(urlparse(url).path)
+        assert got.status_code == 200 and got.headers["cache-control"] == avatars.AVATAR_CACHE_CONTROL
+        assert got.headers["content-type"] == avatars.content_type()
+        assert Image.open(io.BytesIO(got.content)).size == (int(size), int(size))
+
+    path = urlparse(urls["64"]).path
+    etag = client.get(path).headers["etag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(path.replace("/64.", "/65.")).status_code == 404
+
+def test_same_picture_keeps_its_keys_new_picture_replaces_them(user):
+    first = _put(_jpeg(300, 300)).json()["avatar_url"]
+    assert _put(_jpeg(300, 300)).json()["avatar_url"] == first
+    second = _put(_jpeg(300, 300, color=(0, 0, 255))).json()["avatar_url"]
+    assert second != first
+    assert client.get(urlparse(first).path).status_code == 404
+    assert client.get(urlparse(second).path).status_code == 200
+
+    assert _put(b"not an image").status_code == 400
+    assert client.get("/users/me").json()["avatar_url"] == second
+
+def test_delete_me_removes_every_variant(user):
+    urls = _put(_jpeg(100, 100)).json()["avatar_urls"]
+    assert client.delete("/users/me").status_code == 204
+    assert all(client.get(urlparse(u).path).status_code == 404 for u in urls.values())
+
+def test_replacing_after_a_settings_change_deletes_the_recorded_variants(user, monkeypatch):
+    assert _put(_jpeg(100, 100)).status_code == 200
+    old_keys = store.users.get(user)["avatar_keys"]
+    assert len(old_keys) == len(avatars.AVATAR_SIZES)
+
+    monkeypatch.setattr(avatars, "AVATAR_SIZES", (32, 96))
+    new_urls = _put(_jpeg(100, 100)).json()["avatar_urls"]
+    assert sorted(new_urls) == ["32", "96"]
+    assert all(store.blobs.get(k) is None for k in old_keys)
+
+def test_avatar_uploads_go_through_admission(user, monkeypatch):
+    monkeypatch.setattr(ingest, "budget", ingest.Budget(max_uploads=0))  # every slot taken
+    monkeypatch.setattr(ingest, "UPLOAD_QUEUE_TIMEOUT", 0.05)
+    r = _put(_jpeg(100, 100))
+    assert r.status_code == 429 and r.headers["Retry-After"]
+    assert store.users.get(user).get("avatar_version") is None
@@ -0,0 +1,52 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.cors import CORSMiddleware
+from app.main import app
+
+client = TestClient(app)
+UI = "http://localhost:5173"
+
+
+def test_preflight_answered_with_max_age():
+    r = client.options("/albums/", headers={
+        "Origin": UI,
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "authorization, content-type",
+    })
+    assert r.status_code == 200
+    assert r.headers["access-control-allow-origin"] == UI
+    assert r.headers["access-control-allow-credentials"] == "true"
+    assert r.headers["access-control-allow-headers"] == "authorization, content-type"
+    assert int(r.headers["access-control-max-age"]) > 0
+    assert "POST" in r.headers["access-control-allow-methods"]
+
+def test_disallowed_origin_gets_no_cors_headers():
+    r = client.options("/albums/", headers={"Origin": "https://evil.example.com",
+                                            "Access-Control-Request-Method": "GET"})
+    assert r.status_code == 400
+    r = client.get("/healthz", headers={"Origin": "https://evil.example.com"})
+    assert r.status_code == 200 and "access-control-allow-origin" not in r.headers
+    assert "Origin" in r.headers["vary"]
+
+def test_preview_deployments_match_regex():
+    origin = "https://cloud-photo-share-git-feature-x.vercel.app"
+    r = client.get("/healthz", headers={"Origin": origin})
+    assert r.headers["access-control-allow-origin"] == origin
+    assert r.headers["access-control-expose-headers"] == "Content-Disposition"
+
+def test_headers_on_unhandled_500_and_decisions_memoized():
+    inner = FastAPI()
+
+    @inner.get("/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    mw = CORSMiddleware(inner, allow_origins=[UI], allow_origin_regex=r"https://.*\.vercel\.app")
+    c = TestClient(mw, raise_server_exceptions=False)
+    for _ in range(3):
+        r = c.get("/boom", headers={"Origin": UI})
+        assert r.status_code == 500 and r.text == "Internal Server Error"
+        assert r.headers["access-control-allow-origin"] == UI
+    info = mw.allowed.cache_info()
+    assert info.misses == 1 and info.hits == 2
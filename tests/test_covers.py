@@ -0,0 +1,119 @@
+import time
+import uuid
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+from app.auth import current_user
+from app.aws_config import dyna
+from app.main import app
+from app.storage import dynamo, memory, sqlite, store
+from app.storage.dynamo import DynamoAlbumStore
+
+from tests.bench.harness import AwsCallCounter
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def owner(monkeypatch):
+    uid = str(uuid.uuid4())
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    return uid
+
+def _upload(aid: str, name: str) -> dict:
+    return client.post("/photos/", json={"album_id": aid, "filename": name, "mime": "image/jpeg"}).json()
+
+def _covers(*ids: str) -> dict:
+    r = client.get("/albums/covers", params={"ids": ",".join(ids)})
+    assert r.status_code == 200, r.text
+    return r.json()["covers"]
+
+def test_batch_covers_one_batch_get_no_per_album_queries(owner):
+    with_photo = client.post("/albums/", json={"title": f"a-{uuid.uuid4()}"}).json()["album_id"]
+    empty = client.post("/albums/", json={"title": f"b-{uuid.uuid4()}"}).json()["album_id"]
+    key = _upload(with_photo, "one.jpg")["s3_key"]
+
+    legacy = str(uuid.uuid4())  # written before albums carried cover_key
+    store.albums.put({"album_id": legacy, "owner": owner, "title": legacy, "created_at": 1})
+    store.photos.put({"photo_id": str(uuid.uuid4()), "album_id": legacy,
+                      "s3_key": f"photos/{legacy}/x.jpg", "uploaded_at": 1})
+    foreign = str(uuid.uuid4())
+    store.albums.put({"album_id": foreign, "owner": "someone-else", "title": foreign, "created_at": 1,
+                      "cover_key": f"photos/{foreign}/secret.jpg"})
+
+    ids = [with_photo, empty, legacy, foreign, "no-such-album"]
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        covers = _covers(*ids)
+        first = counter.take()
+        again = _covers(*ids)
+        second = counter.take()
+    finally:
+        counter.detach()
+
+    assert list(covers) == ids
+    assert key in covers[with_photo] and f"photos/{legacy}/x.jpg" in covers[legacy]
+    assert covers[empty] is None and covers[foreign] is None and covers["no-such-album"] is None
+    assert first["dynamodb.BatchGetItem"] == 1 and first["dynamodb.Query"] == 1  # the legacy album only
+    assert second["dynamodb.Query"] == 0 and list(again) == ids  # its cover_key was stored
+
+def test_repeated_ids_param_and_batch_limit(owner):
+    aid = client.post("/albums/", json={"title": f"c-{uuid.uuid4()}"}).json()["album_id"]
+    r = client.get("/albums/covers", params=[("ids", aid), ("ids", aid)])
+    assert r.json() == {"covers": {aid: None}}
+    r = client.get("/albums/covers", params={"ids": ",".join(str(i) for i in range(101))})
+    assert r.status_code == 400
+
+def test_cover_follows_uploads_and_deletes(owner):
+    aid = client.post("/albums/", json={"title": f"d-{uuid.uuid4()}"}).json()["album_id"]
+    older = _upload(aid, "older.jpg")
+    time.sleep(1.01)  # uploaded_at has one-second resolution
+    newer = _upload(aid, "newer.jpg")
+    assert newer["s3_key"] in _covers(aid)[aid]
+
+    client.delete(f"/photos/{older['photo_id']}")  # not the cover: stays
+    assert newer["s3_key"] in _covers(aid)[aid]
+    client.put(f"/albums/{aid}", json={"title": f"renamed-{uuid.uuid4()}"})  # rename keeps it
+    album = next(a for a in client.get("/albums/").json()["items"] if a["album_id"] == aid)
+    assert newer["s3_key"] in album["cover_url"]
+
+    client.delete(f"/photos/{newer['photo_id']}")
+    assert _covers(aid)[aid] is None
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "dynamo"])
+def test_get_many_and_partial_update(backend, tmp_path):
+    if backend == "memory":
+        albums = memory.MemoryAlbumStore()
+    elif backend == "sqlite":
+        albums = sqlite.SQLiteAlbumStore(sqlite.SQLiteDB(str(tmp_path / "c.db")))
+    else:
+        albums = store.albums
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    for i, aid in enumerate(ids):
+        albums.put({"album_id": aid, "owner": "o", "title": f"t{i}", "created_at": i})
+    assert set(albums.get_many(ids + ["missing"])) == set(ids)
+
+    albums.update(ids[0], {"title": "new", "cover_key": "k"})
+    albums.update(ids[0], {}, remove=["cover_key"])
+    albums.update("missing", {"title": "x"})  # never creates
+    got = albums.get(ids[0])
+    assert got["title"] == "new" and "cover_key" not in got and got["owner"] == "o"
+    assert albums.get("missing") is None
+    if backend == "sqlite":
+        assert albums.title_exists("o", "new") and not albums.title_exists("o", "t0")
+
+def test_keys_left_unprocessed_fail_instead_of_reading_as_missing(owner, monkeypatch):
+    aid = client.post("/albums/", json={"title": f"e-{uuid.uuid4()}"}).json()["album_id"]
+    albums = DynamoAlbumStore(dyna)
+
+    def throttled(RequestItems):
+        return {"Responses": {}, "UnprocessedKeys": RequestItems}
+
+    monkeypatch.setattr(dyna, "batch_get_item", throttled)
+    monkeypatch.setattr(dynamo.time, "sleep", lambda _: None)
+    with pytest.raises(ClientError):
+        albums.get_many([aid])
+    monkeypatch.setattr(store, "albums", albums)
+    assert client.get("/albums/covers", params={"ids": aid}).status_code >= 500
@@ -0,0 +1,68 @@
+import runpy
+import uuid
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.aws_config import dyna
+from app.storage.dynamo import DynamoAlbumStore, DynamoTokenStore, DynamoUserStore
+
+
+def _throttle(*_, **__):
+    raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "Query")
+
+def test_album_owner_index_fallback_is_not_sticky(monkeypatch):
+    albums = DynamoAlbumStore(dyna)  # the test Albums table has no owner-index
+    owner = str(uuid.uuid4())
+    albums.put({"album_id": str(uuid.uuid4()), "owner": owner, "created_at": 1})
+    assert len(albums.list_by_owner(owner)) == 1  # scanned
+    assert albums._owner_index is None and albums._owner_index_retry > 0
+
+    albums._owner_index_retry = 0.0  # recheck is due: a throttle is raised, not taken for a missing index
+    monkeypatch.setattr(albums.table, "query", _throttle)
+    with pytest.raises(ClientError):
+        albums.list_by_owner(owner)
+    assert albums._owner_index is None and albums._owner_index_retry == 0.0
+
+def test_albums_owner_index_script_gives_list_by_owner_its_query(monkeypatch):
+    name = f"Albums-{uuid.uuid4().hex[:8]}"
+    dyna.create_table(
+        TableName=name,
+        KeySchema=[{"AttributeName": "album_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "album_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    monkeypatch.setenv("DYNAMO_ALBUMS", name)
+    runpy.run_path(str(Path(__file__).parent.parent / "scripts" / "albums_owner_index.py"))
+
+    monkeypatch.setattr(DynamoAlbumStore, "table_name", name)
+    albums = DynamoAlbumStore(dyna)
+    owner = str(uuid.uuid4())
+    albums.put({"album_id": str(uuid.uuid4()), "owner": owner, "created_at": 1})
+    monkeypatch.setattr(albums.table, "scan", _throttle)  # must not be needed
+    assert len(albums.list_by_owner(owner)) == 1 and albums._owner_index is True
+
+def test_user_email_index_fallback_is_not_sticky(monkeypatch):
+    users = DynamoUserStore(dyna)  # the test Users table has no email-index
+    uid = str(uuid.uuid4())
+    users.put({"user_id": uid, "email": f"{uid}@index.example.com"})
+    assert users.find_by_email(f"{uid}@index.example.com")["user_id"] == uid
+    assert users._email_index is None
+
+    users._email_index_retry = 0.0
+    monkeypatch.setattr(users.table, "query", _throttle)
+    with pytest.raises(ClientError):  # a login during a throttle fails, it doesn't turn into a scan
+        users.find_by_email(f"{uid}@index.example.com")
+    assert users._email_index_retry == 0.0
+
+def test_token_user_index_errors_propagate(monkeypatch):
+    tokens = DynamoTokenStore(dyna)
+    uid = str(uuid.uuid4())
+    tokens.put({"token": str(uuid.uuid4()), "type": "reset", "user_id": uid, "expires_at": 10})
+    assert len(tokens.list_by_user(uid)) == 1 and tokens._user_index is True
+
+    monkeypatch.setattr(tokens.table, "query", _throttle)
+    with pytest.raises(ClientError):
+        tokens.list_by_user(uid)
+    assert tokens._user_index is True  # still queried next time
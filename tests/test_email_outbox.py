@@ -0,0 +1,106 @@
+import threading
+from importlib import reload
+
+def _outbox(monkeypatch, **env):
+    monkeypatch.delenv("EMAIL_MODE", raising=False)
+    monkeypatch.setenv("RESEND_API_KEY", "re_test")
+    monkeypatch.setenv("EMAIL_BACKOFF_BASE", "0")
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    import app.emailer as emailer
+    return reload(emailer)
+
+def test_outbox_batches_and_retries(monkeypatch):
+    emailer = _outbox(monkeypatch, EMAIL_BATCH_WINDOW="0.3")
+    sent, fails = [], [1]
+
+    def fake_send(msgs):
+        if fails:
+            fails.pop()
+            raise RuntimeError("provider down")
+        sent.append([m["to"] for m in msgs])
+
+    monkeypatch.setattr(emailer, "_send_batch", fake_send)
+    for i in range(3):
+        assert emailer.enqueue_email(f"u{i}@example.com", "Hi", "<p>x</p>")["queued"]
+    assert emailer.flush_outbox(5)
+
+    assert sent == [["u0@example.com", "u1@example.com", "u2@example.com"]]
+    st = emailer.outbox_stats()
+    assert st["sent"] == 3 and st["retries"] == 1 and st["dead"] == 0
+
+def test_outbox_dead_letters_after_max_attempts(monkeypatch):
+    emailer = _outbox(monkeypatch, EMAIL_MAX_ATTEMPTS="2", EMAIL_BATCH_WINDOW="0")
+
+    def always_fail(msgs):
+        raise RuntimeError("bounced")
+
+    monkeypatch.setattr(emailer, "_send_batch", always_fail)
+    emailer.enqueue_email("lost@example.com", "Hi", "<p>x</p>")
+    assert emailer.flush_outbox(5)
+
+    st = emailer.outbox_stats()
+    assert st["dead"] == 1
+    assert st["dead_letters"][0]["to"] == "lost@example.com"
+    assert "bounced" in st["dead_letters"][0]["reason"]
+
+def test_failed_batch_waits_without_holding_up_later_mail(monkeypatch):
+    emailer = _outbox(monkeypatch, EMAIL_BATCH_WINDOW="0", EMAIL_BACKOFF_BASE="2")
+    sent, fails = [], [1]
+    reset_sent = threading.Event()
+
+    def fake_send(msgs):
+        if fails:
+            fails.pop()
+            raise RuntimeError("provider down")
+        sent.extend(m["to"] for m in msgs)
+        reset_sent.set()
+
+    monkeypatch.setattr(emailer, "_send_batch", fake_send)
+    emailer.enqueue_email("down@example.com", "Hi", "<p>x</p>")
+    assert not emailer.flush_outbox(0.2)  # its retry is at least a second out
+    emailer.enqueue_email("reset@example.com", "Reset", "<p>x</p>")
+    assert reset_sent.wait(0.5) and sent == ["reset@example.com"]
+
+    assert emailer.flush_outbox(5)
+    assert sent == ["reset@example.com", "down@example.com"]
+    assert emailer.outbox_stats()["retries"] == 1
+
+class _ProviderError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+def test_invalid_message_is_dead_lettered_alone(monkeypatch):
+    emailer = _outbox(monkeypatch, EMAIL_BATCH_WINDOW="0.3")
+    sent, calls = [], []
+
+    def fake_send(msgs):
+        calls.append(len(msgs))
+        if any(m["to"] == "not-an-address" for m in msgs):
+            raise _ProviderError(422, "invalid `to` field")
+        sent.extend(m["to"] for m in msgs)
+
+    monkeypatch.setattr(emailer, "_send_batch", fake_send)
+    for to in ("a@example.com", "not-an-address", "b@example.com"):
+        emailer.enqueue_email(to, "Hi", "<p>x</p>")
+    assert emailer.flush_outbox(5)
+
+    assert sorted(sent) == ["a@example.com", "b@example.com"] and calls == [3, 1, 1, 1]
+    st = emailer.outbox_stats()
+    assert st["dead"] == 1 and st["retries"] == 0
+    assert st["dead_letters"][0]["to"] == "not-an-address"
+
+def test_rate_limits_and_server_errors_are_retried(monkeypatch):
+    emailer = _outbox(monkeypatch, EMAIL_BATCH_WINDOW="0")
+    errors = [_ProviderError(429, "slow down"), _ProviderError("500", "oops")]
+
+    def fake_send(msgs):
+        if errors:
+            raise errors.pop(0)
+
+    monkeypatch.setattr(emailer, "_send_batch", fake_send)
+    emailer.enqueue_email("a@example.com", "Hi", "<p>x</p>")
+    assert emailer.flush_outbox(5)
+    st = emailer.outbox_stats()
+    assert st["sent"] == 1 and st["retries"] == 2 and st["dead"] == 0
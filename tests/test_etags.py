@@ -0,0 +1,90 @@
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.auth import current_user
+from app.aws_config import dyna
+from app.main import app
+from app.storage import memory, sqlite, store
+
+from tests.bench.harness import AwsCallCounter
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def owner(monkeypatch):
+    uid = str(uuid.uuid4())
+    store.users.put({"user_id": uid, "email": f"{uid}@etag.example.com", "email_verified": True})
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    return uid
+
+def _album(owner: str) -> str:
+    aid = str(uuid.uuid4())
+    store.albums.put({"album_id": aid, "owner": owner, "title": aid, "created_at": int(time.time())})
+    return aid
+
+def test_photo_listing_revalidates_without_photometa_query(owner):
+    aid = _album(owner)
+    client.post("/photos/", json={"album_id": aid, "filename": "a.jpg", "mime": "image/jpeg"})
+    first = client.get("/photos/", params={"album_id": aid})
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"') and first.headers["cache-control"] == "private, no-cache"
+
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        r = client.get("/photos/", params={"album_id": aid}, headers={"If-None-Match": etag})
+        calls = counter.take()
+    finally:
+        counter.detach()
+    assert r.status_code == 304 and r.headers["etag"] == etag and r.content == b""
+    assert calls["dynamodb.GetItem"] == 1 and calls["dynamodb.Query"] == 0
+
+    # other pages / page sizes get their own tags
+    assert client.get("/photos/", params={"album_id": aid, "limit": 10}).headers["etag"] != etag
+
+    client.post("/photos/", json={"album_id": aid, "filename": "b.jpg", "mime": "image/jpeg"})
+    r = client.get("/photos/", params={"album_id": aid}, headers={"If-None-Match": etag})
+    assert r.status_code == 200 and len(r.json()["items"]) == 2 and r.headers["etag"] != etag
+
+def test_album_listing_changes_on_every_write(owner):
+    etag = client.get("/albums/").headers["etag"]
+    assert client.get("/albums/", headers={"If-None-Match": etag}).status_code == 304
+
+    seen = {etag}
+    aid = client.post("/albums/", json={"title": f"t-{uuid.uuid4()}"}).json()["album_id"]
+    writes = [
+        lambda: client.put(f"/albums/{aid}", json={"title": f"t-{uuid.uuid4()}"}),
+        lambda: client.post("/photos/", json={"album_id": aid, "filename": "c.jpg"}),  # cover changes
+        lambda: client.delete(f"/albums/{aid}"),
+    ]
+    for write in [lambda: None] + writes:
+        write()
+        r = client.get("/albums/", headers={"If-None-Match": ", ".join(seen)})
+        assert r.status_code == 200, r.status_code
+        seen.add(r.headers["etag"])
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "dynamo"])
+def test_incr_is_atomic_and_never_creates_items(backend, tmp_path):
+    if backend == "memory":
+        albums = memory.MemoryAlbumStore()
+    elif backend == "sqlite":
+        albums = sqlite.SQLiteAlbumStore(sqlite.SQLiteDB(str(tmp_path / "v.db")))
+    else:
+        albums = store.albums
+    aid = str(uuid.uuid4())
+    assert albums.incr(aid, "version") is None and albums.get(aid) is None
+    albums.put({"album_id": aid, "owner": "o", "title": "t", "created_at": 1})
+    # moto applies UpdateItem as read-modify-write without a lock, so only the
+    # local backends are hammered from threads; DynamoDB's ADD is atomic server-side
+    workers = 4 if backend != "dynamo" else 1
+    threads = [threading.Thread(target=lambda: [albums.incr(aid, "version") for _ in range(40 // workers)])
+               for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert int(albums.get(aid)["version"]) == 40
@@ -0,0 +1,108 @@
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.auth import current_user
+from app.aws_config import dyna
+from app.main import app
+from app.storage import store
+
+client = TestClient(app)
+
+
+class ParamLog:
+    """Records the final API parameters of every DynamoDB call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __enter__(self):
+        dyna.meta.client.meta.events.register("before-parameter-build.dynamodb", self._on)
+        return self
+
+    def __exit__(self, *exc):
+        dyna.meta.client.meta.events.unregister("before-parameter-build.dynamodb", self._on)
+
+    def _on(self, params, event_name, **_):
+        self.calls.append((event_name.rsplit(".", 1)[1], dict(params)))
+
+    def projected(self, op):
+        return [
+            sorted(p["ExpressionAttributeNames"][n.strip()] for n in p["ProjectionExpression"].split(","))
+            for o, p in self.calls if o == op
+        ]
+
+
+@pytest.fixture
+def owner(monkeypatch):
+    uid = str(uuid.uuid4())
+    store.users.put({"user_id": uid, "email": f"{uid}@fields.example.com", "email_verified": True,
+                     "password_hash": "secret-hash", "display_name": "Fi"})
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    return uid
+
+def _album(owner: str, photos: int = 2) -> str:
+    aid = str(uuid.uuid4())
+    store.albums.put({"album_id": aid, "owner": owner, "title": aid, "created_at": int(time.time())})
+    for i in range(photos):
+        store.photos.put({"photo_id": str(uuid.uuid4()), "album_id": aid, "s3_key": f"photos/{aid}/{i}.jpg",
+                          "filename": f"{i}.jpg", "width": 10, "height": 10, "uploaded_at": i})
+    return aid
+
+def test_photo_fields_project_and_skip_presigns(owner, monkeypatch):
+    monkeypatch.setattr(tracing, "SERVER_TIMING", True)
+    aid = _album(owner)
+    with ParamLog() as log:
+        r = client.get("/photos/", params={"album_id": aid, "fields": "photo_id,url"})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [set(p) for p in items] == [{"photo_id", "url"}] * 2
+    assert log.projected("Query") == [["photo_id", "s3_key", "uploaded_at"]]
+    assert 'desc="x2"' in next(p for p in r.headers["server-timing"].split(", ") if p.startswith("s3.presign"))
+
+    full = client.get("/photos/", params={"album_id": aid}).json()["items"]
+    assert {"url", "download_url", "width", "album_id"} <= set(full[0])
+    assert client.get("/photos/", params={"album_id": aid, "fields": "nope"}).status_code == 400
+
+def test_album_fields_without_cover_skip_cover_resolution(owner):
+    _album(owner, photos=1)
+    with ParamLog() as log:
+        items = client.get("/albums/", params={"fields": "title"}).json()["items"]
+    assert items and all(set(a) == {"title"} for a in items)
+    reads = log.projected("Scan") + log.projected("Query")
+    assert reads and all(set(names) == {"created_at", "title"} for names in reads)
+    assert not any(op == "BatchGetItem" for op, _ in log.calls)
+
+def test_album_responses_carry_only_public_fields(owner):
+    aid = _album(owner, photos=1)
+    store.albums.update(aid, {"cover_key": f"photos/{aid}/0.jpg", "version": 3})
+    items = client.get("/albums/").json()["items"]
+    assert items and all(set(a) == {"album_id", "title", "owner", "created_at", "cover_url"} for a in items)
+    renamed = client.put(f"/albums/{aid}", json={"title": f"{aid}-renamed"}).json()
+    assert set(renamed) == {"album_id", "title", "owner", "created_at", "cover_url"}
+    assert renamed["title"] == f"{aid}-renamed"
+
+def test_get_me_never_reads_password_hash(owner):
+    with ParamLog() as log:
+        me = client.get("/users/me").json()
+    assert me["email"].startswith(owner) and me["display_name"] == "Fi"
+    (names,) = log.projected("GetItem")
+    assert "password_hash" not in names and "avatar_key" in names
+
+    with ParamLog() as log:
+        me = client.get("/users/me", params={"fields": "is_verified"}).json()
+    assert me == {"is_verified": True}
+    assert log.projected("GetItem") == [["email_verified", "is_verified", "user_id"]]
+
+def test_stats_reads_only_ids_and_sizes(owner):
+    aid = _album(owner, photos=1)
+    store.photos.put({"photo_id": str(uuid.uuid4()), "album_id": aid, "s3_key": f"photos/{aid}/big.jpg",
+                      "size": 2 * 1_048_576, "uploaded_at": 5})
+    with ParamLog() as log:
+        body = client.get("/stats/").json()
+    assert body["album_count"] == 1 and body["photo_count"] == 2 and body["storage_mb"] == 2.0
+    albums, photos = log.projected("Scan"), log.projected("Query")  # the test Albums table has no owner-index
+    assert albums == [["album_id", "created_at"]] and photos == [["size", "uploaded_at"]]
@@ -0,0 +1,117 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import ingest, metrics
+from app.auth import current_user
+from app.main import app
+from app.routers import blobs as blobs_router
+from app.storage import Store
+from app.storage.memory import MemoryAlbumStore, MemoryBlobStore, MemoryPhotoStore
+
+client = TestClient(app)
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\0" * 256  # enough to look like an image upload
+
+
+@pytest.fixture
+def owner(monkeypatch):
+    uid = str(uuid.uuid4())
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    return uid
+
+def _upload(aid: str, body: bytes = JPEG):
+    return client.post("/photos/upload", data={"album_id": aid}, files={"file": ("a.jpg", body, "image/jpeg")})
+
+def test_budget_queues_per_user_and_times_out():
+    async def scenario():
+        b = ingest.Budget(max_uploads=3, max_bytes=100, user_uploads=1, user_bytes=100)
+        await b.acquire("a", 10)
+        queued = asyncio.ensure_future(b.acquire("a", 10, timeout=5))  # a is at its cap
+        await asyncio.sleep(0)
+        await b.acquire("b", 10, timeout=0.01)  # ... which doesn't hold up b
+        assert not queued.done() and b.stats()["waiting"] == 1
+
+        b.release("a", 10)
+        await asyncio.wait_for(queued, 1)  # handed the slot in FIFO order
+
+        await b.acquire("c", 80, timeout=0.01)  # 100 bytes now reserved
+        with pytest.raises(asyncio.TimeoutError):
+            await b.acquire("d", 1, timeout=0.05)
+        st = b.stats()
+        assert (st["active"], st["spool_bytes"], st["waiting"]) == (3, 100, 0)
+        assert st["queued"] == 2 and st["rejected"] == 1 and st["admitted"] == 4
+
+    asyncio.run(scenario())
+
+def test_upload_within_budget_releases_its_reservation(owner):
+    aid = client.post("/albums/", json={"title": f"i-{uuid.uuid4()}"}).json()["album_id"]
+    r = _upload(aid)
+    assert r.status_code == 201, r.text
+    assert r.json()["mode"] == "multipart"
+    assert client.get("/photos/", params={"album_id": aid}).json()["items"][0]["photo_id"] == r.json()["photo_id"]
+
+    st = ingest.stats()
+    assert st["active"] == 0 and st["spool_bytes"] == 0
+    assert "upload_spool_bytes 0" in metrics.render()
+
+def test_photo_upload_reserves_both_spooled_copies(owner, monkeypatch):
+    aid = client.post("/albums/", json={"title": f"i-{uuid.uuid4()}"}).json()["album_id"]
+    charged = []
+    real_acquire = ingest.Budget.acquire
+
+    async def acquire(self, user_id, size, timeout=ingest.UPLOAD_QUEUE_TIMEOUT):
+        charged.append(size)
+        await real_acquire(self, user_id, size, timeout)
+
+    monkeypatch.setattr(ingest.Budget, "acquire", acquire)
+    body = _upload(aid).request.content
+    assert charged == [2 * len(body)]
+
+    # fits once, but not twice
+    monkeypatch.setattr(ingest, "budget", ingest.Budget(max_bytes=len(body) + 1))
+    assert _upload(aid).status_code == 413
+
+def test_over_budget_uploads_get_429_or_413(owner, monkeypatch):
+    aid = client.post("/albums/", json={"title": f"i-{uuid.uuid4()}"}).json()["album_id"]
+    monkeypatch.setattr(ingest, "budget", ingest.Budget(max_uploads=0))  # every slot taken
+    monkeypatch.setattr(ingest, "UPLOAD_QUEUE_TIMEOUT", 0.05)
+    r = _upload(aid)
+    assert r.status_code == 429 and r.headers["Retry-After"] == str(ingest.UPLOAD_RETRY_AFTER)
+
+    monkeypatch.setattr(ingest, "UPLOAD_MAX_BYTES", 100)
+    assert _upload(aid).status_code == 413  # can never fit: no queueing
+    assert ingest.stats()["too_large"] == 1
+
+    # no Content-Length (chunked): UPLOAD_MAX_BYTES is reserved, and the body is cut off there
+    monkeypatch.setattr(ingest, "budget", ingest.Budget())
+    monkeypatch.setattr(ingest, "UPLOAD_MAX_BYTES", 10_000)
+
+    def chunked():
+        yield b"--b\r\n"
+        for _ in range(20):
+            yield b"y" * 1000
+
+    r = client.post("/photos/upload", content=chunked(), headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert r.status_code == 413
+    assert ingest.stats()["active"] == 0
+
+def test_presigned_put_is_admitted_and_capped(monkeypatch):
+    mem = Store(MemoryAlbumStore(), MemoryPhotoStore(), MemoryBlobStore(), "memory")
+    monkeypatch.setattr(blobs_router, "store", mem)
+    path = mem.blobs.upload_url("photos/a1/x.jpg", "image/jpeg").split("://", 1)[1].split("/", 1)[1]
+
+    monkeypatch.setattr(ingest, "budget", ingest.Budget(max_uploads=0))
+    monkeypatch.setattr(ingest, "UPLOAD_QUEUE_TIMEOUT", 0.05)
+    assert client.put("/" + path, content=JPEG).status_code == 429
+
+    monkeypatch.setattr(ingest, "budget", ingest.Budget())
+    monkeypatch.setattr(ingest, "UPLOAD_MAX_BYTES", 1000)
+    assert client.put("/" + path, content=b"y" * 2000).status_code == 413
+    assert client.put("/" + path, content=(b"y" * 1000 for _ in range(2))).status_code == 413  # chunked
+    assert mem.blobs.get("photos/a1/x.jpg") is None and ingest.stats()["active"] == 0
+
+    assert client.put("/" + path, content=JPEG, headers={"content-type": "image/jpeg"}).status_code == 200
+    assert mem.blobs.get("photos/a1/x.jpg") == (JPEG, "image/jpeg")
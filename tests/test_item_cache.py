@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.auth import current_user
+from app.aws_config import dyna
+from app.kv import LocalKV
+from app.main import app
+from app.storage import cache, store
+
+from tests.bench.harness import AwsCallCounter
+
+client = TestClient(app)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def cached_store(monkeypatch):
+    """The shared store with the cache wrappers (and a local shared tier) on, restored afterwards."""
+    for name in ("users", "albums", "photos"):
+        monkeypatch.setattr(store, name, getattr(store, name))
+    monkeypatch.setattr(cache, "_caches", {})
+    cache.wrap(store, LocalKV())
+    return store
+
+def test_ttl_stale_while_revalidate_and_lru():
+    clock, loads = Clock(), []
+    c = cache.ItemCache("t", maxsize=2, ttl=10, stale=5, clock=clock)
+
+    def load(v):
+        loads.append(v)
+        return {"id": "a", "v": v}
+
+    assert c.get("a", lambda: load(1))["v"] == 1
+    assert c.get("a", lambda: load(2))["v"] == 1 and loads == [1]  # fresh hit
+
+    clock.now += 12  # past the TTL, inside the stale window: old copy now, refresh behind
+    refreshed = threading.Event()
+    assert c.get("a", lambda: (load(3), refreshed.set())[0])["v"] == 1
+    assert refreshed.wait(2)
+    deadline = time.time() + 2
+    while c.get("a", lambda: load(4))["v"] != 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert 3 in loads and 4 not in loads
+
+    clock.now += 100  # past TTL + stale: a plain miss
+    assert c.get("a", lambda: load(5))["v"] == 5
+
+    c.get("b", lambda: {"id": "b"})
+    c.get("c", lambda: {"id": "c"})  # evicts "a", the least recently used
+    assert c.get("a", lambda: load(6))["v"] == 6
+    st = c.stats()
+    assert st["evictions"] >= 1 and st["size"] == 2 and st["stale"] >= 1 and st["hits"] >= 2
+
+def test_write_during_load_is_not_cached():
+    c = cache.ItemCache("t", ttl=60)
+
+    def racing_load():
+        c.invalidate("a")  # a write lands while the read is in flight
+        return {"v": "old"}
+
+    assert c.get("a", racing_load) == {"v": "old"}
+    assert c.get("a", lambda: {"v": "new"}) == {"v": "new"}
+
+def test_wrappers_read_through_and_invalidate_on_write(cached_store):
+    uid, aid = str(uuid.uuid4()), str(uuid.uuid4())
+    cached_store.users.put({"user_id": uid, "email": f"{uid}@cache.example.com", "display_name": "A"})
+    cached_store.albums.put({"album_id": aid, "owner": uid, "title": "t", "created_at": 1})
+
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        for _ in range(3):
+            assert cached_store.albums.get(aid)["title"] == "t"
+            assert cached_store.users.get(uid, ["user_id", "display_name"]) == {"user_id": uid, "display_name": "A"}
+        assert counter.take()["dynamodb.GetItem"] == 2
+
+        cached_store.albums.update(aid, {"title": "renamed"})
+        cached_store.users.update(uid, {"display_name": "B"})
+        assert cached_store.albums.get(aid)["title"] == "renamed"
+        assert cached_store.users.get(uid, ["user_id", "display_name"])["display_name"] == "B"
+        assert cached_store.users.get(uid)["email"].startswith(uid)  # full item: its own entry
+        assert counter.take()["dynamodb.GetItem"] == 3
+
+        got = cached_store.albums.get(aid)
+        got["title"] = "mutated by a caller"
+        assert cached_store.albums.get(aid)["title"] == "renamed"  # callers get copies
+    finally:
+        counter.detach()
+
+def test_photo_endpoints_skip_album_reads_and_export_metrics(cached_store, monkeypatch):
+    uid = str(uuid.uuid4())
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    aid = client.post("/albums/", json={"title": f"c-{uuid.uuid4()}"}).json()["album_id"]
+    client.post("/photos/", json={"album_id": aid, "filename": "a.jpg", "mime": "image/jpeg"})
+
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        for _ in range(3):
+            assert len(client.get("/photos/", params={"album_id": aid}).json()["items"]) == 1
+        calls = counter.take()
+    finally:
+        counter.detach()
+    assert calls["dynamodb.GetItem"] == 1 and calls["dynamodb.Query"] == 3
+
+    client.post("/photos/", json={"album_id": aid, "filename": "b.jpg", "mime": "image/jpeg"})
+    assert len(client.get("/photos/", params={"album_id": aid}).json()["items"]) == 2
+
+    body = metrics.render()
+    assert 'item_cache_requests_total{table="albums",result="hits"}' in body
+    assert 'item_cache_entries{table="albums"}' in body
+
+def test_versioned_tables_are_not_cached_without_a_shared_tier(monkeypatch):
+    for name in ("users", "albums", "photos"):
+        monkeypatch.setattr(store, name, getattr(store, name))
+    monkeypatch.setattr(cache, "_caches", {})
+    inner_users, inner_albums = store.users, store.albums
+    cache.wrap(store)  # no SHARED_CACHE_URL: another worker's version bump would go unseen
+    assert store.users is inner_users and store.albums is inner_albums
+    assert isinstance(store.photos, cache.CachedPhotoStore)
@@ -0,0 +1,111 @@
+import os
+import time
+import uuid
+from decimal import Decimal
+
+import pytest
+
+from app import kv as kvmod, revocation
+from app.storage.cache import INVALIDATION_CHANNEL, ItemCache, SharedTier
+
+
+class Clock:
+    def __init__(self):
+        self.now = 50.0
+
+    def __call__(self):
+        return self.now
+
+
+def _worker(kv, db, loads):
+    """One uvicorn worker's view: its own LRU in front of the shared tier."""
+    c = ItemCache("albums", ttl=60)
+    c.shared = SharedTier(kv, "albums")
+    kv.subscribe(INVALIDATION_CHANNEL, lambda m: c.drop(m.partition(":")[2]))
+
+    def get(item_id):
+        def load():
+            loads.append(item_id)
+            return dict(db[item_id]) if item_id in db else None
+        return c.get(item_id, load)
+
+    return c, get
+
+def test_local_kv_strings_hashes_and_ttl():
+    clock = Clock()
+    kv = kvmod.LocalKV(clock=clock)
+    kv.set("a", b"1", ttl=5)
+    kv.set("b", b"2")
+    assert kv.mget(["a", "b", "c"]) == [b"1", b"2", None]
+    clock.now += 6
+    assert kv.get("a") is None and kv.get("b") == b"2"
+
+    assert kv.hset_if_version([("h", "f", b"x", None)], ttl=10) == 1
+    kv.hash_reset("h", "v1", ttl=10)
+    assert kv.hmget_many([("h", ["f", kvmod.VERSION_FIELD])]) == [[None, b"v1"]]
+    # a reader that saw no version (or an older one) can't fill after the reset
+    assert kv.hset_if_version([("h", "f", b"old", None), ("h", "f", b"new", "v1")], ttl=10) == 1
+    assert kv.hmget_many([("h", ["f"])]) == [[b"new"]]
+
+def test_workers_share_entries_and_invalidate_each_other():
+    kv, loads = kvmod.LocalKV(), []
+    aid = str(uuid.uuid4())
+    db = {aid: {"album_id": aid, "title": "t", "version": Decimal(3), "tags": {"a", "b"}}}
+    a, get_a = _worker(kv, db, loads)
+    b, get_b = _worker(kv, db, loads)
+
+    assert get_a(aid)["title"] == "t"
+    item = get_b(aid)  # B's first read comes from the shared tier
+    assert loads == [aid] and b.stats()["shared_hits"] == 1
+    assert item["version"] == Decimal(3) and item["tags"] == {"a", "b"}
+
+    db[aid]["title"] = "renamed"
+    a.invalidate(aid)  # A wrote: B drops its copy at once, not after its TTL
+    assert b.stats()["size"] == 0
+    assert get_b(aid)["title"] == "renamed" and loads == [aid, aid]
+    assert get_a(aid)["title"] == "renamed" and loads == [aid, aid]
+
+def test_fill_from_a_read_that_raced_a_write_is_dropped():
+    kv, loads = kvmod.LocalKV(), []
+    aid = str(uuid.uuid4())
+    db = {aid: {"album_id": aid, "title": "old"}}
+    a, _ = _worker(kv, db, loads)
+    b, get_b = _worker(kv, db, loads)
+
+    tier = SharedTier(kv, "albums")
+    (_, version), = tier.lookup([(aid, None)])  # reader misses everywhere, goes to the database
+    stale = dict(db[aid])
+    db[aid]["title"] = "new"
+    a.invalidate(aid)  # the write lands before the reader fills
+    tier.fill([(aid, None, stale, version)])
+    assert get_b(aid)["title"] == "new"
+
+def test_revocations_reach_other_workers_immediately(monkeypatch):
+    kv = kvmod.LocalKV()
+    monkeypatch.setattr(revocation, "get_kv", lambda: kv)
+    monkeypatch.setattr(revocation, "_listening", False)
+    jti, uid, now = uuid.uuid4().hex, str(uuid.uuid4()), int(time.time())
+    assert not revocation.is_revoked(jti, uid, now)  # subscribes on first use
+
+    kv.publish(revocation.CHANNEL, f"jti:{jti}:{now + 60}")  # another worker's logout
+    kv.publish(revocation.CHANNEL, f"user:{uid}:{now}:{now + 60}")  # ... and password reset
+    assert revocation.is_revoked(jti, "someone", now)
+    assert revocation.is_revoked(None, uid, now) and not revocation.is_revoked(None, uid, now + 1)
+
+@pytest.mark.skipif(not os.getenv("REDIS_TEST_URL"), reason="set REDIS_TEST_URL to run against a real server")
+def test_redis_kv_round_trip():
+    kv = kvmod.RedisKV(os.environ["REDIS_TEST_URL"], prefix=f"test-{uuid.uuid4().hex}:")
+    kv.set("a", b"1", ttl=5)
+    assert kv.mget(["a", "missing"]) == [b"1", None]
+    kv.hash_reset("h", "v1", ttl=5)
+    assert kv.hset_if_version([("h", "f", b"x", "v0"), ("h", "f", b"y", "v1")], ttl=5) == 1
+    assert kv.hmget_many([("h", ["f", kvmod.VERSION_FIELD])]) == [[b"y", b"v1"]]
+
+    got = []
+    kv.subscribe("chan", got.append)
+    time.sleep(0.2)
+    kv.publish("chan", "hello")
+    deadline = time.time() + 3
+    while not got and time.time() < deadline:
+        time.sleep(0.05)
+    assert got == ["hello"]
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+from app.auth import current_user
+from app.main import app
+from app.routers import blobs as blobs_router
+from app.storage import Store, store
+from app.storage.local import LocalBlobStore
+from app.storage.memory import MemoryAlbumStore, MemoryPhotoStore
+
+def test_content_addressed_layout_and_dedup(tmp_path):
+    blobs = LocalBlobStore(str(tmp_path), fsync="off")
+    blobs.put("photos/a/1.jpg", b"same", "image/jpeg")
+    src = tmp_path / "upload.bin"
+    src.write_bytes(b"same")
+    blobs.upload_file(str(src), "photos/a/2.jpg", "image/jpeg")
+
+    objects = [f for _, _, fs in os.walk(tmp_path / "objects") for f in fs]
+    assert len(objects) == 1  # one object, two refs
+    obj_path, ctype = blobs.path("photos/a/2.jpg")
+    assert ctype == "image/jpeg" and os.path.relpath(obj_path, tmp_path / "objects").count(os.sep) == 2
+    assert blobs.get("photos/a/1.jpg") == (b"same", "image/jpeg")
+
+    blobs.delete("photos/a/1.jpg")
+    assert blobs.get("photos/a/1.jpg") is None
+    assert blobs.gc(grace_seconds=0) == 0  # still referenced by 2.jpg
+    blobs.delete("photos/a/2.jpg")
+    assert blobs.gc(grace_seconds=0) == 1
+    assert os.listdir(tmp_path / "tmp") == []
+
+def test_group_commit_serves_concurrent_writers(tmp_path):
+    blobs = LocalBlobStore(str(tmp_path), fsync="batch")
+    threads = [threading.Thread(target=blobs.put, args=(f"k{i}", f"v{i}".encode())) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(blobs.get(f"k{i}") == (f"v{i}".encode(), "application/octet-stream") for i in range(8))
+
+def test_blob_route_streams_local_files(tmp_path, monkeypatch):
+    local = Store(MemoryAlbumStore(), MemoryPhotoStore(), LocalBlobStore(str(tmp_path), fsync="off"), "memory")
+    monkeypatch.setattr(blobs_router, "store", local)
+    local.blobs.put("photos/a1/x.jpg", b"0123456789", "image/jpeg")
+    client = TestClient(app)
+
+    path = local.blobs.url("photos/a1/x.jpg").split("://", 1)[1].split("/", 1)[1]
+    r = client.get("/" + path)
+    assert r.status_code == 200 and r.content == b"0123456789"
+    assert r.headers["content-type"] == "image/jpeg"
+    r = client.get("/" + path, headers={"Range": "bytes=2-4"})
+    assert r.status_code == 206 and r.content == b"234"
+
+def test_deleting_a_photo_frees_its_bytes(tmp_path, monkeypatch):
+    local = LocalBlobStore(str(tmp_path), fsync="off", gc_delay=0, gc_grace=0)
+    monkeypatch.setattr(store, "blobs", local)
+    uid, aid, pid = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+    store.albums.put({"album_id": aid, "owner": uid, "title": aid, "created_at": 1})
+    local.put(f"photos/{aid}/{pid}.jpg", b"photo bytes", "image/jpeg")
+    store.photos.put({"photo_id": pid, "album_id": aid, "s3_key": f"photos/{aid}/{pid}.jpg", "uploaded_at": 1})
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+
+    assert TestClient(app).delete(f"/photos/{pid}").status_code == 204
+    deadline = time.time() + 5
+    while any(fs for _, _, fs in os.walk(tmp_path / "objects")) and time.time() < deadline:
+        time.sleep(0.01)
+    assert not any(fs for _, _, fs in os.walk(tmp_path / "objects"))
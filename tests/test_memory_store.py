@@ -0,0 +1,57 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import blobs as blobs_router
+from app.storage import Store
+from app.storage.memory import MemoryAlbumStore, MemoryBlobStore, MemoryPhotoStore
+
+def _photo(pid, album_id="a1", ts=0):
+    return {"photo_id": pid, "album_id": album_id, "s3_key": f"photos/{album_id}/{pid}", "uploaded_at": ts}
+
+def test_album_owner_and_title_indexes():
+    albums = MemoryAlbumStore()
+    albums.put({"album_id": "b", "owner": "u1", "title": "Beach", "created_at": 20})
+    albums.put({"album_id": "a", "owner": "u1", "title": "Alps", "created_at": 10})
+    albums.put({"album_id": "c", "owner": "u2", "title": "Alps", "created_at": 5})
+
+    assert [a["album_id"] for a in albums.list_by_owner("u1")] == ["a", "b"]
+    assert albums.title_exists("u1", "Alps") and not albums.title_exists("u2", "Beach")
+
+    albums.put({"album_id": "a", "owner": "u1", "title": "Andes", "created_at": 10})  # rename
+    assert not albums.title_exists("u1", "Alps") and albums.title_exists("u1", "Andes")
+    albums.delete("b")
+    assert [a["album_id"] for a in albums.list_by_owner("u1")] == ["a"]
+
+def test_photo_album_index_pages_in_upload_order():
+    photos = MemoryPhotoStore()
+    for i in (3, 1, 2, 5, 4):
+        photos.put(_photo(f"p{i}", ts=i))
+    photos.put(_photo("other", album_id="a2", ts=0))
+
+    page, cur = photos.page("a1", 2)
+    assert [p["photo_id"] for p in page] == ["p1", "p2"] and cur == "p2"
+    page, cur = photos.page("a1", 2, cur)
+    assert [p["photo_id"] for p in page] == ["p3", "p4"] and cur == "p4"
+    page, cur = photos.page("a1", 2, cur)
+    assert [p["photo_id"] for p in page] == ["p5"] and cur is None
+    assert photos.latest("a1")["photo_id"] == "p5"
+
+    photos.delete("p5")
+    assert photos.latest("a1")["photo_id"] == "p4"
+    first, _ = photos.page("a1", 1)
+    first[0]["url"] = "mutated"  # callers get copies
+    assert "url" not in photos.get("p1")
+
+def test_local_blob_urls_are_signed(monkeypatch):
+    mem = Store(MemoryAlbumStore(), MemoryPhotoStore(), MemoryBlobStore(), "memory")
+    monkeypatch.setattr(blobs_router, "store", mem)
+    client = TestClient(app)
+
+    put_url = mem.blobs.upload_url("photos/a1/x.jpg", "image/jpeg")
+    path = put_url.split("://", 1)[1].split("/", 1)[1]
+    assert client.put("/" + path, content=b"jpeg-bytes", headers={"content-type": "image/jpeg"}).status_code == 200
+
+    get_path = mem.blobs.url("photos/a1/x.jpg").split("://", 1)[1].split("/", 1)[1]
+    r = client.get("/" + get_path)
+    assert r.status_code == 200 and r.content == b"jpeg-bytes"
+    assert r.headers["content-type"] == "image/jpeg"
+    assert client.get("/" + get_path.replace("sig=", "sig=0")).status_code == 403
@@ -0,0 +1,77 @@
+import re
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.aws_config import dyna
+from app.main import app
+
+client = TestClient(app)
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    for line in text.splitlines():
+        if not line.startswith(name + "{") and not line.startswith(name + " "):
+            continue
+        if all(f'{k}="{v}"' in line for k, v in labels.items()):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_http_latency_labelled_by_route_template():
+    client.get("/healthz")
+    client.get("/albums/not-a-real-id")  # 401, but still matched to the template
+    body = client.get("/metrics").text
+    assert _sample(body, "http_request_duration_seconds_count", route="/healthz", status="200") >= 1
+    assert _sample(body, "http_request_duration_seconds_count", route="/albums/{album_id}") >= 1
+    assert "not-a-real-id" not in body
+    assert re.search(r"^threadpool_max_threads \d+", body, re.M)
+    assert "pwhash_inflight" in body and "email_outbox_pending" in body
+
+def test_histogram_buckets_are_cumulative():
+    reg = metrics.Registry()
+    h = metrics.Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0), registry=reg)
+    for v in (0.05, 0.5, 5.0):
+        h.labels("x").observe(v)
+    text = reg.render()
+    assert 't_seconds_bucket{op="x",le="0.1"} 1' in text
+    assert 't_seconds_bucket{op="x",le="1"} 2' in text
+    assert 't_seconds_bucket{op="x",le="+Inf"} 3' in text
+    assert 't_seconds_count{op="x"} 3' in text
+
+def test_botocore_hooks_time_calls_and_count_errors():
+    metrics.instrument_botocore(dyna.meta.client)  # idempotent
+    before = _sample(metrics.render(), "aws_request_duration_seconds_count", operation="ListTables")
+    dyna.meta.client.list_tables()
+    assert _sample(metrics.render(), "aws_request_duration_seconds_count", operation="ListTables") == before + 1
+
+    try:
+        dyna.meta.client.describe_table(TableName="does-not-exist")
+    except dyna.meta.client.exceptions.ResourceNotFoundException:
+        pass
+    assert _sample(metrics.render(), "aws_errors_total", operation="DescribeTable",
+                   code="ResourceNotFoundException") >= 1
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+RUNNING_TOTALS = (
+    "pwhash_rejected_total", "pwhash_queue_seconds_total", "email_outbox_events_total",
+    "item_cache_requests_total",
+    "singleflight_calls_total",
+    "upload_admission_total", "upload_queue_seconds_total",
+    "page_cache_requests_total",
+    "render_requests_total", "render_seconds_total", "render_cache_evictions_total",
+)
+
+def test_running_totals_are_exported_as_counters():
+    body = client.get("/metrics").text
+    for name in RUNNING_TOTALS:
+        assert f"# TYPE {name} counter" in body, name
+    assert not re.search(r"^# TYPE \w+_total (?!counter)", body, re.M)
+
+    reg = metrics.Registry()
+    c = metrics.Counter("t_total", "test", ("kind",), registry=reg)
+    c.labels("sent").set_total(7)
+    assert 't_total{kind="sent"} 7' in reg.render()
@@ -0,0 +1,77 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import metrics, pagecache
+from app.auth import current_user
+from app.aws_config import dyna
+from app.main import app
+
+from tests.bench.harness import AwsCallCounter
+
+client = TestClient(app)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    c = pagecache.PageCache(maxbytes=1 << 20, ttl=600)
+    monkeypatch.setattr(pagecache, "photo_pages", c)
+    return c
+
+def test_sized_by_bytes_with_ttl_and_album_drop():
+    clock = Clock()
+    cost = 1000 + pagecache.ENTRY_OVERHEAD
+    c = pagecache.PageCache(maxbytes=8 * cost, ttl=60, clock=clock)
+    for i in range(8):
+        c.put(("a" if i < 4 else "b", i), b"x" * 1000)
+    assert c.stats()["bytes"] == 8 * cost
+
+    assert c.get(("a", 0)) is not None  # now most recently used
+    c.put(("b", 8), b"x" * 1000)  # over budget: ("a", 1) goes, not ("a", 0)
+    assert c.get(("a", 1)) is None and c.get(("a", 0)) is not None
+    c.put(("a", 9), b"x" * cost)  # more than 1/8 of the budget: not cached
+    assert c.get(("a", 9)) is None
+
+    c.drop_album("a")
+    assert c.get(("a", 0)) is None and c.get(("b", 4)) is not None
+    clock.now += 61
+    assert c.get(("b", 4)) is None
+    st = c.stats()
+    assert st["evictions"] == 1 and st["skipped"] == 1 and st["invalidations"] == 3 and st["entries"] == 4
+
+def test_photo_pages_served_from_memory_until_the_next_write(pages, monkeypatch):
+    uid = str(uuid.uuid4())
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    aid = client.post("/albums/", json={"title": f"p-{uuid.uuid4()}"}).json()["album_id"]
+    client.post("/photos/", json={"album_id": aid, "filename": "a.jpg", "mime": "image/jpeg"})
+
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        first = client.get("/photos/", params={"album_id": aid})
+        again = [client.get("/photos/", params={"album_id": aid}) for _ in range(3)]
+        assert counter.take()["dynamodb.Query"] == 1
+        assert all(r.content == first.content for r in again)
+        assert first.headers["content-type"] == "application/json" and "ETag" in first.headers
+
+        slim = client.get("/photos/", params={"album_id": aid, "fields": "photo_id"}).json()
+        assert list(slim["items"][0]) == ["photo_id"] and counter.take()["dynamodb.Query"] == 1
+
+        client.post("/photos/", json={"album_id": aid, "filename": "b.jpg", "mime": "image/jpeg"})
+        counter.take()
+        assert len(client.get("/photos/", params={"album_id": aid}).json()["items"]) == 2
+        assert counter.take()["dynamodb.Query"] == 1
+    finally:
+        counter.detach()
+
+    st = pages.stats()
+    assert st["hits"] == 3 and st["invalidations"] == 2 and st["entries"] == 1
+    assert 'page_cache_requests_total{result="hits"} 3' in metrics.render()
@@ -0,0 +1,57 @@
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from app import auth, pwhash
+from app.storage import store
+
+def test_verify_runs_on_pool_and_rehashes_weak_hash():
+    weak = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("s3cret!")
+    ok, new_hash = pwhash.verify_and_update("s3cret!", weak)
+    assert ok and new_hash and new_hash != weak
+    assert pwhash.pwd_ctx.verify("s3cret!", new_hash)
+    assert not pwhash.pwd_ctx.needs_update(new_hash)
+
+    ok, _ = pwhash.verify_and_update("wrong", new_hash)
+    assert not ok
+    assert pwhash.stats()["rehashes"] >= 1
+
+def test_login_rehash_only_rewrites_the_hash(monkeypatch):
+    uid, email = str(uuid.uuid4()), f"{uuid.uuid4()}@rehash.example.com"
+    weak = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("s3cret!")
+    store.users.put({"user_id": uid, "email": email, "password_hash": weak, "email_verified": True})
+    stale = dict(store.users.get(uid))  # what the login read through the email index
+    store.users.update(uid, {"albums_version": 7, "avatar_version": "0123456789abcdef"})  # written meanwhile
+    monkeypatch.setattr(auth, "_get_user_by_email", lambda _: stale)
+    monkeypatch.setattr(auth, "AUTO_VERIFY", True)
+
+    assert auth.login_user(auth.LoginIn(email=email, password="s3cret!"))["access_token"]
+    item = store.users.get(uid)
+    assert item["password_hash"] != weak and pwhash.pwd_ctx.verify("s3cret!", item["password_hash"])
+    assert item["albums_version"] == 7 and item["avatar_version"] == "0123456789abcdef"
+
+def test_sheds_load_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(pwhash, "PWHASH_WORKERS", 0)
+    monkeypatch.setattr(pwhash, "PWHASH_MAX_QUEUE", 0)
+    before = pwhash.stats()["rejected"]
+    with pytest.raises(HTTPException) as ei:
+        pwhash.hash_pw("x")
+    assert ei.value.status_code == 503
+    assert ei.value.headers["Retry-After"] == "1"
+    assert pwhash.stats()["rejected"] == before + 1
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(pwhash, "PWHASH_TIMEOUT", 0.05)
+    pwhash.warm_up()
+    before = pwhash.stats()["inflight"]
+    with pytest.raises(HTTPException) as ei:
+        pwhash._run(time.sleep, 1.0)  # still sleeping in the pool after we give up on it
+    assert ei.value.status_code == 503
+    assert pwhash.stats()["inflight"] == before + 1
+
+    deadline = time.time() + 5
+    while pwhash.stats()["inflight"] > before and time.time() < deadline:
+        time.sleep(0.05)
+    assert pwhash.stats()["inflight"] == before
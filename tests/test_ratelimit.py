@@ -0,0 +1,36 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app import auth, ratelimit
+
+client = TestClient(app)
+
+def test_local_bucket_refuses_then_reports_wait():
+    lim = ratelimit.LocalLimiter(shards=4)
+    assert lim.take("k", rate=1.0, burst=2) == 0
+    assert lim.take("k", rate=1.0, burst=2) == 0
+    wait = lim.take("k", rate=1.0, burst=2)
+    assert 0 < wait <= 1.0
+    assert lim.take("other", rate=1.0, burst=2) == 0
+
+def test_full_shard_evicts_least_recently_used():
+    lim = ratelimit.LocalLimiter(shards=1, max_keys=3)
+    for _ in range(2):
+        lim.take("victim", rate=0.001, burst=2)
+    assert lim.take("victim", rate=0.001, burst=2) > 0
+    for i in range(10):  # fresh keys cycled through, the victim still being tried in between
+        lim.take(f"fresh-{i}", rate=0.001, burst=2)
+        assert lim.take("victim", rate=0.001, burst=2) > 0
+
+def test_login_throttled_before_user_lookup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(auth, "_get_user_by_email", lambda e: calls.append(e))
+    monkeypatch.setattr(ratelimit, "limiter", ratelimit.LocalLimiter())
+    monkeypatch.setattr(ratelimit, "LOGIN_EMAIL_BURST", 2)
+
+    body = {"email": "victim@example.com", "password": "guess"}
+    for _ in range(2):
+        assert client.post("/login", json=body).status_code == 401
+    r = client.post("/login", json=body)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert len(calls) == 2
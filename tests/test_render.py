@@ -0,0 +1,112 @@
+import io
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import render
+from app.auth import current_user
+from app.main import app
+from app.storage import store
+
+client = TestClient(app)
+
+
+def _jpeg(w: int, h: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), (30, 120, 200)).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+@pytest.fixture
+def photo(monkeypatch, tmp_path):
+    monkeypatch.setattr(render, "cache", render.DiskLRU(tmp_path / "renders", 64 * 1024 * 1024))
+    uid, aid, pid = str(uuid.uuid4()), str(uuid.uuid4()), str(uuid.uuid4())
+    store.albums.put({"album_id": aid, "owner": uid, "title": aid, "created_at": 1})
+    key = f"photos/{aid}/{pid}.jpg"
+    store.blobs.put(key, _jpeg(1600, 1200), "image/jpeg")
+    store.photos.put({"photo_id": pid, "album_id": aid, "s3_key": key, "uploaded_at": 1})
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    return pid
+
+def test_render_fits_the_box_and_repeats_come_from_disk(photo, monkeypatch):
+    r = client.get(f"/photos/{photo}/render", params={"w": 400, "h": 400})
+    assert r.status_code == 200, r.text
+    assert r.headers["content-type"] == "image/jpeg" and r.headers["cache-control"] == render.CACHE_CONTROL
+    assert Image.open(io.BytesIO(r.content)).size == (400, 300)
+
+    webp = client.get(f"/photos/{photo}/render", params={"h": 150, "fmt": "webp", "q": 60})
+    assert webp.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(webp.content)).size == (200, 150)
+    big = client.get(f"/photos/{photo}/render", params={"w": 3000})
+    assert Image.open(io.BytesIO(big.content)).size == (1600, 1200)  # never upscaled
+
+    def boom(*_):
+        raise AssertionError("rendered again")
+
+    monkeypatch.setattr(render, "_render", boom)
+    again = client.get(f"/photos/{photo}/render", params={"w": 400, "h": 400})
+    assert again.content == r.content and again.headers["etag"] == r.headers["etag"]
+    assert client.get(f"/photos/{photo}/render", params={"w": 400, "h": 400},
+                      headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+    assert render.cache.stats()["hits"] >= 1
+
+def test_render_checks_ownership_and_parameters(photo, monkeypatch):
+    for params in ({}, {"w": 0}, {"w": render.RENDER_MAX_DIM + 1}, {"w": 10, "fmt": "gif"}, {"w": 10, "q": 0}):
+        assert client.get(f"/photos/{photo}/render", params=params).status_code == 400, params
+    assert client.get("/photos/no-such-photo/render", params={"w": 10}).status_code == 404
+
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: "someone-else")
+    assert client.get(f"/photos/{photo}/render", params={"w": 10}).status_code == 404
+    assert render.cache.stats()["files"] == 0
+
+def test_disk_lru_evicts_least_recently_used_by_bytes(tmp_path):
+    lru = render.DiskLRU(tmp_path, maxbytes=250)
+    names = [f"{c * 64}.jpg" for c in "abc"]
+    for name in names:
+        lru.put(name, b"x" * 100)
+        lru.get(names[0]).close()  # keep the first one warm
+    st = lru.stats()
+    assert st["bytes"] == 200 and st["evictions"] == 1
+    assert lru.get(names[1]) is None
+    for name in (names[0], names[2]):
+        with lru.get(name) as f:
+            assert f.read() == b"x" * 100
+
+    # a restart picks the surviving files back up, without temp leftovers
+    (tmp_path / "aa" / "aa" / ".tmp-dead").write_bytes(b"partial")
+    reopened = render.DiskLRU(tmp_path, maxbytes=250)
+    reopened.get(names[2]).close()
+    assert reopened.stats()["bytes"] == 200
+    assert not (tmp_path / "aa" / "aa" / ".tmp-dead").exists()
+
+def test_hit_evicted_while_being_served_is_still_sent(photo, monkeypatch):
+    first = client.get(f"/photos/{photo}/render", params={"w": 400})
+    real_get = render.cache.get
+
+    def get_then_evict(name):
+        f = real_get(name)
+        render.cache.maxbytes = 0  # a concurrent put pushes everything out
+        render.cache.put("ff" * 32 + ".jpg", b"x")
+        return f
+
+    monkeypatch.setattr(render.cache, "get", get_then_evict)
+    r = client.get(f"/photos/{photo}/render", params={"w": 400})
+    assert r.status_code == 200 and r.content == first.content
+    assert int(r.headers["content-length"]) == len(first.content)
+    assert render.cache.stats()["files"] == 0
+
+def test_timed_out_render_keeps_its_slot_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(render, "RENDER_TIMEOUT", 0.05)
+    release = threading.Event()
+    with pytest.raises(HTTPException) as ei:
+        render._run(release.wait, 5)
+    assert ei.value.status_code == 503 and render.stats()["inflight"] == 1
+    release.set()
+    deadline = time.time() + 5
+    while render.stats()["inflight"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert render.stats()["inflight"] == 0
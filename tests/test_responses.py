@@ -0,0 +1,47 @@
+import json
+from decimal import Decimal
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, choose_encoding
+from app.responses import FastJSONResponse, dumps
+
+
+def test_decimals_encode_like_jsonable_encoder():
+    item = {"size": Decimal("2048"), "ratio": Decimal("1.5"), "tags": ["a"], "nested": {"n": Decimal("-3")}}
+    assert json.loads(dumps(item)) == jsonable_encoder(item)
+    assert dumps({"n": Decimal("7")}) == b'{"n":7}'
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("") is None
+
+def _app():
+    inner = FastAPI(default_response_class=FastJSONResponse)
+
+    @inner.get("/big")
+    def big():
+        return FastJSONResponse({"items": [{"url": f"https://example.com/{i}", "n": Decimal(i)} for i in range(200)]})
+
+    @inner.get("/small")
+    def small():
+        return {"ok": True}
+
+    return TestClient(CompressionMiddleware(inner, minimum_size=500))
+
+def test_large_json_is_compressed_when_accepted():
+    client = _app()
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert len(r.json()["items"]) == 200  # httpx decodes transparently
+    raw = client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert int(r.headers["content-length"]) < int(raw.headers["content-length"]) / 3
+
+def test_small_bodies_left_alone():
+    r = _app().get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers and r.json() == {"ok": True}
@@ -0,0 +1,112 @@
+import threading
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app import metrics, singleflight
+from app.auth import current_user
+from app.main import app
+from app.storage import store
+
+client = TestClient(app)
+
+
+def _wait_for_followers(group, key, n, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        call = group._calls.get(key)
+        if call is not None and call.followers >= n:
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def _run(n, target):
+    out, threads = [None] * n, []
+    for i in range(n):
+        t = threading.Thread(target=lambda i=i: out.__setitem__(i, target()))
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join(10)
+    return out
+
+
+def test_concurrent_calls_share_one_result_and_errors():
+    group, calls = singleflight.Group(), []
+
+    def slow(value):
+        def fn():
+            calls.append(value)
+            assert _wait_for_followers(group, ("op", 1), 7)
+            if isinstance(value, Exception):
+                raise value
+            return {"v": value}
+        return fn
+
+    results = _run(8, lambda: group.do(("op", 1), slow(42)))
+    assert calls == [42] and all(r is results[0] and r == {"v": 42} for r in results)
+
+    boom = RuntimeError("backend down")
+
+    def call():
+        try:
+            return group.do(("op", 1), slow(boom))
+        except RuntimeError as e:
+            return e
+    assert all(r is boom for r in _run(8, call)) and len(calls) == 2
+
+    assert group.do(("op", 1), lambda: "next") == "next"  # nothing is kept once a flight lands
+    assert group.stats()["op"] == {"leader": 3, "shared": 14, "in_flight": 0}
+
+def test_forget_starts_a_new_flight():
+    group = singleflight.Group()
+    started, release = threading.Event(), threading.Event()
+
+    def old():
+        started.set()
+        release.wait(5)
+        return "old"
+
+    t = threading.Thread(target=lambda: group.do(("k",), old))
+    t.start()
+    assert started.wait(5)
+    group.forget(("k",))  # a write landed: later callers must not get the old read
+    assert group.do(("k",), lambda: "new") == "new"
+    release.set()
+    t.join(5)
+
+def test_popular_album_listing_runs_one_query(monkeypatch):
+    n = 6
+    uid = str(uuid.uuid4())
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    aid = client.post("/albums/", json={"title": f"sf-{uuid.uuid4()}"}).json()["album_id"]
+    client.post("/photos/", json={"album_id": aid, "filename": "a.jpg", "mime": "image/jpeg"})
+
+    version = store.albums.get(aid).get("version", 0)
+    key = ("photos.page", aid, version, 50, "", "")
+    page, pages, signed = store.photos.page, [], []
+    url = store.blobs.url
+
+    def slow_page(*args, **kwargs):
+        pages.append(args)
+        _wait_for_followers(singleflight.flights, key, n - 1)
+        return page(*args, **kwargs)
+
+    def counting_url(*args, **kwargs):
+        signed.append(args)
+        return url(*args, **kwargs)
+
+    monkeypatch.setattr(store.photos, "page", slow_page)
+    monkeypatch.setattr(store.blobs, "url", counting_url)
+    responses = _run(n, lambda: client.get("/photos/", params={"album_id": aid}))
+
+    assert [r.status_code for r in responses] == [200] * n
+    assert len({r.content for r in responses}) == 1 and len(responses[0].json()["items"]) == 1
+    assert len(pages) == 1 and len(signed) == 2  # url + download_url, once
+    assert 'singleflight_calls_total{op="photos.page",result="shared"}' in metrics.render()
+
+    # a foreign user joining the same album still gets a 404, not the shared page
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: "someone-else")
+    assert client.get("/photos/", params={"album_id": aid}).status_code == 404
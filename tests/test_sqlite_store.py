@@ -0,0 +1,58 @@
+import threading
+from decimal import Decimal
+
+from app.storage.sqlite import (
+    SQLiteAlbumStore,
+    SQLiteDB,
+    SQLitePhotoStore,
+    SQLiteTokenStore,
+    SQLiteUserStore,
+)
+
+def test_sqlite_store_roundtrip(tmp_path):
+    db = SQLiteDB(str(tmp_path / "t.db"))
+    users, tokens = SQLiteUserStore(db), SQLiteTokenStore(db)
+    albums, photos = SQLiteAlbumStore(db), SQLitePhotoStore(db)
+
+    assert db.one("PRAGMA journal_mode")[0] == "wal"
+
+    users.put({"user_id": "u1", "email": "a@x.io", "password_hash": "h", "quota": Decimal("5")})
+    users.update("u1", {"email_verified": True, "reset": "t"})
+    users.update("u1", {}, remove=("reset", "password_hash"))
+    u = users.find_by_email("a@x.io")
+    assert u == {"user_id": "u1", "email": "a@x.io", "quota": 5, "email_verified": True}
+
+    tokens.put({"token": "t1", "type": "reset", "user_id": "u1", "expires_at": 10})
+    tokens.put({"token": "t2", "type": "revoked_jti", "jti": "j", "expires_at": 10})
+    assert [t["token"] for t in tokens.list_by_user("u1")] == ["t1"]
+    assert [t["token"] for t in tokens.list_by_type(["revoked_jti", "revoked_user"])] == ["t2"]
+
+    albums.put({"album_id": "b", "owner": "u1", "title": "Beach", "created_at": 20})
+    albums.put({"album_id": "a", "owner": "u1", "title": "Alps", "created_at": 10})
+    assert [a["album_id"] for a in albums.list_by_owner("u1")] == ["a", "b"]
+    assert albums.title_exists("u1", "Alps") and not albums.title_exists("u1", "Andes")
+
+    for i in (3, 1, 2, 5, 4):
+        photos.put({"photo_id": f"p{i}", "album_id": "a", "uploaded_at": i})
+    page, cur = photos.page("a", 2)
+    assert [p["photo_id"] for p in page] == ["p1", "p2"] and cur == "p2"
+    page, cur = photos.page("a", 3, cur)
+    assert [p["photo_id"] for p in page] == ["p3", "p4", "p5"] and cur is None
+    assert photos.latest("a")["photo_id"] == "p5"
+
+def test_sqlite_connection_per_thread(tmp_path):
+    db = SQLiteDB(str(tmp_path / "t.db"))
+    users = SQLiteUserStore(db)
+    conns = []
+
+    def work(n):
+        conns.append(db.conn())
+        users.put({"user_id": f"u{n}", "email": f"{n}@x.io"})
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(c) for c in conns}) == 4
+    assert users.find_by_email("3@x.io")["user_id"] == "u3"
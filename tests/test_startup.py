@@ -0,0 +1,36 @@
+import json
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+from app import aws_config
+from app.main import app
+
+
+def test_import_builds_no_clients_and_skips_heavy_modules():
+    code = (
+        "import json, sys, app.main, app.aws_config as a;"
+        "print(json.dumps({'s3': a.s3.built, 'dyna': a.dyna.built,"
+        " 'mods': sorted(m for m in ('boto3', 'PIL', 'resend', 'redis') if m in sys.modules)}))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == {"s3": False, "dyna": False, "mods": []}
+
+def test_lazy_runs_build_hooks_once():
+    built, seen = [], []
+    lazy = aws_config._Lazy("thing", lambda: built.append(1) or {"ok": True})
+    lazy.on_build(seen.append)
+    assert not lazy.built and seen == []
+    assert lazy.get("ok") is True and lazy.get("ok") is True
+    assert built == [1] and seen == [{"ok": True}]
+    lazy.on_build(seen.append)  # already built: runs immediately
+    assert len(seen) == 2
+
+def test_healthz_reports_startup_timing():
+    with TestClient(app) as client:  # runs the lifespan
+        body = client.get("/healthz", params={"timing": 1}).json()
+    t = body["startup_ms"]
+    assert set(t) == {"interpreter", "import", "lifespan", "warm_up", "first_healthz"}
+    assert t["import"] > 0 and t["first_healthz"] >= t["import"]
+    assert "startup_ms" not in TestClient(app).get("/healthz").json()
@@ -0,0 +1,77 @@
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from app.main import app
+from app import auth, revocation
+from app.aws_config import dyna
+from app.storage.dynamo import DynamoTokenStore
+
+from tests.bench.harness import AwsCallCounter
+
+client = TestClient(app)
+
+def test_cached_token_still_checks_revocation():
+    tok = auth.create_token("rev-user-1")
+    assert auth.decode_token(tok) == "rev-user-1"
+    assert tok in auth._token_cache  # second call is served from the cache
+    assert auth.decode_token(tok) == "rev-user-1"
+
+    auth.revoke_token(tok)
+    with pytest.raises(HTTPException) as ei:
+        auth.decode_token(tok)
+    assert ei.value.status_code == 401
+
+def test_logout_revokes_bearer_token():
+    tok = auth.create_token("rev-user-2")
+    r = client.post("/logout", headers={"Authorization": f"Bearer {tok}"})
+    assert r.status_code == 200
+    with pytest.raises(HTTPException):
+        auth.decode_token(tok)
+
+def test_revoke_user_kills_older_tokens_only(monkeypatch):
+    old = auth.create_token("rev-user-3")
+    auth.revoke_user_tokens("rev-user-3")
+    with pytest.raises(HTTPException):
+        auth.decode_token(old)
+
+    # a reset that happened a few seconds ago must not affect tokens issued since
+    now = time.time()
+    monkeypatch.setattr(revocation, "time", SimpleNamespace(time=lambda: now - 5, sleep=time.sleep))
+    auth.revoke_user_tokens("rev-user-4")
+    fresh = auth.create_token("rev-user-4")
+    assert auth.decode_token(fresh) == "rev-user-4"
+
+def test_login_in_the_same_second_as_a_reset_survives():
+    auth.revoke_user_tokens("rev-user-5")
+    not_before_ms = revocation._revoked_users["rev-user-5"][0]
+
+    def token(iat):
+        return auth.jwt_encode({"sub": "rev-user-5", "iat": iat, "exp": int(time.time()) + 60, "jti": str(iat)},
+                               auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+
+    with pytest.raises(HTTPException):
+        auth.decode_token(token((not_before_ms - 1) / 1000))  # issued just before the reset
+    assert auth.decode_token(token((not_before_ms + 1) / 1000)) == "rev-user-5"
+    claims = auth.jwt_decode(auth.create_token("x"), auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    assert isinstance(claims["iat"], float)
+
+def test_dynamo_sync_queries_live_revocations_only(monkeypatch):
+    tokens = DynamoTokenStore(dyna)
+    now = int(time.time())
+    tokens.put({"token": f"revoked#{uuid.uuid4()}", "type": "revoked_jti", "jti": "live", "expires_at": now + 60})
+    tokens.put({"token": f"revoked#{uuid.uuid4()}", "type": "revoked_jti", "jti": "dead", "expires_at": now - 60})
+    tokens.put({"token": str(uuid.uuid4()), "type": "reset", "user_id": "u", "expires_at": now + 60})
+    monkeypatch.setattr(revocation, "token_store", tokens)
+
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        revocation.sync()
+        calls = counter.take()
+    finally:
+        counter.detach()
+    assert calls["dynamodb.Query"] == 2 and calls["dynamodb.Scan"] == 0
+    assert "live" in revocation._revoked_jtis and "dead" not in revocation._revoked_jtis
@@ -0,0 +1,74 @@
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.auth import current_user
+from app.aws_config import dyna
+from app.main import app
+from app.storage import store
+from app.storage.dynamo import DynamoTokenStore
+from app.storage.memory import MemoryTokenStore
+
+from tests.bench.harness import AwsCallCounter
+
+client = TestClient(app)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_tokens_are_swept_without_a_scan():
+    clock = Clock()
+    tokens = MemoryTokenStore(clock=clock)
+    for i in range(200):
+        tokens.put({"token": f"old{i}", "type": "reset", "user_id": f"u{i % 2}", "expires_at": 1010})
+    tokens.put({"token": "keep", "type": "reset", "user_id": "u0", "expires_at": 5000})
+    assert len(tokens.items) == 201
+
+    clock.now = 2000  # everything but "keep" has expired; writes sweep a batch each
+    for i in range(4):
+        tokens.put({"token": f"new{i}", "type": "verify", "user_id": "u1", "expires_at": 3000})
+    assert len(tokens.items) == 5 and "keep" in tokens.items
+    assert sorted(t["token"] for t in tokens.list_by_user("u1")) == ["new0", "new1", "new2", "new3"]
+
+    # overwrites and deletes leave dead heap entries behind; they don't pile up
+    for i in range(1000):
+        tokens.put({"token": "keep", "type": "reset", "user_id": "u0", "expires_at": 5000 + i})
+    tokens.delete("new0")
+    assert len(tokens._expiry) <= 2 * len(tokens.items) + MemoryTokenStore.SWEEP_BATCH
+
+    clock.now = 4000
+    assert tokens.sweep() == 3 and list(tokens.items) == ["keep"]
+    assert tokens.list_by_user("u1") == []
+
+def test_dynamo_tokens_by_user_use_the_index():
+    tokens = DynamoTokenStore(dyna)
+    uid = str(uuid.uuid4())
+    tokens.put({"token": str(uuid.uuid4()), "type": "reset", "user_id": uid, "expires_at": 10})
+    tokens.put({"token": f"revoked-user#{uid}", "type": "revoked_user", "user_id": uid, "expires_at": 10})
+    tokens.put({"token": f"revoked#{uuid.uuid4()}", "type": "revoked_jti", "jti": "j", "expires_at": 10})
+
+    counter = AwsCallCounter().attach(dyna.meta.client)
+    try:
+        assert len(tokens.list_by_user(uid)) == 2
+        calls = counter.take()
+    finally:
+        counter.detach()
+    assert calls["dynamodb.Query"] == 1 and calls["dynamodb.Scan"] == 0
+
+    ttl = dyna.meta.client.describe_time_to_live(TableName=tokens.table.name)["TimeToLiveDescription"]
+    assert ttl["AttributeName"] == "expires_at"
+
+def test_delete_me_removes_tokens(monkeypatch):
+    uid = str(uuid.uuid4())
+    store.users.put({"user_id": uid, "email": f"{uid}@tokens.example.com"})
+    tok = str(uuid.uuid4())
+    store.tokens.put({"token": tok, "type": "reset", "user_id": uid, "expires_at": 10})
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: uid)
+    assert client.delete("/users/me").status_code in (200, 204)
+    assert store.tokens.get(tok) is None and store.tokens.list_by_user(uid) == []
@@ -0,0 +1,72 @@
+import json
+import logging
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app import tracing
+from app.auth import current_user
+from app.main import app
+from app.storage import store
+
+client = TestClient(app)
+
+
+def _seed(owner: str, photos: int = 3) -> str:
+    aid = str(uuid.uuid4())
+    store.albums.put({"album_id": aid, "owner": owner, "title": aid, "created_at": int(time.time())})
+    for i in range(photos):
+        pid = str(uuid.uuid4())
+        store.photos.put({"photo_id": pid, "album_id": aid, "s3_key": f"photos/{aid}/{pid}.jpg",
+                          "uploaded_at": int(time.time()) + i})
+    return aid
+
+def _timings(header: str) -> dict:
+    out = {}
+    for part in header.split(", "):
+        name, *params = part.split(";")
+        out[name] = dict(p.split("=", 1) for p in params)
+    return out
+
+def test_server_timing_lists_aws_calls(monkeypatch):
+    monkeypatch.setattr(tracing, "SERVER_TIMING", True)
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: "trace-user")
+    aid = _seed("trace-user")
+    r = client.get("/photos/", params={"album_id": aid})
+    assert r.status_code == 200
+    t = _timings(r.headers["server-timing"])
+    assert "total" in t and float(t["total"]["dur"]) > 0
+    assert t["dynamodb.GetItem"]["desc"].startswith('"x1')
+    assert "dynamodb.Query" in t
+    assert t["s3.presign"]["desc"] == '"x6"'  # url + download_url per photo, no duration
+
+def test_server_timing_is_off_unless_enabled_or_asked_for_with_the_token(monkeypatch):
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: "trace-user")
+    aid = _seed("trace-user", photos=1)
+    assert "server-timing" not in client.get("/photos/", params={"album_id": aid}).headers
+
+    monkeypatch.setattr(tracing, "SERVER_TIMING_TOKEN", "debug-me")
+    r = client.get("/photos/", params={"album_id": aid}, headers={"X-Server-Timing": "wrong"})
+    assert "server-timing" not in r.headers
+    r = client.get("/photos/", params={"album_id": aid}, headers={"X-Server-Timing": "debug-me"})
+    assert "dynamodb.Query" in _timings(r.headers["server-timing"])
+
+def test_slow_request_log_lists_every_call(monkeypatch, caplog):
+    monkeypatch.setitem(app.dependency_overrides, current_user, lambda: "trace-user")
+    monkeypatch.setattr(tracing, "SLOW_REQUEST_MS", 0)
+    aid = _seed("trace-user", photos=1)
+    with caplog.at_level(logging.WARNING, logger="uvicorn.error"):
+        client.get("/photos/", params={"album_id": aid})
+    line = next(r.getMessage() for r in caplog.records if r.getMessage().startswith("slow request "))
+    record = json.loads(line[len("slow request "):])
+    assert record["route"] == "/photos/" and record["status"] == 200
+    ops = [c["op"] for c in record["calls"]]
+    assert ops[0] == "dynamodb.GetItem" and "dynamodb.Query" in ops
+    assert all("ms" in c for c in record["calls"] if not c["op"].endswith(".presign"))
+
+def test_no_trace_outside_requests():
+    assert tracing.current() is None
+    params = {}
+    tracing._before_parameter_build("before-parameter-build.dynamodb.Query", params=params)
+    assert params == {}  # ReturnConsumedCapacity only while a request is traced